@@ -1,4 +1,7 @@
 from .aircv import *  # noqa
 from .error import *  # noqa
 from .sift import find_sift  # noqa
-from .template import find_template, find_all_template  # noqa
\ No newline at end of file
+from .template import find_template, find_all_template  # noqa
+from .image_cache import ImageCache  # noqa
+from .prepared_template import PreparedTemplate, PreparedScreen, prepare_template, prepare_screen  # noqa
+from .screen_fingerprint import ScreenFingerprint  # noqa
@@ -17,30 +17,49 @@ def cal_ccoeff_confidence(im_source, im_search):
     im_source[0,0] = 0
     im_source[0,1] = 255
 
-    im_source, im_search = img_mat_rgb_2_gray(im_source), img_mat_rgb_2_gray(im_search)
+    im_source = img_mat_rgb_2_gray(im_source)
+    # im_search为PreparedTemplate时, 直接使用预先计算好的灰度图
+    im_search = img_mat_rgb_2_gray(im_search) if isinstance(im_search, np.ndarray) else im_search.gray
     res = cv2.matchTemplate(im_source, im_search, cv2.TM_CCOEFF_NORMED)
     min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
 
     return max_val
 
 
-def cal_rgb_confidence(img_src_rgb, img_sch_rgb):
-    """同大小彩图计算相似度."""
+def img_mat_rgb_2_hsv(img_mat):
+    """彩图转HSV, 用于计算彩色相似度."""
     # 减少极限值对hsv角度计算的影响
-    img_src_rgb = np.clip(img_src_rgb, 10, 245)
-    img_sch_rgb = np.clip(img_sch_rgb, 10, 245)
+    img_mat = np.clip(img_mat, 10, 245)
     # 转HSV强化颜色的影响
-    img_src_rgb = cv2.cvtColor(img_src_rgb, cv2.COLOR_BGR2HSV)
-    img_sch_rgb = cv2.cvtColor(img_sch_rgb, cv2.COLOR_BGR2HSV)
+    return cv2.cvtColor(img_mat, cv2.COLOR_BGR2HSV)
+
+
+def split_hsv_channels(img_mat):
+    """彩图转HSV并拆分为三个通道."""
+    return cv2.split(img_mat_rgb_2_hsv(img_mat))
+
+
+def cal_rgb_confidence(img_src_rgb, img_sch_rgb):
+    """同大小彩图计算相似度, img_sch_rgb为PreparedTemplate时复用其HSV通道."""
+    return cal_hsv_confidence(img_mat_rgb_2_hsv(img_src_rgb), img_sch_rgb)
+
 
+def _pad_hsv(img_src_hsv):
     # 扩展置信度计算区域
-    img_src_rgb = cv2.copyMakeBorder(img_src_rgb, 10,10,10,10,cv2.BORDER_REPLICATE)
+    img_src_hsv = cv2.copyMakeBorder(img_src_hsv, 10,10,10,10,cv2.BORDER_REPLICATE)
     # 加入取值范围干扰，防止算法过于放大微小差异
-    img_src_rgb[0,0] = 0
-    img_src_rgb[0,1] = 255
+    img_src_hsv[0,0] = 0
+    img_src_hsv[0,1] = 255
+    return img_src_hsv
+
+
+def cal_hsv_confidence(img_src_hsv, img_sch_rgb):
+    """同大小彩图计算相似度, img_src_hsv为已经转换好的HSV图(见img_mat_rgb_2_hsv)."""
+    img_src_hsv = _pad_hsv(img_src_hsv)
 
     # 计算BGR三通道的confidence，存入bgr_confidence
-    src_bgr, sch_bgr = cv2.split(img_src_rgb), cv2.split(img_sch_rgb)
+    src_bgr = cv2.split(img_src_hsv)
+    sch_bgr = split_hsv_channels(img_sch_rgb) if isinstance(img_sch_rgb, np.ndarray) else img_sch_rgb.hsv_channels
     bgr_confidence = [0, 0, 0]
     for i in range(3):
         res_temp = cv2.matchTemplate(src_bgr[i], sch_bgr[i], cv2.TM_CCOEFF_NORMED)
@@ -48,3 +67,25 @@ def cal_rgb_confidence(img_src_rgb, img_sch_rgb):
         bgr_confidence[i] = max_val
 
     return min(bgr_confidence)
+
+
+def cal_hsv_confidences(img_src_hsv_list, img_sch_rgb):
+    """
+    批量计算多张同大小HSV图与模板的相似度, 结果与逐张调用cal_hsv_confidence相同
+
+    扩展后的区域上下拼接成一张图, 每个通道只做一次matchTemplate,
+    每张图的相似度只取模板完全落在该图内的位置.
+    """
+    padded = [_pad_hsv(img) for img in img_src_hsv_list]
+    pad_h = padded[0].shape[0]
+    src_bgr = cv2.split(np.concatenate(padded, axis=0))
+    sch_bgr = split_hsv_channels(img_sch_rgb) if isinstance(img_sch_rgb, np.ndarray) else img_sch_rgb.hsv_channels
+    rows = pad_h - sch_bgr[0].shape[0] + 1
+    confidence = None
+    for i in range(3):
+        res = cv2.matchTemplate(src_bgr[i], sch_bgr[i], cv2.TM_CCOEFF_NORMED)
+        # 补齐最后一张图之后的行, 按图分块后取各自的最大值
+        res = np.concatenate([res, np.full((pad_h - rows, res.shape[1]), -np.inf, dtype=res.dtype)])
+        max_val = res.reshape(len(padded), pad_h, -1)[:, :rows].max(axis=(1, 2))
+        confidence = max_val if confidence is None else np.minimum(confidence, max_val)
+    return [float(c) for c in confidence]
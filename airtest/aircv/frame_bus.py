@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+from collections import deque
+
+from airtest.utils.logger import get_logger
+from .frame_reader import Frame
+
+LOGGING = get_logger(__name__)
+
+# 只取最新的一帧, 跳过订阅者来不及处理的帧
+POLICY_LATEST = "latest"
+# 按顺序取每一帧, 落后超过FrameBus.slots帧时, 丢弃最旧的帧
+POLICY_QUEUE = "queue"
+
+
+class FrameBus(object):
+    """
+    Fan the decoded frames of one screen stream out to several subscribers,
+    e.g. screen recording, loop_find and the snapshot() calls of the user
+
+    Every frame is decoded once by the LatestFrameReader, and the subscribers get read-only views of the same image.
+    The bus keeps the last `slots` frames only, so the memory stays bounded whatever the subscribers do.
+
+    Args:
+        reader: LatestFrameReader of the screen stream, started by the bus if not started
+        slots: the number of frames kept, default is SLOTS
+        name: name of the publishing thread
+
+    Examples:
+        >>> bus = dev.screen_proxy.get_frame_bus()
+        >>> recording = bus.subscribe(max_fps=10)
+        >>> matching = bus.subscribe(policy=POLICY_LATEST)
+        >>> frame = matching.get()
+        >>> frame.img.flags.writeable
+        False
+        >>> recording.close()
+
+    """
+
+    # 保留的最近帧数
+    SLOTS = 4
+
+    def __init__(self, reader, slots=None, name="frame_bus"):
+        self.reader = reader
+        self.slots = slots or self.SLOTS
+        self.name = name
+        self._frames = deque(maxlen=self.slots)
+        self._subscribers = []
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    @property
+    def latest_seq(self):
+        with self._cond:
+            return self._frames[-1].seq if self._frames else 0
+
+    def start(self):
+        if self.is_alive:
+            return
+        self.reader.start()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._publish_loop, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop publishing, the subscribers waiting for a frame get None, the reader is not stopped"""
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.reader.TIMEOUT)
+        self._thread = None
+
+    def subscribe(self, max_fps=None, policy=POLICY_LATEST):
+        """
+        Subscribe to the frames, start the bus if not started
+
+        Args:
+            max_fps: max frames per second got by the subscriber, None means no limit
+            policy: POLICY_LATEST to get the newest frame each time,
+                    POLICY_QUEUE to get every frame in order, as long as it is still in the slots
+
+        Returns:
+            Subscription
+
+        """
+        if policy not in (POLICY_LATEST, POLICY_QUEUE):
+            raise ValueError("unknown drop policy: %s" % policy)
+        sub = Subscription(self, max_fps, policy)
+        with self._cond:
+            self._subscribers.append(sub)
+        self.start()
+        return sub
+
+    def get(self, newer_than=None, timeout=None):
+        """
+        Get the latest frame as a one-off subscriber, e.g. for snapshot()
+
+        Args:
+            newer_than: wait for a frame whose seq is greater than it
+            timeout: timeout in seconds, default is LatestFrameReader.TIMEOUT
+
+        Returns:
+            Frame(seq, timestamp, img), img is read-only, None if timed out or the bus stopped
+
+        """
+        with self.subscribe() as sub:
+            sub.last_seq = newer_than or 0
+            return sub.get(timeout)
+
+    def unsubscribe(self, sub):
+        with self._cond:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+            self._cond.notify_all()
+
+    def _publish_loop(self):
+        seq = None
+        while not self._stop_event.is_set():
+            frame = self.reader.get(newer_than=seq)
+            if frame is None:
+                if not self.reader.is_alive:
+                    self._stop_event.wait(0.1)
+                continue
+            seq = frame.seq
+            img = frame.img.view()
+            img.flags.writeable = False
+            with self._cond:
+                self._frames.append(Frame(frame.seq, frame.timestamp, img))
+                self._cond.notify_all()
+
+    def _next_frame(self, sub, timeout):
+        """The frame after sub.last_seq according to the policy of sub, None if timed out or stopped"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._stop_event.is_set() or sub.closed or
+                                (self._frames and self._frames[-1].seq > sub.last_seq), timeout)
+            if self._stop_event.is_set() or sub.closed or not self._frames or self._frames[-1].seq <= sub.last_seq:
+                return None
+            if sub.policy == POLICY_LATEST:
+                frame = self._frames[-1]
+            else:
+                frame = next(f for f in self._frames if f.seq > sub.last_seq)
+            if sub.last_seq:
+                # the frames between are dropped for this subscriber, by the policy or by the reader
+                sub.dropped += frame.seq - sub.last_seq - 1
+            sub.last_seq = frame.seq
+            return frame
+
+
+class Subscription(object):
+    """
+    A subscriber of FrameBus, see FrameBus.subscribe()
+
+    Attributes:
+        last_seq: seq of the last frame got
+        dropped: the number of frames skipped since the first frame got
+    """
+
+    def __init__(self, bus, max_fps=None, policy=POLICY_LATEST):
+        self.bus = bus
+        self.max_fps = max_fps
+        self.policy = policy
+        self.last_seq = 0
+        self.dropped = 0
+        self.closed = False
+        self._last_time = 0
+
+    def get(self, timeout=None):
+        """
+        Get the next frame, after sleeping if needed by max_fps
+
+        Args:
+            timeout: timeout in seconds to wait for a new frame, default is LatestFrameReader.TIMEOUT
+
+        Returns:
+            Frame(seq, timestamp, img), img is read-only, None if timed out or the bus stopped
+
+        """
+        if self.max_fps:
+            delay = self._last_time + 1.0 / self.max_fps - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        frame = self.bus._next_frame(self, self.bus.reader.TIMEOUT if timeout is None else timeout)
+        if frame is not None:
+            self._last_time = time.time()
+        return frame
+
+    def __iter__(self):
+        while not self.closed and self.bus.is_alive:
+            frame = self.get()
+            if frame is not None:
+                yield frame
+
+    def close(self):
+        self.closed = True
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+import traceback
+from collections import namedtuple
+
+from airtest.utils.logger import get_logger
+from .utils import string_2_img
+
+LOGGING = get_logger(__name__)
+
+# seq: 帧序号, 从1开始递增, 被丢弃的帧也占用序号; timestamp: 收到该帧的时间;
+# img: 解码后的图像, 所有使用者共享, 只读
+Frame = namedtuple("Frame", ["seq", "timestamp", "img"])
+
+
+class LatestFrameReader(object):
+    """
+    Receive the frames of a screen stream in one thread, decode them in another thread,
+    and keep only the latest decoded frame
+
+    The receiving thread never waits for the decoding: a frame received while the previous one is still
+    waiting to be decoded replaces it, so the decoded frame is always the newest one, never a queued stale one.
+
+    Args:
+        get_frame: callable returning the next encoded frame of the stream, e.g. Minicap.get_frame_from_stream
+        decode: callable converting an encoded frame to an image, default is string_2_img
+        name: name prefix of the threads
+
+    Examples:
+        >>> reader = LatestFrameReader(minicap.get_frame_from_stream)
+        >>> reader.start()
+        >>> frame = reader.get()
+        >>> frame = reader.get(newer_than=frame.seq)  # wait for the next frame
+        >>> reader.stop()
+
+    """
+
+    # 等待新一帧的默认超时时间(秒)
+    TIMEOUT = 3
+    # 停止时等待后台线程退出的时间(秒)
+    STOP_TIMEOUT = 3
+
+    def __init__(self, get_frame, decode=None, name="frame_reader"):
+        self.get_frame = get_frame
+        self.decode = decode or string_2_img
+        self.name = name
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._seq = 0
+        # (seq, timestamp, data) of the newest frame received but not decoded yet
+        self._pending = None
+        # the newest decoded Frame
+        self._frame = None
+        # the number of frames received / decoded / dropped without being decoded
+        self.received = 0
+        self.decoded = 0
+        self.dropped = 0
+
+    @property
+    def is_alive(self):
+        return any(t.is_alive() for t in self._threads) and not self._stop_event.is_set()
+
+    def start(self):
+        if self.is_alive:
+            return
+        self._stop_event.clear()
+        self._threads = [threading.Thread(target=self._receive_loop, name=self.name + "_receive"),
+                         threading.Thread(target=self._decode_loop, name=self.name + "_decode")]
+        for t in self._threads:
+            t.daemon = True
+            t.start()
+
+    def stop(self):
+        """
+        Stop the threads
+
+        Calls from the threads themselves are ignored, e.g. Minicap rebuilds the stream in get_frame_from_stream
+        when the screen rotates, with teardown_stream()
+        """
+        if threading.current_thread() in self._threads:
+            return
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(self.STOP_TIMEOUT)
+        self._threads = []
+
+    def get(self, newer_than=None, timeout=None):
+        """
+        Get the latest decoded frame
+
+        Args:
+            newer_than: wait for a frame whose seq is greater than it, None to return the latest frame at once,
+                        or to wait for the first frame
+            timeout: timeout in seconds, default is TIMEOUT
+
+        Returns:
+            Frame(seq, timestamp, img), None if timed out
+
+        """
+        newer_than = newer_than or 0
+        timeout = self.TIMEOUT if timeout is None else timeout
+        with self._cond:
+            self._cond.wait_for(lambda: (self._frame is not None and self._frame.seq > newer_than)
+                                or self._stop_event.is_set(), timeout)
+            frame = self._frame
+        if frame is None or frame.seq <= newer_than:
+            return None
+        return frame
+
+    def _receive_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                data = self.get_frame()
+            except Exception:
+                if self._stop_event.is_set():
+                    break
+                LOGGING.error("%s receive failed: %s" % (self.name, traceback.format_exc()))
+                self._stop_event.wait(0.1)
+                continue
+            if data is None:
+                continue
+            with self._cond:
+                self.received += 1
+                self._seq += 1
+                if self._pending is not None:
+                    self.dropped += 1
+                self._pending = (self._seq, time.time(), data)
+                self._cond.notify_all()
+
+    def _decode_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._stop_event.is_set())
+                if self._stop_event.is_set():
+                    return
+                seq, timestamp, data = self._pending
+                self._pending = None
+            try:
+                img = self.decode(data)
+            except Exception:
+                # may be black/locked screen or other reason
+                LOGGING.debug("%s decode frame %s failed: %s" % (self.name, seq, traceback.format_exc()))
+                continue
+            if img is None:
+                continue
+            # 同一帧会交给多个使用者, 禁止修改, 需要修改的使用者自行复制
+            img.flags.writeable = False
+            with self._cond:
+                self.decoded += 1
+                self._frame = Frame(seq, timestamp, img)
+                self._cond.notify_all()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Process-wide LRU cache for decoded images.
+
+Template images are read and decoded from disk on every match attempt,
+so polling one template in loop_find would decode the same file again and again.
+The cache keeps decoded images keyed by (filepath, mtime), bounded by total bytes.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from .aircv import imread
+
+
+class ImageCache(object):
+    """
+    LRU cache of numpy images with a size cap in bytes.
+
+    Cached images are marked read-only, consumers must copy them before modifying.
+
+    Args:
+        max_bytes: the maximum total bytes of cached images, 0 or None to disable caching
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self._max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        with self._lock:
+            self._max_bytes = value
+            self._evict()
+
+    def get(self, key):
+        """
+        Get image by key, return None if not cached
+
+        Args:
+            key: hashable cache key
+
+        Returns:
+            cached image or None
+
+        """
+        with self._lock:
+            img = self._items.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img):
+        """
+        Put image into cache, the least recently used images will be evicted when the cache is full
+
+        Args:
+            key: hashable cache key
+            img: numpy image
+
+        Returns:
+            the image (read-only if it has been cached)
+
+        """
+        if img is None or not self._max_bytes or img.nbytes > self._max_bytes:
+            return img
+        img.flags.writeable = False
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old.nbytes
+            self._items[key] = img
+            self.size += img.nbytes
+            self._evict()
+        return img
+
+    def imread(self, filename):
+        """
+        Read image from file through the cache, the file is decoded again once its mtime changes
+
+        Args:
+            filename: image file path
+
+        Returns:
+            read-only image
+
+        """
+        key = self.file_key(filename)
+        img = self.get(key)
+        if img is None:
+            img = self.put(key, imread(filename))
+        return img
+
+    @staticmethod
+    def file_key(filename):
+        """
+        Cache key of a file: (absolute path, mtime)
+
+        Raises FileNotExistError through imread() if the file does not exist.
+        """
+        filepath = os.path.abspath(filename)
+        try:
+            mtime = os.path.getmtime(filepath)
+        except OSError:
+            mtime = None
+        return filepath, mtime
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Cache statistics, used to tune ``max_bytes``
+
+        Returns:
+            dict of hits, misses, evictions, count, size and max_bytes
+
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "count": len(self._items),
+                "size": self.size,
+                "max_bytes": self._max_bytes,
+            }
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def _evict(self):
+        if not self._max_bytes:
+            self.evictions += len(self._items)
+            self._items.clear()
+            self.size = 0
+            return
+        while self.size > self._max_bytes and self._items:
+            _, img = self._items.popitem(last=False)
+            self.size -= img.nbytes
+            self.evictions += 1
@@ -5,15 +5,27 @@
 
 import cv2
 import time
+import hashlib
+import threading
 import numpy as np
+from collections import OrderedDict
 
 from airtest.utils.logger import get_logger
 
 from .error import *  # noqa
 from .utils import generate_result, check_image_valid, print_run_time
 from .cal_confidence import cal_ccoeff_confidence, cal_rgb_confidence
+from .prepared_template import prepare_template, prepare_screen
 
 LOGGING = get_logger(__name__)
+# 每个线程中复用的算子对象(算子对象不保证线程安全): {detector key: {attribute name: detector/matcher}}
+_LOCAL = threading.local()
+# 模板图像的特征点和描述符: {(detector key, shape, image digest): (keypoints, descriptors)}
+_DESCRIPTOR_CACHE = OrderedDict()
+_DESCRIPTOR_CACHE_LOCK = threading.Lock()
+# USE_FLANN使用的FLANN索引算法, 不使用类属性, SIFT/SURF子类的FLANN_INDEX_KDTREE为0(线性索引)
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
 
 
 class KeypointMatching(object):
@@ -25,11 +37,25 @@ class KeypointMatching(object):
     FILTER_RATIO = 0.59
     # 参数: SIFT识别时只找出一对相似特征点时的置信度(confidence)
     ONE_POINT_CONFI = 0.5
+    # 缓存的模板图像特征点数, 同一模板图像在同一算子下只提取一次特征点, 0为不缓存
+    DESCRIPTOR_CACHE_SIZE = 128
+    # 源图像描述符数量不少于FLANN_MIN_DESCRIPTORS时, 使用FLANN匹配代替暴力匹配:
+    # 浮点型描述符(KAZE/SIFT/SURF)使用KD树索引, 二进制描述符(BRISK/ORB/AKAZE/BRIEF)使用LSH索引
+    USE_FLANN = False
+    FLANN_MIN_DESCRIPTORS = 1000
+    # init_detector()创建的算子对象的属性名, 在同一线程中复用
+    DETECTOR_ATTRS = ("detector", "matcher")
+    # init_detector()用到的参数的属性名, 参数不同的算子对象分别复用
+    DETECTOR_PARAMS = ()
 
     def __init__(self, im_search, im_source, threshold=0.8, rgb=True):
         super(KeypointMatching, self).__init__()
-        self.im_source = im_source
-        self.im_search = im_search
+        # im_source可以是PreparedScreen, 多个模板共用同一张截图的特征点
+        self.prepared_source = prepare_screen(im_source)
+        self.im_source = self.prepared_source.image
+        # im_search可以是PreparedTemplate, 复用其已经提取好的特征点
+        self.prepared = prepare_template(im_search)
+        self.im_search = self.prepared.image
         self.threshold = threshold
         self.rgb = rgb
 
@@ -107,9 +133,9 @@ class KeypointMatching(object):
     def _cal_confidence(self, resize_img):
         """计算confidence."""
         if self.rgb:
-            confidence = cal_rgb_confidence(resize_img, self.im_search)
+            confidence = cal_rgb_confidence(resize_img, self.prepared)
         else:
-            confidence = cal_ccoeff_confidence(resize_img, self.im_search)
+            confidence = cal_ccoeff_confidence(resize_img, self.prepared)
         # confidence修正
         confidence = (1 + confidence) / 2
         return confidence
@@ -128,15 +154,78 @@ class KeypointMatching(object):
     def match_keypoints(self, des_sch, des_src):
         """Match descriptors (特征值匹配)."""
         # 匹配两个图片中的特征点集，k=2表示每个特征点取出2个最匹配的对应点:
+        if self.USE_FLANN and len(des_src) >= self.FLANN_MIN_DESCRIPTORS:
+            return self._get_flann_matcher(des_src).knnMatch(des_sch, des_src, k=2)
         return self.matcher.knnMatch(des_sch, des_src, k=2)
 
+    @classmethod
+    def clear_cache(cls):
+        """Clear the cached template descriptors, and the detectors of the current thread."""
+        with _DESCRIPTOR_CACHE_LOCK:
+            _DESCRIPTOR_CACHE.clear()
+        _LOCAL.objects = {}
+
+    def _detector_key(self):
+        """算子对象的复用键: 类和DETECTOR_PARAMS中的参数值."""
+        return (self.__class__, ) + tuple(getattr(self, name) for name in self.DETECTOR_PARAMS)
+
+    def _reuse_detector(self):
+        """init_detector()创建的DETECTOR_ATTRS算子对象在同一线程中复用, 不必每次识别都重新创建."""
+        objects = getattr(_LOCAL, "objects", None)
+        if objects is None:
+            objects = _LOCAL.objects = {}
+        key = self._detector_key()
+        attrs = objects.get(key)
+        if attrs is None:
+            self.init_detector()
+            attrs = objects[key] = {name: getattr(self, name) for name in self.DETECTOR_ATTRS}
+        else:
+            for name, value in attrs.items():
+                setattr(self, name, value)
+
+    def _get_flann_matcher(self, descriptors):
+        """FLANN匹配器, 同样在同一线程中按类复用."""
+        binary = descriptors.dtype == np.uint8
+        key = (self._detector_key(), "flann", binary)
+        objects = getattr(_LOCAL, "objects", None)
+        if objects is None:
+            objects = _LOCAL.objects = {}
+        matcher = objects.get(key)
+        if matcher is None:
+            if binary:
+                index_params = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+            else:
+                index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+            matcher = objects[key] = cv2.FlannBasedMatcher(index_params, dict(checks=50))
+        return matcher
+
+    def _get_template_key_points(self):
+        """获取模板图像的特征点和描述符, 相同内容的模板图像只提取一次."""
+        if not self.DESCRIPTOR_CACHE_SIZE:
+            return self.get_keypoints_and_descriptors(self.im_search)
+        image = np.ascontiguousarray(self.im_search)
+        key = (self._detector_key(), image.shape, hashlib.md5(image).hexdigest())
+        with _DESCRIPTOR_CACHE_LOCK:
+            value = _DESCRIPTOR_CACHE.get(key)
+            if value is not None:
+                _DESCRIPTOR_CACHE.move_to_end(key)
+                return value
+        value = self.get_keypoints_and_descriptors(self.im_search)
+        with _DESCRIPTOR_CACHE_LOCK:
+            _DESCRIPTOR_CACHE[key] = value
+            while len(_DESCRIPTOR_CACHE) > self.DESCRIPTOR_CACHE_SIZE:
+                _DESCRIPTOR_CACHE.popitem(last=False)
+        return value
+
     def _get_key_points(self):
         """根据传入图像,计算图像所有的特征点,并得到匹配特征点对."""
         # 准备工作: 初始化算子
-        self.init_detector()
+        self._reuse_detector()
         # 第一步：获取特征点集，并匹配出特征点对: 返回值 good, pypts, kp_sch, kp_src
-        kp_sch, des_sch = self.get_keypoints_and_descriptors(self.im_search)
-        kp_src, des_src = self.get_keypoints_and_descriptors(self.im_source)
+        # 同一个模板在同一种算子下的特征点是固定的, 只需要计算一次:
+        kp_sch, des_sch = self.prepared.cached(("keypoints", self._detector_key()), self._get_template_key_points)
+        kp_src, des_src = self.prepared_source.cached(("keypoints", self._detector_key()),
+                                                      lambda: self.get_keypoints_and_descriptors(self.im_source))
         # When apply knnmatch , make sure that number of features in both test and
         #       query image is greater than or equal to number of nearest neighbors in knn match.
         if len(kp_sch) < 2 or len(kp_src) < 2:
@@ -145,18 +234,19 @@ class KeypointMatching(object):
         matches = self.match_keypoints(des_sch, des_src)
 
         # good为特征点初选结果，剔除掉前两名匹配太接近的特征点，不是独特优秀的特征点直接筛除(多目标识别情况直接不适用)
+        # FLANN(LSH)匹配时, 个别特征点可能取不到2个对应点
         good = []
-        for m, n in matches:
-            if m.distance < self.FILTER_RATIO * n.distance:
-                good.append(m)
+        for pair in matches:
+            if len(pair) == 2 and pair[0].distance < self.FILTER_RATIO * pair[1].distance:
+                good.append(pair[0])
         # good点需要去除重复的部分，（设定源图像不能有重复点）去重时将src图像中的重复点找出即可
         # 去重策略：允许搜索图像对源图像的特征点映射一对多，不允许多对一重复（即不能源图像上一个点对应搜索图像的多个点）
-        good_diff, diff_good_point = [], [[]]
+        good_diff, diff_good_point = [], set()
         for m in good:
-            diff_point = [int(kp_src[m.trainIdx].pt[0]), int(kp_src[m.trainIdx].pt[1])]
+            diff_point = (int(kp_src[m.trainIdx].pt[0]), int(kp_src[m.trainIdx].pt[1]))
             if diff_point not in diff_good_point:
                 good_diff.append(m)
-                diff_good_point.append(diff_point)
+                diff_good_point.add(diff_point)
         good = good_diff
 
         return kp_sch, kp_src, good
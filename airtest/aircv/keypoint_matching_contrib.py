@@ -24,6 +24,7 @@ class BRIEFMatching(KeypointMatching):
     """FastFeature Matching."""
 
     METHOD_NAME = "BRIEF"  # 日志中的方法名
+    DETECTOR_ATTRS = ("star_detector", "brief_extractor", "matcher")
 
     def init_detector(self):
         """Init keypoint detector object."""
@@ -54,11 +55,6 @@ class BRIEFMatching(KeypointMatching):
         keypoints, descriptors = self.brief_extractor.compute(image, kp)
         return keypoints, descriptors
 
-    def match_keypoints(self, des_sch, des_src):
-        """Match descriptors (特征值匹配)."""
-        # 匹配两个图片中的特征点集，k=2表示每个特征点取出2个最匹配的对应点:
-        return self.matcher.knnMatch(des_sch, des_src, k=2)
-
 
 class SIFTMatching(KeypointMatching):
     """SIFT Matching."""
@@ -92,11 +88,6 @@ class SIFTMatching(KeypointMatching):
         keypoints, descriptors = self.detector.detectAndCompute(image, None)
         return keypoints, descriptors
 
-    def match_keypoints(self, des_sch, des_src):
-        """Match descriptors (特征值匹配)."""
-        # 匹配两个图片中的特征点集，k=2表示每个特征点取出2个最匹配的对应点:
-        return self.matcher.knnMatch(des_sch, des_src, k=2)
-
 
 class SURFMatching(KeypointMatching):
     """SURF Matching."""
@@ -109,6 +100,7 @@ class SURFMatching(KeypointMatching):
     HESSIAN_THRESHOLD = 400
     # SURF识别特征点匹配方法设置:
     FLANN_INDEX_KDTREE = 0
+    DETECTOR_PARAMS = ("HESSIAN_THRESHOLD", "UPRIGHT")
 
     def init_detector(self):
         """Init keypoint detector object."""
@@ -130,8 +122,3 @@ class SURFMatching(KeypointMatching):
         """获取图像特征点和描述符."""
         keypoints, descriptors = self.detector.detectAndCompute(image, None)
         return keypoints, descriptors
-
-    def match_keypoints(self, des_sch, des_src):
-        """Match descriptors (特征值匹配)."""
-        # 匹配两个图片中的特征点集，k=2表示每个特征点取出2个最匹配的对应点:
-        return self.matcher.knnMatch(des_sch, des_src, k=2)
@@ -18,8 +18,9 @@ import time
 from airtest.utils.logger import get_logger
 from airtest.aircv.error import TemplateInputError
 from airtest import aircv
-from .utils import generate_result, check_source_larger_than_search, img_mat_rgb_2_gray, print_run_time
+from .utils import generate_result, check_source_larger_than_search, print_run_time
 from .cal_confidence import cal_rgb_confidence, cal_ccoeff_confidence
+from .prepared_template import prepare_template, prepare_screen
 
 LOGGING = get_logger(__name__)
 
@@ -28,16 +29,27 @@ class MultiScaleTemplateMatching(object):
     """多尺度模板匹配."""
 
     METHOD_NAME = "MSTemplate"
+    # 是否先粗后细地搜索尺度, 为False时按scale_step遍历所有尺度
+    COARSE_TO_FINE = True
+    # 粗搜索的步长是scale_step的倍数
+    COARSE_STEP_FACTOR = 8
+    # 粗搜索后进行细搜索的尺度个数
+    REFINE_PEAKS = 3
 
     def __init__(self, im_search, im_source, threshold=0.8, rgb=True, record_pos=None, resolution=(), scale_max=800, scale_step=0.005):
-        self.im_source = im_source
-        self.im_search = im_search
+        # im_source可以是PreparedScreen, 多个模板共用同一张截图的灰度图和缩放结果
+        self.prepared_source = prepare_screen(im_source)
+        self.im_source = self.prepared_source.image
+        # im_search可以是PreparedTemplate, 复用其灰度图、HSV通道和缩放金字塔
+        self.prepared = prepare_template(im_search)
+        self.im_search = self.prepared.image
         self.threshold = threshold
         self.rgb = rgb
         self.record_pos = record_pos
         self.resolution = resolution
         self.scale_max = scale_max
         self.scale_step = scale_step
+        self._resized_src = None
 
     def find_all_results(self):
         raise NotImplementedError
@@ -49,8 +61,7 @@ class MultiScaleTemplateMatching(object):
         check_source_larger_than_search(self.im_source, self.im_search)
 
         # 第二步：计算模板匹配的结果矩阵res
-        s_gray, i_gray = img_mat_rgb_2_gray(
-            self.im_search), img_mat_rgb_2_gray(self.im_source)
+        s_gray, i_gray = self.prepared.gray, self.prepared_source.gray
         confidence, max_loc, w, h, _ = self.multi_scale_search(
             i_gray, s_gray, ratio_min=0.01, ratio_max=0.99, src_max=self.scale_max, step=self.scale_step, threshold=self.threshold)
 
@@ -69,11 +80,11 @@ class MultiScaleTemplateMatching(object):
             # 如果有颜色校验,对目标区域进行BGR三通道校验:
             img_crop = self.im_source[max_loc[1]:max_loc[1] + h, max_loc[0]: max_loc[0] + w]
             confidence = cal_rgb_confidence(
-                cv2.resize(img_crop, (sch_w, sch_h)), self.im_search)
+                cv2.resize(img_crop, (sch_w, sch_h)), self.prepared)
         else:
             img_crop = self.im_source[max_loc[1]:max_loc[1] + h, max_loc[0]: max_loc[0] + w]
             confidence = cal_ccoeff_confidence(
-                cv2.resize(img_crop, (sch_w, sch_h)), self.im_search)
+                cv2.resize(img_crop, (sch_w, sch_h)), self.prepared)
 
         return confidence
 
@@ -95,20 +106,44 @@ class MultiScaleTemplateMatching(object):
         return middle_point, rectangle
 
     @staticmethod
-    def _resize_by_ratio(src, templ, ratio=1.0, templ_min=10, src_max=800):
-        """根据模板相对屏幕的长边 按比例缩放屏幕"""
-        # 截屏最大尺寸限制
-        sr = min(src_max/max(src.shape),1.0)
-        src = cv2.resize(src, (int(src.shape[1]*sr), int(src.shape[0]*sr)))
+    def _resize_templ(src_shape, templ, ratio=1.0, prepared=None):
+        """根据模板相对屏幕的长边 按比例缩放模板"""
         # 截图尺寸缩放
-        h, w = src.shape[0], src.shape[1]
+        h, w = src_shape[0], src_shape[1]
         th, tw = templ.shape[0], templ.shape[1]
         if th/h >= tw/w:
             tr = (h*ratio)/th
         else:
             tr = (w*ratio)/tw
-        templ = cv2.resize(templ, (max(int(tw*tr), 1), max(int(th*tr), 1)))
-        return src, templ, tr, sr
+        size = (max(int(tw*tr), 1), max(int(th*tr), 1))
+        if prepared is not None and templ is prepared.gray:
+            # 模板的缩放结果只和目标尺寸有关, 从PreparedTemplate的缩放金字塔中取
+            templ = prepared.scaled_gray(size)
+        else:
+            templ = cv2.resize(templ, size)
+        return templ, tr
+
+    def _get_resized_src(self, org_src, src_max=800):
+        """按src_max缩放屏幕, 同一张屏幕在同一缩放比sr下只缩放一次"""
+        sr = min(src_max/max(org_src.shape), 1.0)
+        if org_src is self.prepared_source.gray:
+            # 整张截图的缩放结果保存在PreparedScreen中, 匹配其他模板时复用
+            src = self.prepared_source.cached(("resized_gray", sr), lambda: self._resize_src(org_src, sr))
+            return src, sr
+        cached = self._resized_src
+        if cached is not None and cached[0] is org_src and cached[1] == sr:
+            return cached[2], sr
+        src = self._resize_src(org_src, sr)
+        self._resized_src = (org_src, sr, src)
+        return src, sr
+
+    @staticmethod
+    def _resize_src(org_src, sr):
+        src = cv2.resize(org_src, (int(org_src.shape[1]*sr), int(org_src.shape[0]*sr)))
+        # 加入取值范围干扰, 防止算法过于放大微小差异
+        src[0,0] = 0
+        src[0,1] = 255
+        return src
 
     @staticmethod
     def _org_size(max_loc, w, h, tr, sr):
@@ -117,36 +152,81 @@ class MultiScaleTemplateMatching(object):
         w, h = int((w/sr)), int((h/sr))
         return max_loc, w, h
 
+    def _match_in_scale(self, org_src, org_templ, r, templ_min=10, src_max=800):
+        """在单个尺度r下进行模板匹配, 模板过小时返回None"""
+        src, sr = self._get_resized_src(org_src, src_max)
+        templ, tr = self._resize_templ(src.shape, org_templ, r, prepared=self.prepared)
+        if min(templ.shape) <= templ_min:
+            return None
+        # 缩放金字塔中的模板会被复用, 这里的赋值每次都相同
+        templ[0,0] = 0
+        templ[0,1] = 255
+        result = cv2.matchTemplate(src, templ, cv2.TM_CCOEFF_NORMED)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        h, w = templ.shape
+        return r, max_val, max_loc, w, h, tr, sr
+
+    def _coarse_indexes(self, n):
+        """粗搜索的尺度序号: 每COARSE_STEP_FACTOR个搜索步长取一个, 并包含两端"""
+        factor = self.COARSE_STEP_FACTOR
+        indexes = list(range(0, n + 1, factor))
+        if indexes[-1] != n:
+            indexes.append(n)
+        return indexes
+
     def multi_scale_search(self, org_src, org_templ, templ_min=10, src_max=800, ratio_min=0.01, 
                             ratio_max=0.99, step=0.01, threshold=0.8, time_out=3.0):
-        """多尺度模板匹配"""
-        mmax_val = 0
-        max_info = None
-        r = ratio_min
+        """多尺度模板匹配
+
+        COARSE_TO_FINE为True时先以COARSE_STEP_FACTOR倍步长粗搜索, 再在最优的REFINE_PEAKS个尺度附近按原步长细搜索;
+        为False时按步长遍历所有尺度.
+        """
         t = time.time()
-        while r <= ratio_max:
-            src, templ, tr, sr = self._resize_by_ratio(
-                org_src.copy(), org_templ.copy(), r, src_max=src_max)
-            if min(templ.shape) > templ_min:
-                src[0,0] = templ[0,0] = 0
-                src[0,1] = templ[0,1] = 255
-                result = cv2.matchTemplate(src, templ, cv2.TM_CCOEFF_NORMED)
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                h, w = templ.shape
-                if mmax_val < max_val:
-                    mmax_val = max_val
-                    max_info = (r, max_val, max_loc, w, h, tr, sr)
-                # print((r, max_val, max_loc, w, h, tr, sr))
+        # 尺度序号k对应的缩放比为 ratio_min + k * step
+        n = int((ratio_max - ratio_min) / step + 1e-9)
+        if n < 0:
+            return 0, (0, 0), 0, 0, 0
+        factor = self.COARSE_STEP_FACTOR
+        coarse_to_fine = self.COARSE_TO_FINE and factor > 1 and n + 1 > factor * (self.REFINE_PEAKS + 1)
+        if coarse_to_fine:
+            rounds = [self._coarse_indexes(n)]
+        else:
+            rounds = [list(range(n + 1))]
+
+        results = {}
+        while rounds:
+            for k in rounds.pop(0):
+                if k in results:
+                    continue
+                r = ratio_min + k * step
+                info = self._match_in_scale(org_src, org_templ, r, templ_min=templ_min, src_max=src_max)
+                results[k] = info
+                if info is None:
+                    continue
+                # 超时后只要找到可信的结果就直接返回:
                 time_cost = time.time() - t
-                if time_cost>time_out and max_val >= threshold:
+                _, max_val, max_loc, w, h, tr, sr = info
+                if time_cost > time_out and max_val >= threshold:
                     omax_loc, ow, oh = self._org_size(max_loc, w, h, tr, sr)
                     confidence = self._get_confidence_from_matrix(omax_loc, ow, oh)
                     if confidence >= threshold:
                         return confidence, omax_loc, ow, oh, r
-            r += step
-        if max_info is None:
+            if coarse_to_fine:
+                # 粗搜索结束后, 在得分最高的几个尺度附近进行细搜索:
+                coarse_to_fine = False
+                peaks = sorted((k for k in results if results[k] is not None),
+                               key=lambda k: results[k][1], reverse=True)[:self.REFINE_PEAKS]
+                refine = set()
+                for k in peaks:
+                    refine.update(range(max(k - factor + 1, 0), min(k + factor, n + 1)))
+                rounds.append(sorted(refine))
+
+        found = [k for k in sorted(results) if results[k] is not None]
+        if not found:
             return 0, (0, 0), 0, 0, 0
-        max_r, max_val, max_loc, w, h, tr, sr = max_info
+        # 得分相同时取较小的尺度, 与逐个尺度遍历的结果保持一致
+        best = max(found, key=lambda k: (results[k][1], -k))
+        max_r, max_val, max_loc, w, h, tr, sr = results[best]
         omax_loc, ow, oh = self._org_size(max_loc, w, h, tr, sr)
         confidence = self._get_confidence_from_matrix(omax_loc, ow, oh)
         return confidence, omax_loc, ow, oh, max_r
@@ -167,13 +247,15 @@ class MultiScaleTemplateMatchingPre(MultiScaleTemplateMatching):
             if self.resolution[0]<self.im_search.shape[1] or self.resolution[1]<self.im_search.shape[0]:
                 raise TemplateInputError("error: resolution is too small.")
             # 第二步：计算模板匹配的结果矩阵res
+            i_gray = self.prepared_source.gray
             if not self.record_pos is None:
                 area, self.resolution = self._get_area_scope(self.im_source, self.im_search, self.record_pos, self.resolution)
                 self.im_source = aircv.crop_image(self.im_source, area)
+                i_gray = aircv.crop_image(i_gray, area)
                 check_source_larger_than_search(self.im_source, self.im_search)
             r_min, r_max = self._get_ratio_scope(
                 self.im_source, self.im_search, self.resolution)
-            s_gray, i_gray = img_mat_rgb_2_gray(self.im_search), img_mat_rgb_2_gray(self.im_source)
+            s_gray = self.prepared.gray
             confidence, max_loc, w, h, _ = self.multi_scale_search(
                     i_gray, s_gray, ratio_min=r_min, ratio_max=r_max, step=self.scale_step, 
                     threshold=self.threshold, time_out=1.0)
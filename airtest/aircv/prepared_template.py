@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Images with lazily computed matching state, computed once and reused across matches.
+
+Every matching call used to convert im_search to gray/HSV, detect its keypoints and
+rebuild the scale pyramid again. A PreparedTemplate computes them lazily and keeps them,
+so matching one template against many screens only pays for the screen side.
+A PreparedScreen does the same for the screen side, so that many templates can be
+matched against one screenshot while converting it only once.
+"""
+
+import cv2
+import threading
+
+from .utils import img_mat_rgb_2_gray
+from .cal_confidence import img_mat_rgb_2_hsv
+
+
+class PreparedImage(object):
+    """
+    Image with its lazily computed gray/HSV conversions.
+
+    Args:
+        image: image in BGR format
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self._gray = None
+        self._hsv = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def gray(self):
+        """Gray image used by cv2.matchTemplate."""
+        if self._gray is None:
+            self._gray = img_mat_rgb_2_gray(self.image)
+        return self._gray
+
+    @property
+    def hsv(self):
+        """HSV image used by cal_rgb_confidence."""
+        if self._hsv is None:
+            self._hsv = img_mat_rgb_2_hsv(self.image)
+        return self._hsv
+
+    def hsv_crop(self, x, y, w, h):
+        """
+        HSV image of the area (x, y, w, h)
+
+        The full HSV image is used if it has been computed, otherwise only the area is converted.
+        """
+        if self._hsv is not None:
+            return self._hsv[y:y + h, x:x + w]
+        return img_mat_rgb_2_hsv(self.image[y:y + h, x:x + w])
+
+    def cached(self, key, func):
+        """
+        Compute ``func()`` once for the given key and keep the result
+
+        Args:
+            key: hashable key, e.g. ("keypoints", KAZEMatching)
+            func: function without arguments to compute the value
+
+        Returns:
+            the cached value
+
+        """
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = func()
+            return self._cache[key]
+
+    def __repr__(self):
+        h, w = self.image.shape[:2]
+        return "%s(%sx%s)" % (self.__class__.__name__, w, h)
+
+    def to_json(self):
+        # used by AirtestLogger, do not dump the image arrays into the log file
+        return repr(self)
+
+
+class PreparedTemplate(PreparedImage):
+    """
+    Template image (im_search) with its lazily computed search-side state.
+
+    Args:
+        image: template image, BGR format
+    """
+
+    # 缩放金字塔缓存的最大字节数, 超出后的尺度不再缓存
+    PYRAMID_MAX_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, image):
+        super(PreparedTemplate, self).__init__(image)
+        self._hsv_channels = None
+        self._pyramid_bytes = 0
+
+    @property
+    def hsv_channels(self):
+        """Split HSV channels used by cal_rgb_confidence."""
+        if self._hsv_channels is None:
+            self._hsv_channels = cv2.split(self.hsv)
+        return self._hsv_channels
+
+    def scaled_gray(self, size):
+        """
+        Gray template resized to ``size``, one level of the scale pyramid used by multi-scale matching
+
+        Args:
+            size: (w, h) of the resized template
+
+        Returns:
+            resized gray image
+
+        """
+        key = ("scaled_gray", size)
+        templ = self._cache.get(key)
+        if templ is None:
+            templ = cv2.resize(self.gray, size)
+            with self._lock:
+                if key not in self._cache and self._pyramid_bytes + templ.nbytes <= self.PYRAMID_MAX_BYTES:
+                    self._cache[key] = templ
+                    self._pyramid_bytes += templ.nbytes
+        return templ
+
+
+class PreparedScreen(PreparedImage):
+    """
+    Screen image (im_source) shared by the matching of many templates.
+
+    The gray/HSV conversions, the resized screens of multi-scale matching and the
+    keypoints of each keypoint matching method are computed once per screen.
+
+    Args:
+        image: screen image, BGR format
+        scale: the display coordinates are the image coordinates multiplied by scale,
+            e.g. 2 for a screenshot taken at half the display size
+    """
+
+    def __init__(self, image, scale=1):
+        super(PreparedScreen, self).__init__(image)
+        self.scale = scale
+
+    @property
+    def display_resolution(self):
+        """(width, height) of the display the screenshot was taken from."""
+        h, w = self.image.shape[:2]
+        return int(round(w * self.scale)), int(round(h * self.scale))
+
+    def to_display(self, pos):
+        """Map a position (x, y) in the image to the display coordinates."""
+        if self.scale == 1:
+            return pos
+        return pos[0] * self.scale, pos[1] * self.scale
+
+    def result_to_display(self, match_result):
+        """Map the "result" and "rectangle" of a match result to the display coordinates."""
+        if not match_result or self.scale == 1:
+            return match_result
+        match_result = dict(match_result)
+        match_result["result"] = self.to_display(match_result["result"])
+        if match_result.get("rectangle") is not None:
+            match_result["rectangle"] = [self.to_display(pt) for pt in match_result["rectangle"]]
+        return match_result
+
+
+def prepare_template(im_search):
+    """Wrap im_search into a PreparedTemplate, return it directly if it has been prepared."""
+    if isinstance(im_search, PreparedTemplate):
+        return im_search
+    return PreparedTemplate(im_search)
+
+
+def prepare_screen(im_source):
+    """Wrap im_source into a PreparedScreen, return it directly if it has been prepared."""
+    if isinstance(im_source, PreparedScreen):
+        return im_source
+    return PreparedScreen(im_source)
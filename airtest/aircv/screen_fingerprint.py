@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cheap fingerprint of a screen, used to tell whether the screen has changed between two snapshots.
+
+The screen is downsampled into a grid of tiles, two fingerprints are compared tile by tile,
+so that an unchanged screen does not need to be matched again, and a partly changed
+screen only needs to be matched around the changed tiles.
+"""
+
+import cv2
+import numpy as np
+
+
+class ScreenFingerprint(object):
+    """
+    Downsampled screen, split into TILES x TILES tiles.
+
+    Args:
+        image: screen image, BGR format
+    """
+
+    # 每个方向上的分块数
+    TILES = 16
+    # 每个分块缩小后的边长(像素)
+    TILE_CELLS = 4
+    # 缩小后的像素差超过该值时认为发生了变化, 过滤截图压缩等带来的噪声
+    TOLERANCE = 8
+
+    def __init__(self, image):
+        self.shape = image.shape
+        size = self.TILES * self.TILE_CELLS
+        self.thumbnail = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def changed_tiles(self, other):
+        """
+        Tiles changed since the other fingerprint
+
+        Args:
+            other: ScreenFingerprint of the previous screen
+
+        Returns:
+            bool array of shape (TILES, TILES), True if the tile has changed
+
+        """
+        if other is None or other.shape != self.shape:
+            return np.ones((self.TILES, self.TILES), dtype=bool)
+        diff = np.abs(self.thumbnail - other.thumbnail) > self.TOLERANCE
+        if diff.ndim == 3:
+            diff = diff.any(axis=2)
+        cells = self.TILE_CELLS
+        return diff.reshape(self.TILES, cells, self.TILES, cells).any(axis=(1, 3))
+
+    def same_as(self, other):
+        """Whether the screen is unchanged since the other fingerprint."""
+        return not self.changed_tiles(other).any()
+
+    def changed_area(self, other):
+        """
+        Bounding box of the changed tiles in screen pixels
+
+        Args:
+            other: ScreenFingerprint of the previous screen
+
+        Returns:
+            (xmin, ymin, xmax, ymax), None if nothing changed
+
+        """
+        changed = self.changed_tiles(other)
+        rows, cols = np.nonzero(changed)
+        if rows.size == 0:
+            return None
+        h, w = self.shape[:2]
+        tile_w, tile_h = w / float(self.TILES), h / float(self.TILES)
+        return (int(cols.min() * tile_w), int(rows.min() * tile_h),
+                int(np.ceil((cols.max() + 1) * tile_w)), int(np.ceil((rows.max() + 1) * tile_h)))
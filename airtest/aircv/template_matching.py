@@ -10,10 +10,12 @@
 
 import cv2
 import time
+import numpy as np
 
 from airtest.utils.logger import get_logger
-from .utils import generate_result, check_source_larger_than_search, img_mat_rgb_2_gray, print_run_time
-from .cal_confidence import cal_rgb_confidence
+from .utils import generate_result, check_source_larger_than_search, print_run_time
+from .cal_confidence import cal_hsv_confidence, cal_hsv_confidences
+from .prepared_template import prepare_template, prepare_screen
 
 LOGGING = get_logger(__name__)
 
@@ -23,13 +25,24 @@ class TemplateMatching(object):
 
     METHOD_NAME = "Template"
     MAX_RESULT_COUNT = 10
+    # find_all_results()每批排序的候选峰值数
+    PEAK_CANDIDATES = 256
+    # 模板高度不超过该值时, find_all_results()的彩色可信度批量计算(见cal_hsv_confidences);
+    # 更高的模板拼接后无效的匹配位置太多, 逐个计算更快
+    BATCH_CONFIDENCE_MAX_HEIGHT = 32
 
-    def __init__(self, im_search, im_source, threshold=0.8, rgb=True):
+    def __init__(self, im_search, im_source, threshold=0.8, rgb=True, max_count=None):
         super(TemplateMatching, self).__init__()
-        self.im_source = im_source
-        self.im_search = im_search
+        # im_source可以是PreparedScreen, 多个模板共用同一张截图的灰度图和HSV图
+        self.prepared_source = prepare_screen(im_source)
+        self.im_source = self.prepared_source.image
+        # im_search可以是PreparedTemplate, 复用其预先计算好的灰度图和HSV通道
+        self.prepared = prepare_template(im_search)
+        self.im_search = self.prepared.image
         self.threshold = threshold
         self.rgb = rgb
+        # find_all_results()的结果数上限
+        self.max_count = self.MAX_RESULT_COUNT if max_count is None else max_count
 
     @print_run_time
     def find_all_results(self):
@@ -40,31 +53,72 @@ class TemplateMatching(object):
         # 第二步：计算模板匹配的结果矩阵res
         res = self._get_template_result_matrix()
 
-        # 第三步：依次获取匹配结果
+        # 第三步：按得分从高到低依次取出峰值, 求取可信度
         result = []
         h, w = self.im_search.shape[:2]
-
-        while True:
-            # 本次循环中,取出当前结果矩阵中的最优值
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
-            # 求取可信度:
-            confidence = self._get_confidence_from_matrix(max_loc, max_val, w, h)
-
-            if confidence < self.threshold or len(result) > self.MAX_RESULT_COUNT:
+        peaks = self._iter_peaks(res, w, h)
+        while len(result) < self.max_count:
+            # 每批取出还需要的结果数个峰值, 一起求取可信度
+            batch = [peak for _, peak in zip(range(self.max_count - len(result)), peaks)]
+            if not batch:
                 break
+            confidences = self._get_confidences_from_matrix(batch, w, h)
+            for (max_loc, _), confidence in zip(batch, confidences):
+                if confidence < self.threshold:
+                    return result if result else None
 
-            # 求取识别位置: 目标中心 + 目标区域:
-            middle_point, rectangle = self._get_target_rectangle(max_loc, w, h)
-            one_good_match = generate_result(middle_point, rectangle, confidence)
+                # 求取识别位置: 目标中心 + 目标区域:
+                middle_point, rectangle = self._get_target_rectangle(max_loc, w, h)
+                one_good_match = generate_result(middle_point, rectangle, confidence)
 
-            result.append(one_good_match)
-
-            # 屏蔽已经取出的最优结果,进入下轮循环继续寻找:
-            # cv2.floodFill(res, None, max_loc, (-1000,), max(max_val, 0), flags=cv2.FLOODFILL_FIXED_RANGE)
-            cv2.rectangle(res, (int(max_loc[0] - w / 2), int(max_loc[1] - h / 2)), (int(max_loc[0] + w / 2), int(max_loc[1] + h / 2)), (0, 0, 0), -1)
+                result.append(one_good_match)
 
         return result if result else None
 
+    def _iter_peaks(self, res, w, h):
+        """
+        非极大值抑制: 按得分从高到低依次返回结果矩阵中的峰值(max_loc, max_val).
+
+        不再反复对整个结果矩阵做cv2.minMaxLoc和屏蔽: 先用膨胀一次性取出所有局部极大值作为候选点,
+        只对得分最高的一批候选点排序, 屏蔽已取出峰值周围的(w, h)矩形也只作用在候选点上.
+        """
+        values = res.ravel()
+        # 局部极大值: 不小于3x3邻域内的最大值
+        mask = res >= cv2.dilate(res, np.ones((3, 3), np.uint8))
+        if not self.rgb:
+            # 灰度匹配的可信度即为得分, 低于阈值的点不可能成为结果
+            mask &= res >= self.threshold
+        candidates = np.flatnonzero(mask)
+
+        picked = []
+        count = self.PEAK_CANDIDATES
+        while candidates.size:
+            if candidates.size > count:
+                part = np.argpartition(values[candidates], -count)
+                top, candidates = np.sort(candidates[part[-count:]]), candidates[part[:-count]]
+            else:
+                top, candidates = candidates, candidates[:0]
+            # 得分相同时与minMaxLoc一样, 先取行优先顺序靠前的点
+            top = top[np.argsort(-values[top], kind="stable")]
+            ys, xs = np.divmod(top, res.shape[1])
+            alive = np.ones(top.size, dtype=bool)
+            for loc in picked:
+                alive &= ~self._in_suppressed_rect(xs, ys, loc, w, h)
+            while alive.any():
+                i = int(np.argmax(alive))
+                loc = (int(xs[i]), int(ys[i]))
+                yield loc, float(values[top[i]])
+                picked.append(loc)
+                alive &= ~self._in_suppressed_rect(xs, ys, loc, w, h)
+            count *= 4
+
+    @staticmethod
+    def _in_suppressed_rect(xs, ys, loc, w, h):
+        """已取出的峰值loc周围被屏蔽的(w, h)矩形区域."""
+        x, y = loc
+        return ((xs >= int(x - w / 2)) & (xs <= int(x + w / 2)) &
+                (ys >= int(y - h / 2)) & (ys <= int(y + h / 2)))
+
     @print_run_time
     def find_best_result(self):
         """基于kaze进行图像识别，只筛选出最优区域."""
@@ -90,17 +144,26 @@ class TemplateMatching(object):
         # 求取可信度:
         if self.rgb:
             # 如果有颜色校验,对目标区域进行BGR三通道校验:
-            img_crop = self.im_source[max_loc[1]:max_loc[1] + h, max_loc[0]: max_loc[0] + w]
-            confidence = cal_rgb_confidence(img_crop, self.im_search)
+            hsv_crop = self.prepared_source.hsv_crop(max_loc[0], max_loc[1], w, h)
+            confidence = cal_hsv_confidence(hsv_crop, self.prepared)
         else:
             confidence = max_val
 
         return confidence
 
+    def _get_confidences_from_matrix(self, peaks, w, h):
+        """批量求出峰值[(max_loc, max_val), ...]的confidence, 与逐个调用_get_confidence_from_matrix相同."""
+        if not self.rgb:
+            return [max_val for _, max_val in peaks]
+        if h > self.BATCH_CONFIDENCE_MAX_HEIGHT:
+            return [self._get_confidence_from_matrix(max_loc, max_val, w, h) for max_loc, max_val in peaks]
+        hsv_crops = [self.prepared_source.hsv_crop(max_loc[0], max_loc[1], w, h) for max_loc, _ in peaks]
+        return cal_hsv_confidences(hsv_crops, self.prepared)
+
     def _get_template_result_matrix(self):
         """求取模板匹配的结果矩阵."""
         # 灰度识别: cv2.matchTemplate( )只能处理灰度图片参数
-        s_gray, i_gray = img_mat_rgb_2_gray(self.im_search), img_mat_rgb_2_gray(self.im_source)
+        s_gray, i_gray = self.prepared.gray, self.prepared_source.gray
         return cv2.matchTemplate(i_gray, s_gray, cv2.TM_CCOEFF_NORMED)
 
     def _get_target_rectangle(self, left_top_pos, w, h):
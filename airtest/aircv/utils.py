@@ -66,10 +66,36 @@ def img_2_string(img):
     return png.tostring()
 
 
-def string_2_img(pngstr):
+# cv2.imdecode flags to decode the image at 1/N size, JPEG is scaled down while decoding
+REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def _check_reduce(reduce):
+    if reduce not in REDUCED_COLOR_FLAGS:
+        raise ValueError("reduce should be one of %s, got %r" % (sorted(REDUCED_COLOR_FLAGS), reduce))
+
+
+def string_2_img(pngstr, reduce=1):
+    """
+    Decode the image data into a cv2 image
+
+    Args:
+        pngstr: png/jpg data
+        reduce: decode the image at 1/reduce size, 1, 2, 4 or 8
+
+    Returns:
+        cv2 image, None if the data is empty
+
+    """
+    _check_reduce(reduce)
     nparr = np.frombuffer(pngstr, np.uint8)
     try:
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        img = cv2.imdecode(nparr, REDUCED_COLOR_FLAGS[reduce])
     except cv2.error:
         # cv2.error: OpenCV(4.6.0) D:\a\opencv-python\opencv-python\opencv\modules\imgcodecs\src\loadsave.cpp:816: error: (-215:Assertion failed) !buf.empty() in function 'cv::imdecode_
         # If the image is empty, return None
@@ -77,6 +103,27 @@ def string_2_img(pngstr):
     return img
 
 
+def reduce_image(img, reduce=1):
+    """
+    Resize a decoded image to 1/reduce size, the same size as ``string_2_img(data, reduce)``
+
+    Args:
+        img: cv2 image
+        reduce: 1, 2, 4 or 8
+
+    Returns:
+        resized image, img itself if reduce is 1 or img is None
+
+    """
+    _check_reduce(reduce)
+    if reduce == 1 or img is None:
+        return img
+    h, w = img.shape[:2]
+    # 与IMREAD_REDUCED_COLOR_N一致, 尺寸向上取整
+    size = (max(1, -(-w // reduce)), max(1, -(-h // reduce)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
 def pil_2_cv2(pil_image):
     open_cv_image = np.array(pil_image)
     # Convert RGB to BGR (method-1):
@@ -2,6 +2,7 @@
 import os
 import re
 import sys
+import stat
 import time
 import random
 import platform
@@ -10,11 +11,17 @@ import warnings
 import subprocess
 import threading
 from copy import copy
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor
 from six import PY3, text_type, binary_type
 from six.moves import reduce
 
 from airtest.core.android.constant import (DEFAULT_ADB_PATH, IP_PATTERN,
-                                           SDK_VERISON_ANDROID7)
+                                           SDK_VERISON_ANDROID7, ADB_TRANSPORT)
+from airtest.core.android.adb_socket import AdbSocketClient, AdbFailError, SHELL_V2_STDOUT, SHELL_V2_EXIT
+from airtest.core.android.shell_session import ShellSession
+from airtest.core.android.device_cache import DeviceInfoCache
+from airtest.core.android.device_tracker import DeviceTracker
 from airtest.core.error import (AdbError, AdbShellError, AirtestError,
                                 DeviceConnectionError)
 from airtest.utils.compat import decode_path, raisefrom, proc_communicate_timeout, SUBPROCESS_FLAG
@@ -35,15 +42,45 @@ class ADB(object):
     status_device = "device"
     status_offline = "offline"
     SHELL_ENCODING = "utf-8"
-
-    def __init__(self, serialno=None, adb_path=None, server_addr=None, display_id=None, input_event=None):
+    # ADB_TRANSPORT.SUBPROCESS: run every command with an adb client process
+    # ADB_TRANSPORT.SOCKET: send shell/devices/get-state/forward commands to the adb server socket directly,
+    # other commands still use the adb client process
+    DEFAULT_TRANSPORT = ADB_TRANSPORT.SUBPROCESS
+    # immutable device properties (CACHED_PROPS, max_x/max_y...) keyed on the device id of the current boot,
+    # shared by all ADB objects, None to disable the cache.
+    # Kept in memory only, unless the json file path is set with the env AIRTEST_DEVICE_CACHE
+    DEVICE_CACHE = DeviceInfoCache(os.environ.get("AIRTEST_DEVICE_CACHE") or None)
+    # the getprop keys cached in DEVICE_CACHE, which never change until the device reboots
+    CACHED_PROPS = frozenset([
+        "ro.build.version.sdk", "ro.build.version.release", "ro.build.version.preview_sdk",
+        "ro.product.model", "ro.product.manufacturer", "ro.product.brand", "ro.product.cpu.abi",
+        "ro.sf.lcd_density",
+    ])
+    # the number of threads probing the device in get_device_info() and get_display_info()
+    PROBE_WORKERS = 4
+    # answer devices()/get_status()/wait_for_device() from the DeviceTracker of the adb server,
+    # which keeps one `host:track-devices` connection, instead of an adb process each time.
+    # None: only with ADB_TRANSPORT.SOCKET
+    TRACK_DEVICES = None
+    # seconds to wait for the first device list of a new DeviceTracker, before falling back to `adb devices`
+    TRACKER_READY_TIMEOUT = 1
+    # the number of split apks uploaded at the same time in stream_install()
+    INSTALL_WORKERS = 4
+
+    def __init__(self, serialno=None, adb_path=None, server_addr=None, display_id=None, input_event=None,
+                 transport=None):
         self.serialno = serialno
         self.adb_path = adb_path or self.get_adb_path()
         self.display_id = display_id
         self.input_event = input_event
+        self.transport = (transport or self.DEFAULT_TRANSPORT).upper()
         self._set_cmd_options(server_addr)
+        self.adb_socket = AdbSocketClient(self.host, self.port)
+        # the ShellSession attached, which runs the shell commands instead of new adb processes
+        self.shell_session = None
         self.connect()
         self._sdk_version = None
+        self._device_id = None
         self._line_breaker = None
         self._display_info = {}
         self._display_info_lock = threading.Lock()
@@ -198,9 +235,38 @@ class ADB(object):
         )
         return proc
 
+    def _socket_cmd(self, cmds, device=True, timeout=None):
+        """
+        Run the adb command(s) through the adb server socket
+
+        Args:
+            cmds: command(s) to be run
+            device: if True, the command is sent to the device of `self.serialno`
+            timeout: timeout in seconds
+
+        Raises:
+            RuntimeError: if `device` is True and serialno is not specified, or if the command timed out
+
+        Returns:
+            (stdout, stderr, returncode), None if the command is not supported by the socket transport
+
+        """
+        if device and not self.serialno:
+            raise RuntimeError("please set serialno first")
+        cmds = split_cmd(cmds)
+        LOGGING.debug("adb socket: " + " ".join(cmds))
+        serialno = self.serialno if device else None
+        try:
+            return self.adb_socket.run(cmds, serialno, timeout)
+        except ConnectionRefusedError:
+            # the adb client process starts the adb server automatically, so do we
+            self.start_server()
+            return self.adb_socket.run(cmds, serialno, timeout)
+
     def cmd(self, cmds, device=True, ensure_unicode=True, timeout=None):
         """
-        Run the adb command(s) in subprocess and return the standard output
+        Run the adb command(s) in subprocess and return the standard output,
+        the commands supported by the socket transport are sent to the adb server directly if `self.transport` is SOCKET
 
         Args:
             cmds: command(s) to be run
@@ -216,17 +282,26 @@ class ADB(object):
             command(s) standard output (stdout)
 
         """
-        proc = self.start_cmd(cmds, device)
-        if timeout:
-            stdout, stderr = proc_communicate_timeout(proc, timeout)
+        ret = None
+        if device and self.shell_session is not None:
+            ret = self.shell_session.run(cmds, timeout)
+        if ret is None and self.transport == ADB_TRANSPORT.SOCKET:
+            ret = self._socket_cmd(cmds, device, timeout)
+        if ret is not None:
+            stdout, stderr, returncode = ret
         else:
-            stdout, stderr = proc.communicate()
+            proc = self.start_cmd(cmds, device)
+            if timeout:
+                stdout, stderr = proc_communicate_timeout(proc, timeout)
+            else:
+                stdout, stderr = proc.communicate()
+            returncode = proc.returncode
 
         if ensure_unicode:
             stdout = stdout.decode(get_std_encoding(sys.stdout))
             stderr = stderr.decode(get_std_encoding(sys.stderr))
 
-        if proc.returncode > 0:
+        if returncode > 0:
             # adb connection error
             pattern = DeviceConnectionError.DEVICE_CONNECTION_ERROR
             if isinstance(stderr, binary_type):
@@ -248,6 +323,24 @@ class ADB(object):
         close_pipe(proc.stdout)
         close_pipe(proc.stderr)
 
+    def get_device_tracker(self):
+        """
+        The DeviceTracker of the adb server, shared by the process
+
+        Returns:
+            DeviceTracker, None if TRACK_DEVICES is disabled or the device list is not available
+
+        """
+        track = self.TRACK_DEVICES
+        if track is None:
+            track = self.transport == ADB_TRANSPORT.SOCKET
+        if not track:
+            return None
+        tracker = DeviceTracker.get(self.host, self.port)
+        if tracker.wait_ready(self.TRACKER_READY_TIMEOUT):
+            return tracker
+        return None
+
     def devices(self, state=None):
         """
         Perform `adb devices` command and return the list of adb devices
@@ -259,6 +352,9 @@ class ADB(object):
             list od adb devices
 
         """
+        tracker = self.get_device_tracker()
+        if tracker:
+            return tracker.devices(state)
         patten = re.compile(r'[\w\d.:-]+\t[\w]+$')
         device_list = []
         # self.start_server()
@@ -310,13 +406,23 @@ class ADB(object):
             None if status is `not found`, otherwise return the standard output from `adb get-state` command
 
         """
-        proc = self.start_cmd("get-state")
-        stdout, stderr = proc.communicate()
+        tracker = self.get_device_tracker() if self.serialno else None
+        if tracker:
+            return tracker.get_state(self.serialno)
+        ret = None
+        if self.transport == ADB_TRANSPORT.SOCKET:
+            ret = self._socket_cmd("get-state")
+        if ret is not None:
+            stdout, stderr, returncode = ret
+        else:
+            proc = self.start_cmd("get-state")
+            stdout, stderr = proc.communicate()
+            returncode = proc.returncode
 
         stdout = stdout.decode(get_std_encoding(sys.stdout))
         stderr = stderr.decode(get_std_encoding(sys.stdout))
 
-        if proc.returncode == 0:
+        if returncode == 0:
             return stdout.strip()
         elif "not found" in stderr:
             return None
@@ -337,6 +443,11 @@ class ADB(object):
             None
 
         """
+        tracker = self.get_device_tracker() if self.serialno else None
+        if tracker:
+            if not tracker.wait_for(self.serialno, self.status_device, timeout):
+                raise DeviceConnectionError("device not ready")
+            return
         try:
             self.cmd("wait-for-device", timeout=timeout)
         except RuntimeError as e:
@@ -356,6 +467,27 @@ class ADB(object):
         cmds = ['shell'] + split_cmd(cmds)
         return self.start_cmd(cmds)
 
+    def session(self, attach=False):
+        """
+        Open a shell session, which runs the commands in one long-lived `adb shell` process
+
+        Args:
+            attach: if True, the shell commands of this ADB object run in the session while it is open
+
+        Returns:
+            ShellSession, use it with the `with` statement, or close() it when done
+
+        Examples:
+            >>> with dev.adb.session() as session:
+            ...     out = session.shell("getprop ro.build.version.sdk")
+            ...     outputs = session.batch(["wm size", "wm density", "getevent -p"])
+
+            >>> with dev.adb.session(attach=True):
+            ...     info = dev.adb.get_device_info()
+
+        """
+        return ShellSession(self, attach=attach)
+
     def raw_shell(self, cmds, ensure_unicode=True):
         """
         Handle `adb shell` command(s) with unicode support
@@ -398,14 +530,15 @@ class ADB(object):
             # https://stackoverflow.com/questions/9379400/adb-error-codes
             cmd = split_cmd(cmd) + [";", "echo", "---$?---"]
             out = self.raw_shell(cmd).rstrip()
-            m = re.match("(.*)---(\d+)---$", out, re.DOTALL)
+            # only search the tail of the output, which can be megabytes
+            m = re.compile(r"---(\d+)---$").search(out, max(0, len(out) - 16))
             if not m:
                 warnings.warn("return code not matched")
                 stdout = out
                 returncode = 0
             else:
-                stdout = m.group(1)
-                returncode = int(m.group(2))
+                stdout = out[:m.start()]
+                returncode = int(m.group(1))
             if returncode > 0:
                 raise AdbShellError("", stdout)
             return stdout
@@ -417,6 +550,95 @@ class ADB(object):
             else:
                 return out
 
+    def iter_shell(self, cmd, ensure_unicode=True):
+        """
+        Run the `adb shell` command on the device and yield the output line by line as it arrives,
+        so that huge outputs (e.g. `dumpsys window windows`, `pm list packages`) are not buffered first
+
+        Args:
+            cmd: a command to be run
+            ensure_unicode: decode the lines with SHELL_ENCODING, default is True
+
+        Raises:
+            AdbShellError: if command return value is non-zero, raised after all the lines are yielded
+            DeviceConnectionError: if the device is not connected (socket transport)
+
+        Yields:
+            output lines, line breaks included
+
+        Examples:
+            >>> for line in dev.adb.iter_shell("pm list packages"):
+            ...     print(line.strip())
+
+        """
+        old_sdk = self.sdk_version < SDK_VERISON_ANDROID7
+        if old_sdk:
+            # the exit status is the last line, see shell()
+            cmd = split_cmd(cmd) + [";", "echo", "---$?---"]
+        result = {"stderr": b"", "returncode": 0}
+        held = None
+        pending = b""
+        for chunk in self._iter_shell_chunks(split_cmd(cmd), result):
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                # hold the last line back until the end, it may be the exit status
+                if held is not None:
+                    yield held.decode(self.SHELL_ENCODING, "replace") if ensure_unicode else held
+                held = line + b"\n"
+        if pending:
+            if held is not None:
+                yield held.decode(self.SHELL_ENCODING, "replace") if ensure_unicode else held
+            held = pending
+        if old_sdk and held is not None:
+            m = re.search(br"---(\d+)---\s*$", held)
+            if m:
+                held = held[:m.start()]
+                result["returncode"] = int(m.group(1))
+            else:
+                warnings.warn("return code not matched")
+        if held:
+            yield held.decode(self.SHELL_ENCODING, "replace") if ensure_unicode else held
+        if result["returncode"] > 0:
+            stderr = result["stderr"].decode(get_std_encoding(sys.stderr), "replace")
+            if re.search(DeviceConnectionError.DEVICE_CONNECTION_ERROR, stderr):
+                raise DeviceConnectionError(stderr)
+            raise AdbShellError("", stderr)
+
+    def _iter_shell_chunks(self, cmds, result):
+        """
+        Yield the stdout chunks of the `adb shell` command, then set `stderr` and `returncode` of result dict
+        """
+        if self.transport == ADB_TRANSPORT.SOCKET:
+            stderr = []
+            try:
+                for packet_id, data in self.adb_socket.shell_stream(" ".join(cmds), self.serialno):
+                    if packet_id == SHELL_V2_STDOUT:
+                        yield data
+                    elif packet_id == SHELL_V2_EXIT:
+                        result["returncode"] = data or 0
+                    else:
+                        stderr.append(data)
+            except AdbFailError as e:
+                # same as the adb client process
+                stderr.append(("error: %s\n" % e).encode("utf-8"))
+                result["returncode"] = 1
+            result["stderr"] = b"".join(stderr)
+            return
+        proc = self.start_shell(cmds)
+        try:
+            while True:
+                chunk = proc.stdout.read1(65536) if PY3 else proc.stdout.readline()
+                if not chunk:
+                    break
+                yield chunk
+            result["stderr"] = proc.stderr.read()
+            result["returncode"] = proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            self.close_proc_pipe(proc)
+
     def keyevent(self, keyname):
         """
         Perform `adb shell input keyevent` command on the device
@@ -442,7 +664,10 @@ class ADB(object):
             propery value
 
         """
-        prop = self.raw_shell(['getprop', key])
+        if key in self.CACHED_PROPS:
+            prop = self._cached_property("getprop:" + key, lambda: self.raw_shell(['getprop', key]))
+        else:
+            prop = self.raw_shell(['getprop', key])
         if strip:
             if "\r\r\n" in prop:
                 # Some mobile phones will output multiple lines of extra log
@@ -455,6 +680,52 @@ class ADB(object):
                 prop = prop.strip("\r\n")
         return prop
 
+    @property
+    def device_id(self):
+        """
+        Get the id of the device in its current boot: `ro.serialno` and `/proc/sys/kernel/random/boot_id`,
+        which changes when the device reboots
+
+        Returns:
+            "serialno/boot_id", "" if the boot_id can not be read
+
+        """
+        if self._device_id is None:
+            out = self.raw_shell("getprop ro.serialno;cat /proc/sys/kernel/random/boot_id")
+            lines = [line.strip() for line in out.splitlines()]
+            if len(lines) == 2 and len(lines[1]) == 36:
+                self._device_id = "%s/%s" % tuple(lines)
+            else:
+                self._device_id = ""
+        return self._device_id
+
+    def _cached_property(self, key, func):
+        """
+        Get an immutable property of the device from DEVICE_CACHE, call func() to get it on a miss
+
+        Args:
+            key: property name
+            func: function returning the json serializable value of the property
+
+        Returns:
+            property value
+
+        """
+        if self.DEVICE_CACHE is None or not self.serialno:
+            return func()
+        try:
+            device_id = self.device_id
+        except AdbError:
+            device_id = None
+        if not device_id:
+            return func()
+        value = self.DEVICE_CACHE.get(self.serialno, device_id, key)
+        if value is None:
+            value = func()
+            if value is not None:
+                self.DEVICE_CACHE.set(self.serialno, device_id, key, value)
+        return value
+
     @property
     @retries(max_tries=3)
     def sdk_version(self):
@@ -469,13 +740,52 @@ class ADB(object):
             self._sdk_version = int(self.getprop(keyname))
         return self._sdk_version
 
-    def push(self, local, remote):
+    @contextmanager
+    def sync(self, timeout=None):
+        """
+        Open a sync connection to the device, to push/pull files without adb client processes
+
+        Args:
+            timeout: socket timeout in seconds
+
+        Raises:
+            DeviceConnectionError: if the device is not found
+            AdbError: if a sync request failed, e.g. permission denied
+
+        Examples:
+            >>> with adb.sync() as sync:
+            ...     sync.push("test.txt", "/data/local/tmp/test.txt")
+            ...     print(sync.stat("/data/local/tmp/test.txt"))
+
+        Yields:
+            AdbSyncConnection
+
+        """
+        if not self.serialno:
+            raise RuntimeError("please set serialno first")
+        try:
+            with ExitStack() as stack:
+                try:
+                    sync = stack.enter_context(self.adb_socket.sync(self.serialno, timeout))
+                except ConnectionRefusedError:
+                    self.start_server()
+                    sync = stack.enter_context(self.adb_socket.sync(self.serialno, timeout))
+                yield sync
+        except AdbFailError as e:
+            if re.search(DeviceConnectionError.DEVICE_CONNECTION_ERROR, "error: %s" % e):
+                raise DeviceConnectionError("error: %s" % e)
+            raise AdbError("", "error: %s" % e)
+
+    def push(self, local, remote, progress=None):
         """
         Push file or folder to the specified directory to the device
 
+        With the socket transport, the files are sent over one sync connection, to the same destination as below
+
         Args:
             local: local file or folder to be copied to the device
             remote: destination on the device where the file will be copied
+            progress: callback(local_file, sent_bytes, total_bytes), socket transport only
 
         Returns:
             The file path saved in the phone may be enclosed in quotation marks, eg. '"test\ file.txt"'
@@ -494,23 +804,13 @@ class ADB(object):
             >>> adb.push("test_dir", "/sdcard/Android/data/com.test.package/files/test_dir")
 
         """
-        _, ext = os.path.splitext(remote)
-        if ext or os.path.isfile(remote):
-            # The target path is a file
-            dst_parent = os.path.dirname(remote)
-        else:
-            dst_parent = remote
-
-        # If the target file already exists, delete it first to avoid overwrite failure
+        if self.transport == ADB_TRANSPORT.SOCKET:
+            return self._sync_push(local, remote, progress)
+        dst_parent, dst_path = self._push_dst(local, remote)
         src_filename = os.path.basename(local)
         _, src_ext = os.path.splitext(local)
-        if src_ext:
-            dst_path = f"{dst_parent}/{src_filename}"
-        else:
-            if src_filename == os.path.basename(remote):
-                dst_path = remote
-            else:
-                dst_path = f"{dst_parent}/{src_filename}"
+
+        # If the target file already exists, delete it first to avoid overwrite failure
         try:
             self.shell(f"rm -r {dst_path}")
         except:
@@ -548,13 +848,103 @@ class ADB(object):
                     pass
         return dst_path
 
-    def pull(self, remote, local=""):
+    @staticmethod
+    def _push_dst(local, remote):
+        """
+        Destination of push(): a remote path with an extension is a file, otherwise a directory
+
+        Returns:
+            (dst_parent, dst_path), the directory to create and the path returned by push()
+        """
+        _, ext = os.path.splitext(remote)
+        if ext or os.path.isfile(remote):
+            # The target path is a file
+            dst_parent = os.path.dirname(remote)
+        else:
+            dst_parent = remote
+
+        src_filename = os.path.basename(local)
+        _, src_ext = os.path.splitext(local)
+        if src_ext:
+            dst_path = f"{dst_parent}/{src_filename}"
+        else:
+            if src_filename == os.path.basename(remote):
+                dst_path = remote
+            else:
+                dst_path = f"{dst_parent}/{src_filename}"
+        return dst_parent, dst_path
+
+    def _sync_push(self, local, remote, progress=None):
+        """
+        Push file or folder over the sync protocol, to the same destination as the subprocess transport
+
+        A file is pushed to `remote` if it is a file path, otherwise into it, and the contents of a folder
+        are pushed into the dst_path of `_push_dst`, which is removed first.
+
+        Returns:
+            dst_path of `_push_dst`
+        """
+        local = decode_path(local)
+        dst_parent, dst_path = self._push_dst(local, remote)
+        local = os.path.abspath(local)
+        if os.path.isfile(local):
+            target = remote if dst_parent != remote else f"{dst_parent}/{os.path.basename(local)}"
+            files = [(local, target)]
+        else:
+            target = dst_path
+            files = []
+            for root, _, filenames in os.walk(local):
+                rel = os.path.relpath(root, local).replace(os.sep, "/")
+                for filename in filenames:
+                    dst = target if rel == "." else target + "/" + rel
+                    files.append((os.path.join(root, filename), dst + "/" + filename))
+
+        # If the target already exists, delete it first, and create the target folder
+        try:
+            self.shell(f'rm -r "{target}"; mkdir -p "{dst_parent}"')
+        except AdbError:
+            pass
+        with self.sync() as sync:
+            for src, dst in files:
+                callback = (lambda sent, total, src=src: progress(src, sent, total)) if progress else None
+                sync.push(src, dst, progress=callback, skip_same=False)
+        return dst_path
+
+    def _sync_pull(self, remote, local, progress=None):
+        """
+        Pull file or folder over the sync protocol, same destination as `adb pull`
+        """
+        with self.sync() as sync:
+            remote_stat = sync.stat(remote)
+            if remote_stat is None:
+                raise AdbError("", "adb: error: failed to stat remote object '%s': No such file or directory" % remote)
+            if os.path.isdir(local):
+                local = os.path.join(local, os.path.basename(remote.rstrip("/")))
+            dirs = [(remote.rstrip("/"), local)] if stat.S_ISDIR(remote_stat[0]) else []
+            if not dirs:
+                sync.pull(remote, local, progress=(lambda r, t: progress(remote, r, t)) if progress else None)
+            while dirs:
+                remote_dir, local_dir = dirs.pop()
+                if not os.path.isdir(local_dir):
+                    os.makedirs(local_dir)
+                for name, mode, _, _ in sync.list(remote_dir):
+                    if name in (".", ".."):
+                        continue
+                    src, dst = remote_dir + "/" + name, os.path.join(local_dir, name)
+                    if stat.S_ISDIR(mode):
+                        dirs.append((src, dst))
+                    elif stat.S_ISREG(mode):
+                        callback = (lambda r, t, src=src: progress(src, r, t)) if progress else None
+                        sync.pull(src, dst, progress=callback)
+
+    def pull(self, remote, local="", progress=None):
         """
         Perform `adb pull` command
 
         Args:
             remote: remote file to be downloaded from the device
             local: local destination where the file will be downloaded from the device
+            progress: callback(remote_file, received_bytes, total_bytes), socket transport only
 
         Note:
             If <=PY3, the path in Windows cannot be the root directory, and cannot contain symbols such as /g in the path
@@ -566,6 +956,8 @@ class ADB(object):
         if not local:
             local = os.path.basename(remote)
         local = decode_path(local)  # py2
+        if self.transport == ADB_TRANSPORT.SOCKET:
+            return self._sync_pull(remote, local, progress)
         if PY3:
             # If python3, use Path to force / convert to \
             from pathlib import Path
@@ -832,6 +1224,143 @@ class ADB(object):
             # delete apk file
             self.cmd(["shell", "rm", device_path], timeout=30)
 
+    def exec_in(self, cmds, filepath, timeout=None):
+        """
+        Run the command on the device with the local file streamed to its stdin, without pushing the file
+
+        Args:
+            cmds: command(s) to be run on the device
+            filepath: local file
+            timeout: timeout in seconds
+
+        Raises:
+            DeviceConnectionError: if the device is not found
+
+        Returns:
+            command output
+
+        """
+        if not self.serialno:
+            raise RuntimeError("please set serialno first")
+        cmds = split_cmd(cmds)
+        with open(filepath, "rb") as f:
+            if self.transport == ADB_TRANSPORT.SOCKET:
+                try:
+                    return self.adb_socket.exec_in(" ".join(cmds), f, self.serialno, timeout).decode(
+                        self.SHELL_ENCODING, "replace")
+                except AdbFailError as e:
+                    raise DeviceConnectionError("error: %s" % e)
+            # `adb shell -T` forwards stdin with the shell v2 protocol
+            cmds = self.cmd_options + ["-s", self.serialno, "shell", "-T"] + cmds
+            LOGGING.debug(" ".join(cmds))
+            proc = subprocess.Popen(cmds, stdin=f, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    creationflags=SUBPROCESS_FLAG)
+            stdout, stderr = proc_communicate_timeout(proc, timeout) if timeout else proc.communicate()
+        stderr = stderr.decode(get_std_encoding(sys.stderr), "replace")
+        if proc.returncode and re.search(DeviceConnectionError.DEVICE_CONNECTION_ERROR, stderr):
+            raise DeviceConnectionError(stderr)
+        return stdout.decode(self.SHELL_ENCODING, "replace") + stderr
+
+    def stream_install(self, filepath, replace=False, install_options=None, skip_same_version=True):
+        """
+        Install the apk, or the base and split apks of an app, by streaming them to `cmd package`,
+        without copying them to the device tmp dir first
+
+        The split apks are written to one install session at the same time. Requires SDK >= 24,
+        `adb install-multiple` or `pm_install` is used on the older devices.
+
+        Args:
+            filepath: full path of the apk, or list of the base apk and split apks
+            replace: force to replace existing application, default is False
+            install_options: list of options, e.g. ["-t", "-d", "-g"], see install_app
+            skip_same_version: do not install if the device already has the package at the versionCode of the apk
+
+        Raises:
+            AdbShellError: if the installation failed
+
+        Returns:
+            command output, "Skipped" if not installed
+
+        Examples:
+            >>> adb.stream_install("test.apk", replace=True)
+            >>> adb.stream_install(["base.apk", "split_config.arm64_v8a.apk", "split_config.xxhdpi.apk"])
+
+        """
+        filepaths = [filepath] if isinstance(filepath, (text_type, binary_type)) else list(filepath)
+        filepaths = [decode_path(f) for f in filepaths]
+        for f in filepaths:
+            if not os.path.isfile(f):
+                raise RuntimeError("file: %s does not exists" % (repr(f)))
+        install_options = list(install_options) if isinstance(install_options, list) else []
+        if replace:
+            install_options.append("-r")
+
+        if skip_same_version:
+            apk = APK(filepaths[0])
+            version_code = apk.get_androidversion_code()
+            if version_code and self.get_package_version(apk.get_package()) == int(version_code):
+                LOGGING.info("%s versionCode %s is already installed, skip" % (apk.get_package(), version_code))
+                return "Skipped"
+
+        if self.sdk_version < SDK_VERISON_ANDROID7:
+            if len(filepaths) == 1:
+                self.pm_install(filepaths[0], install_options=install_options)
+                return "Success"
+            return self.cmd(["install-multiple"] + install_options + filepaths)
+
+        try:
+            out = self._stream_install(filepaths, install_options)
+        except AdbShellError as e:
+            # If the signatures are inconsistent, uninstall the old version first
+            if "INSTALL_FAILED_UPDATE_INCOMPATIBLE" in e.stderr and replace:
+                self.uninstall_app(APK(filepaths[0]).get_package())
+                out = self._stream_install(filepaths, install_options)
+            else:
+                raise
+        return out
+
+    def _stream_install(self, filepaths, install_options):
+        if len(filepaths) == 1:
+            size = os.path.getsize(filepaths[0])
+            out = self.exec_in(["cmd", "package", "install", "-S", str(size)] + install_options, filepaths[0])
+            if "Success" not in out:
+                raise AdbShellError("Installation Failure", out)
+            return out
+
+        total = sum(os.path.getsize(f) for f in filepaths)
+        out = self._exec_out(["cmd", "package", "install-create", "-S", str(total)] + install_options)
+        m = re.search(r"\[(\d+)\]", out)
+        if not m:
+            raise AdbShellError("Installation Failure", out)
+        session = m.group(1)
+
+        def write(item):
+            index, f = item
+            # the names must be unique in the session
+            name = "%d_%s" % (index, os.path.basename(f))
+            size = str(os.path.getsize(f))
+            return self.exec_in(["cmd", "package", "install-write", "-S", size, session, name, "-"], f)
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(len(filepaths), self.INSTALL_WORKERS)) as pool:
+                for write_out in pool.map(write, enumerate(filepaths)):
+                    if "Success" not in write_out:
+                        raise AdbShellError("Installation Failure", write_out)
+            out = self._exec_out(["cmd", "package", "install-commit", session])
+            if "Success" not in out:
+                raise AdbShellError("Installation Failure", out)
+            return out
+        except Exception:
+            try:
+                self._exec_out(["cmd", "package", "install-abandon", session])
+            except Exception:
+                pass
+            raise
+
+    def _exec_out(self, cmds):
+        """Run `adb exec-out` command and return its output, exec-out has no exit status"""
+        return self.cmd(["exec-out"] + split_cmd(cmds)).replace("\r\n", "\n")
+
     def uninstall_app(self, package):
         """
         Perform `adb uninstall` command
@@ -875,6 +1404,20 @@ class ADB(object):
             raw = self.cmd('shell screencap -p', ensure_unicode=False)
         return raw.replace(self.line_breaker, b"\n")
 
+    def screencap_raw(self):
+        """
+        Take the screenshot of the device display with `adb exec-out screencap`, without PNG encoding
+
+        exec-out does not use a pty, so the output needs no line breaker replacement, requires SDK >= 21
+
+        Returns:
+            header (width, height, pixel format[, color space], 4 bytes each) + raw pixels
+
+        """
+        if self.display_id:
+            return self.cmd('exec-out screencap -d {0}'.format(self.display_id), ensure_unicode=False)
+        return self.cmd('exec-out screencap', ensure_unicode=False)
+
     # PEP 3113 -- Removal of Tuple Parameter Unpacking
     # https://www.python.org/dev/peps/pep-3113/
     def touch(self, tuple_xy):
@@ -1061,9 +1604,11 @@ class ADB(object):
             }
 
         """
-        display_info = self.getPhysicalDisplayInfo()
-        orientation = self.getDisplayOrientation()
-        max_x, max_y = self.getMaxXY()
+        with ThreadPoolExecutor(max_workers=self.PROBE_WORKERS, thread_name_prefix="airtest-adb-probe") as executor:
+            display_info = executor.submit(self.getPhysicalDisplayInfo)
+            orientation = executor.submit(self.getDisplayOrientation)
+            max_xy = executor.submit(self.getMaxXY)
+            display_info, orientation, (max_x, max_y) = display_info.result(), orientation.result(), max_xy.result()
         display_info.update({
             "orientation": orientation,
             "rotation": orientation * 90,
@@ -1080,6 +1625,11 @@ class ADB(object):
             max x and max y coordinates
 
         """
+        # the touch panel never changes
+        max_x, max_y = self._cached_property("max_xy", lambda: list(self._get_max_xy()))
+        return max_x, max_y
+
+    def _get_max_xy(self):
         ret = self.shell('getevent -p').split('\n')
         max_x, max_y = None, None
         for i in ret:
@@ -1718,8 +2268,7 @@ class ADB(object):
         return res.strip()
 
     def get_cpuabi(self):
-        res = self.shell("getprop ro.product.cpu.abi")
-        return res.strip()
+        return self.getprop("ro.product.cpu.abi")
 
     def get_gpu(self):
         res = self.shell("dumpsys SurfaceFlinger")
@@ -1767,16 +2316,18 @@ class ADB(object):
             "manufacturer": self.get_manufacturer,
             # "battery": getBatteryCapacity
         }
+        def safe_call(func):
+            try:
+                return func()
+            except Exception:
+                return None
+
         ret = {}
+        # the probes are independent, run them at the same time
+        with ThreadPoolExecutor(max_workers=self.PROBE_WORKERS, thread_name_prefix="airtest-adb-probe") as executor:
+            futures = {k: executor.submit(safe_call, v) for k, v in handlers.items() if callable(v)}
         for k, v in handlers.items():
-            if callable(v):
-                try:
-                    value = v()
-                except Exception:
-                    value = None
-                ret[k] = value
-            else:
-                ret[k] = v
+            ret[k] = futures[k].result() if k in futures else v
         return ret
 
     def get_display_of_all_screen(self, info, package=None):
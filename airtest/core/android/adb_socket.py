@@ -0,0 +1,732 @@
+# -*- coding: utf-8 -*-
+"""
+Run adb commands through the smart-socket protocol of the adb server, without starting an adb client process.
+
+Every request sent to the adb server (tcp:5037 by default) is a 4 hex digits length followed by the payload,
+and the server replies with "OKAY", or with "FAIL" followed by a 4 hex digits length and the error message.
+See https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/main/SERVICES.TXT
+"""
+import os
+import stat
+import time
+import select
+import socket
+import struct
+import threading
+from collections import deque
+from contextlib import closing, contextmanager
+from six import text_type
+from six.moves import queue
+
+from airtest.utils.logger import get_logger
+from airtest.utils.safesocket import SafeSocket
+
+LOGGING = get_logger(__name__)
+
+# packet ids of the shell v2 protocol, each packet is: id(1 byte) + length(4 bytes, little endian) + data
+SHELL_V2_STDOUT = 1
+SHELL_V2_STDERR = 2
+SHELL_V2_EXIT = 3
+
+
+class AdbFailError(Exception):
+    """The adb server replied FAIL to a request"""
+    pass
+
+
+class AdbConnection(object):
+    """
+    One connection to the adb server
+
+    Args:
+        host: adb server host
+        port: adb server port
+        timeout: socket timeout in seconds, None means blocking
+    """
+
+    def __init__(self, host, port, timeout=None):
+        self.sock = SafeSocket(socket.create_connection((host, port), timeout=timeout))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def send_request(self, request):
+        if isinstance(request, text_type):
+            request = request.encode("utf-8")
+        self.sock.send(("%04x" % len(request)).encode("ascii") + request)
+
+    def read_status(self):
+        """
+        Read the reply status of the last request
+
+        Raises:
+            AdbFailError: if the server replied FAIL
+
+        """
+        status = self.sock.recv(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbFailError(self.read_string().decode("utf-8", "replace"))
+        raise AdbFailError("unexpected reply from the adb server: %r" % status)
+
+    def read_string(self):
+        """Read a string prefixed with its 4 hex digits length"""
+        length = int(self.sock.recv(4), 16)
+        return self.sock.recv(length) if length else b""
+
+    def request(self, request):
+        """Send the request and check its reply status"""
+        self.send_request(request)
+        self.read_status()
+
+    def recv(self, size):
+        return self.sock.recv(size)
+
+    def settimeout(self, timeout):
+        self.sock.sock.settimeout(timeout)
+
+    def is_alive(self):
+        """An idle connection is readable only if the server closed it or sent something unexpected"""
+        try:
+            readable, _, _ = select.select([self.sock.sock], [], [], 0)
+        except (ValueError, socket.error):
+            return False
+        return not readable and not self.sock.buf
+
+    def iter_chunks(self):
+        """Yield the data received until the server closes the connection"""
+        if self.sock.buf:
+            yield self.sock.buf
+            self.sock.buf = b""
+        while True:
+            chunk = self.sock.sock.recv(65536)
+            if not chunk:
+                break
+            yield chunk
+
+    def read_all(self):
+        """Read until the server closes the connection"""
+        return b"".join(self.iter_chunks())
+
+    def close(self):
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+
+class AdbConnectionPool(object):
+    """
+    Idle connections to the adb server, already switched to the transport of a device
+
+    A connection to the adb server serves only one service after `host:transport`, so the pool cannot reuse
+    it afterwards. Instead it keeps spare connections which have done the connect and the transport handshake
+    ahead of time, and opens a new spare in the background after each borrow, so that a command only costs
+    the round trip of its own service.
+
+    Connections are keyed by (host, port, serialno).
+    """
+
+    # 每个设备保留的空闲连接数上限
+    MAX_IDLE = 2
+    # 每个设备同时使用的连接数上限, 避免大量并发命令压垮adb server
+    MAX_ACTIVE = 8
+    # 空闲超过该时长(秒)的连接会被关闭
+    IDLE_TIMEOUT = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> deque of (connection, idle since)
+        self._idle = {}
+        self._semaphores = {}
+        self._factories = {}
+        self._metrics = {}
+        self._refill_queue = queue.Queue()
+        self._refill_thread = None
+
+    def _init_key(self, key, factory):
+        with self._lock:
+            if key not in self._idle:
+                self._idle[key] = deque()
+                self._semaphores[key] = threading.BoundedSemaphore(self.MAX_ACTIVE)
+                self._metrics[key] = {
+                    "borrows": 0,
+                    "hits": 0,
+                    "misses": 0,
+                    "evictions": 0,
+                    "in_use": 0,
+                    "borrow_time": 0.0,
+                    "max_borrow_time": 0.0,
+                }
+            self._factories[key] = factory
+
+    @contextmanager
+    def borrow(self, key, factory, timeout=None):
+        """
+        Borrow a connection, which is closed when given back
+
+        Args:
+            key: (host, port, serialno)
+            factory: function(timeout) opening a new connection switched to the device
+            timeout: socket timeout of the connection
+
+        Yields:
+            AdbConnection
+
+        """
+        self._init_key(key, factory)
+        start = time.time()
+        with self._semaphores[key]:
+            conn = self._pop_idle(key)
+            hit = conn is not None
+            if hit:
+                conn.settimeout(timeout)
+            else:
+                conn = factory(timeout)
+            borrow_time = time.time() - start
+            with self._lock:
+                metrics = self._metrics[key]
+                metrics["borrows"] += 1
+                metrics["hits" if hit else "misses"] += 1
+                metrics["in_use"] += 1
+                metrics["borrow_time"] += borrow_time
+                metrics["max_borrow_time"] = max(metrics["max_borrow_time"], borrow_time)
+            self._schedule_refill(key)
+            try:
+                yield conn
+            finally:
+                conn.close()
+                with self._lock:
+                    self._metrics[key]["in_use"] -= 1
+
+    def _pop_idle(self, key):
+        """Pop the newest healthy idle connection, evict the expired and the broken ones"""
+        expired = time.time() - self.IDLE_TIMEOUT
+        evicted = []
+        conn = None
+        with self._lock:
+            idle = self._idle[key]
+            while idle and conn is None:
+                candidate, since = idle.pop()
+                if since > expired and candidate.is_alive():
+                    conn = candidate
+                else:
+                    evicted.append(candidate)
+            self._metrics[key]["evictions"] += len(evicted)
+        for c in evicted:
+            c.close()
+        return conn
+
+    def _schedule_refill(self, key):
+        with self._lock:
+            if self._refill_thread is None:
+                self._refill_thread = threading.Thread(target=self._refill_loop, name="adb_pool_refill")
+                self._refill_thread.daemon = True
+                self._refill_thread.start()
+        self._refill_queue.put(key)
+
+    def _refill_loop(self):
+        while True:
+            try:
+                key = self._refill_queue.get(timeout=self.IDLE_TIMEOUT)
+            except queue.Empty:
+                self.prune()
+                continue
+            with self._lock:
+                if len(self._idle[key]) >= self.MAX_IDLE:
+                    continue
+                factory = self._factories[key]
+            try:
+                conn = factory(None)
+            except Exception as e:
+                # e.g. the device is gone, the next borrow will report the error
+                LOGGING.debug("adb pool refill %s failed: %s" % (key, e))
+                continue
+            with self._lock:
+                self._idle[key].append((conn, time.time()))
+
+    def prune(self):
+        """Close the idle connections expired or closed by the server"""
+        expired = time.time() - self.IDLE_TIMEOUT
+        evicted = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = deque()
+                for conn, since in idle:
+                    if since > expired and conn.is_alive():
+                        keep.append((conn, since))
+                    else:
+                        evicted.append(conn)
+                        self._metrics[key]["evictions"] += 1
+                self._idle[key] = keep
+        for conn in evicted:
+            conn.close()
+
+    def clear(self):
+        """Close all idle connections"""
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn, _ in idle]
+            for idle in self._idle.values():
+                idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def metrics(self, key):
+        """
+        Metrics of the connections of the key
+
+        Returns:
+            dict of borrows, hits, misses, evictions, in_use, idle, borrow_time (total seconds), max_borrow_time
+
+        """
+        with self._lock:
+            if key not in self._metrics:
+                return None
+            metrics = dict(self._metrics[key])
+            metrics["idle"] = len(self._idle[key])
+        return metrics
+
+
+class AdbSyncConnection(object):
+    """
+    File transfer over the sync protocol of adbd, all the operations reuse the same connection
+
+    Every sync request is an id (4 bytes) + length (4 bytes, little endian) + data,
+    see https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/main/SYNC.TXT
+
+    Args:
+        conn: AdbConnection switched to the device, after the `sync:` request
+    """
+
+    # 每个DATA包的最大长度, 与adb一致
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _send(self, sync_id, data=b""):
+        if isinstance(data, text_type):
+            data = data.encode("utf-8")
+        self.conn.sock.send(sync_id + struct.pack("<I", len(data)) + data)
+
+    def _recv_header(self):
+        header = self.conn.recv(8)
+        return header[:4], struct.unpack("<I", header[4:])[0]
+
+    def _raise_fail(self, sync_id, length):
+        if sync_id == b"FAIL":
+            raise AdbFailError(self.conn.recv(length).decode("utf-8", "replace"))
+        raise AdbFailError("unexpected sync reply: %r" % sync_id)
+
+    def stat(self, path):
+        """
+        Get the stat of the remote path
+
+        Returns:
+            (mode, size, mtime), None if the path does not exist
+
+        """
+        self._send(b"STAT", path)
+        sync_id = self.conn.recv(4)
+        if sync_id != b"STAT":
+            self._raise_fail(sync_id, struct.unpack("<I", self.conn.recv(4))[0])
+        mode, size, mtime = struct.unpack("<3I", self.conn.recv(12))
+        if mode == 0:
+            return None
+        return mode, size, mtime
+
+    def list(self, path):
+        """
+        List the remote directory
+
+        Returns:
+            list of (name, mode, size, mtime), "." and ".." included
+
+        """
+        self._send(b"LIST", path)
+        entries = []
+        while True:
+            sync_id = self.conn.recv(4)
+            mode, size, mtime, namelen = struct.unpack("<4I", self.conn.recv(16))
+            if sync_id == b"DONE":
+                return entries
+            if sync_id != b"DENT":
+                self._raise_fail(sync_id, mode)
+            entries.append((self.conn.recv(namelen).decode("utf-8", "replace"), mode, size, mtime))
+
+    def push(self, src, remote, mode=0o644, mtime=None, progress=None, skip_same=True):
+        """
+        Push a file to the device, the parent directories are created by adbd
+
+        Args:
+            src: local file path, or a file-like object opened in binary mode
+            remote: remote file path
+            mode: permission bits of the remote file, the ones of the local file if src is a path
+            mtime: modification time of the remote file, the one of the local file if src is a path
+            progress: callback(sent_bytes, total_bytes), total_bytes is None if src is a file-like object
+            skip_same: do not push the file if the remote file has the same size and mtime
+
+        Raises:
+            AdbFailError: if the push failed
+
+        Returns:
+            True if pushed, False if skipped
+
+        """
+        total = None
+        if not hasattr(src, "read"):
+            st = os.stat(src)
+            total, mode = st.st_size, stat.S_IMODE(st.st_mode)
+            if mtime is None:
+                mtime = int(st.st_mtime)
+            if skip_same:
+                remote_stat = self.stat(remote)
+                if remote_stat and remote_stat[1] == total and remote_stat[2] == mtime:
+                    return False
+            with open(src, "rb") as f:
+                self._send_file(f, remote, mode, mtime, total, progress)
+            return True
+        self._send_file(src, remote, mode, int(time.time()) if mtime is None else mtime, total, progress)
+        return True
+
+    def _send_file(self, f, remote, mode, mtime, total, progress):
+        self._send(b"SEND", "%s,%d" % (remote, stat.S_IFREG | mode))
+        sent = 0
+        while True:
+            chunk = f.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            self._send(b"DATA", chunk)
+            sent += len(chunk)
+            if progress:
+                progress(sent, total)
+        self.conn.sock.send(b"DONE" + struct.pack("<I", mtime))
+        sync_id, length = self._recv_header()
+        if sync_id != b"OKAY":
+            self._raise_fail(sync_id, length)
+
+    def pull(self, remote, dst, progress=None):
+        """
+        Pull a file from the device
+
+        Args:
+            remote: remote file path
+            dst: local file path, or a file-like object opened in binary mode
+            progress: callback(received_bytes, total_bytes)
+
+        Raises:
+            AdbFailError: if the remote file does not exist or cannot be read
+
+        Returns:
+            None
+
+        """
+        remote_stat = self.stat(remote)
+        if remote_stat is None:
+            raise AdbFailError("remote object '%s' does not exist" % remote)
+        total = remote_stat[1]
+        if not hasattr(dst, "write"):
+            with open(dst, "wb") as f:
+                return self.pull(remote, f, progress)
+        self._send(b"RECV", remote)
+        received = 0
+        while True:
+            sync_id, length = self._recv_header()
+            if sync_id == b"DONE":
+                return
+            if sync_id != b"DATA":
+                self._raise_fail(sync_id, length)
+            dst.write(self.conn.recv(length))
+            received += length
+            if progress:
+                progress(received, total)
+
+    def quit(self):
+        try:
+            self._send(b"QUIT")
+        except socket.error:
+            pass
+
+
+# connections shared by all the AdbSocketClient of the process
+DEFAULT_POOL = AdbConnectionPool()
+
+
+class AdbSocketClient(object):
+    """
+    adb client talking to the adb server socket
+
+    `run()` accepts the same arguments as the adb command line, and returns what the adb client process would
+    have written and returned, so that ADB.cmd() keeps the same outputs and errors with either transport.
+
+    Args:
+        host: adb server host, default is "127.0.0.1"
+        port: adb server port, default is 5037
+        pool: AdbConnectionPool of the device connections, None to open a new connection for each command
+    """
+
+    def __init__(self, host="127.0.0.1", port=5037, pool=DEFAULT_POOL):
+        self.host = host
+        self.port = port
+        self.pool = pool
+        self._features = {}
+
+    def connect(self, timeout=None):
+        return AdbConnection(self.host, self.port, timeout)
+
+    @staticmethod
+    def host_service(service, serialno=None):
+        """The host service of the device, or of the only device connected if serialno is None"""
+        if serialno:
+            return "host-serial:%s:%s" % (serialno, service)
+        return "host:%s" % service
+
+    def query(self, service, serialno=None, timeout=None):
+        """
+        Send a host request and return the string replied, e.g. `devices`, `get-state`, `features`
+
+        Returns:
+            bytes
+
+        """
+        with closing(self.connect(timeout)) as conn:
+            conn.request(self.host_service(service, serialno))
+            return conn.read_string()
+
+    def command(self, service, serialno=None, timeout=None):
+        """
+        Send a host request replying two statuses (connect, result), e.g. `forward:...`, `killforward:...`
+
+        Returns:
+            extra data sent after the result, e.g. the port allocated by `forward tcp:0`
+
+        """
+        with closing(self.connect(timeout)) as conn:
+            conn.request(self.host_service(service, serialno))
+            conn.read_status()
+            data = conn.read_all()
+            # the extra data is a string prefixed with its length as well
+            return data[4:] if data else data
+
+    def _open_transport(self, serialno=None, timeout=None):
+        conn = self.connect(timeout)
+        try:
+            conn.request("host:transport:%s" % serialno if serialno else "host:transport-any")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def transport(self, serialno=None, timeout=None):
+        """
+        Connection switched to the device, the following requests are sent to adbd, closed on exit
+
+        Examples:
+            >>> with client.transport("serial1") as conn:
+            ...     conn.request("shell:ls")
+
+        Returns:
+            context manager of AdbConnection
+
+        """
+        if self.pool is None:
+            return closing(self._open_transport(serialno, timeout))
+        return self.pool.borrow((self.host, self.port, serialno),
+                                lambda t: self._open_transport(serialno, t), timeout)
+
+    def pool_metrics(self, serialno=None):
+        """Metrics of the pooled connections of the device, see AdbConnectionPool.metrics"""
+        if self.pool is None:
+            return None
+        return self.pool.metrics((self.host, self.port, serialno))
+
+    def features(self, serialno=None):
+        """
+        Features supported by both the adb server and the device, e.g. "shell_v2", "cmd"
+
+        Returns:
+            set of feature names
+
+        """
+        if serialno not in self._features:
+            try:
+                features = self.query("features", serialno).decode("utf-8")
+            except AdbFailError:
+                # adb server too old, or device not connected yet, do not cache
+                return set()
+            self._features[serialno] = set(f for f in features.split(",") if f)
+        return self._features[serialno]
+
+    def shell(self, cmd, serialno=None, timeout=None):
+        """
+        Run the shell command on the device, use shell v2 to get the exit status if the device supports it
+
+        Args:
+            cmd: shell command line
+            serialno: device serial number
+            timeout: socket timeout in seconds
+
+        Returns:
+            (stdout, stderr, returncode), returncode is always 0 without shell v2, same as the adb client
+
+        """
+        output = {SHELL_V2_STDOUT: [], SHELL_V2_STDERR: []}
+        returncode = 0
+        for packet_id, data in self.shell_stream(cmd, serialno, timeout):
+            if packet_id == SHELL_V2_EXIT:
+                returncode = data or 0
+            else:
+                output[packet_id].append(data)
+        return b"".join(output[SHELL_V2_STDOUT]), b"".join(output[SHELL_V2_STDERR]), returncode
+
+    @contextmanager
+    def sync(self, serialno=None, timeout=None):
+        """
+        Open a sync connection to the device
+
+        Examples:
+            >>> with client.sync("serial1") as sync:
+            ...     sync.push("test.txt", "/sdcard/test.txt")
+            ...     sync.pull("/sdcard/test.txt", "test2.txt")
+
+        Yields:
+            AdbSyncConnection
+
+        """
+        with self.transport(serialno, timeout) as conn:
+            conn.request("sync:")
+            sync = AdbSyncConnection(conn)
+            try:
+                yield sync
+            finally:
+                sync.quit()
+
+    def exec_out(self, cmd, serialno=None, timeout=None):
+        """
+        Run the command on the device without pty and return the raw binary stdout, e.g. `screencap`
+
+        Returns:
+            bytes
+
+        """
+        with self.transport(serialno, timeout) as conn:
+            conn.request("exec:" + cmd)
+            return conn.read_all()
+
+    def exec_in(self, cmd, src, serialno=None, timeout=None):
+        """
+        Run the command on the device without pty, with `src` streamed to its stdin,
+        e.g. `cmd package install -S <size>`
+
+        Args:
+            cmd: command line
+            src: file-like object opened in binary mode, read in chunks of AdbSyncConnection.CHUNK_SIZE
+
+        Returns:
+            bytes of the stdout
+
+        """
+        with self.transport(serialno, timeout) as conn:
+            conn.request("exec:" + cmd)
+            while True:
+                chunk = src.read(AdbSyncConnection.CHUNK_SIZE)
+                if not chunk:
+                    break
+                conn.sock.send(chunk)
+            return conn.read_all()
+
+    def shell_stream(self, cmd, serialno=None, timeout=None):
+        """
+        Run the shell command on the device and yield its output as it arrives
+
+        Args:
+            cmd: shell command line
+            serialno: device serial number
+            timeout: socket timeout in seconds
+
+        Yields:
+            (SHELL_V2_STDOUT or SHELL_V2_STDERR, data) for each chunk of the output,
+            then (SHELL_V2_EXIT, exit status), the exit status is None without shell v2
+
+        """
+        v2 = "shell_v2" in self.features(serialno)
+        with self.transport(serialno, timeout) as conn:
+            conn.request(("shell,v2,raw:" if v2 else "shell:") + cmd)
+            if not v2:
+                for chunk in conn.iter_chunks():
+                    yield SHELL_V2_STDOUT, chunk
+                yield SHELL_V2_EXIT, None
+                return
+            while True:
+                try:
+                    packet_id, length = struct.unpack("<BI", conn.recv(5))
+                    data = conn.recv(length) if length else b""
+                except socket.timeout:
+                    raise
+                except socket.error:
+                    raise AdbFailError("shell closed without exit status")
+                if packet_id == SHELL_V2_EXIT:
+                    yield SHELL_V2_EXIT, ord(data[:1] or b"\x00")
+                    return
+                if packet_id in (SHELL_V2_STDOUT, SHELL_V2_STDERR):
+                    yield packet_id, data
+
+    def run(self, args, serialno=None, timeout=None):
+        """
+        Run the adb command line arguments through the adb server socket
+
+        Supported: `shell <cmd>`, `exec-out <cmd>`, `devices`, `get-state`, `features`,
+        `forward [--no-rebind] <local> <remote>`, `forward --list`, `forward --remove <local>`, `forward --remove-all`
+
+        Args:
+            args: adb arguments, e.g. ["shell", "getprop", "ro.build.version.sdk"]
+            serialno: device serial number, None for the only device connected or for host commands
+            timeout: timeout in seconds
+
+        Raises:
+            RuntimeError: if the command timed out
+
+        Returns:
+            (stdout, stderr, returncode), None if the command is not supported and needs the adb client process
+
+        """
+        name, params = args[0], args[1:]
+        try:
+            if name == "shell":
+                # interactive shell and shell options are left to the adb client
+                if params and not params[0].startswith("-"):
+                    return self.shell(" ".join(params), serialno, timeout)
+            elif name == "exec-out" and params:
+                return self.exec_out(" ".join(params), serialno, timeout), b"", 0
+            elif name == "devices" and not params:
+                return b"List of devices attached\n" + self.query("devices", timeout=timeout) + b"\n", b"", 0
+            elif name in ("get-state", "features") and not params:
+                return self.query(name, serialno, timeout) + b"\n", b"", 0
+            elif name == "forward":
+                return self._forward(params, serialno, timeout)
+        except AdbFailError as e:
+            # same as the adb client process, so that ADB.cmd raises the same errors
+            return b"", ("error: %s\n" % e).encode("utf-8"), 1
+        except socket.timeout:
+            raise RuntimeError("Command adb {cmd} timed out after {timeout} seconds".format(
+                cmd=" ".join(args), timeout=timeout))
+        return None
+
+    def _forward(self, params, serialno=None, timeout=None):
+        if params == ["--list"]:
+            return self.query("list-forward", serialno, timeout), b"", 0
+        if params == ["--remove-all"]:
+            return self.command("killforward-all", serialno, timeout), b"", 0
+        if len(params) == 2 and params[0] == "--remove":
+            return self.command("killforward:%s" % params[1], serialno, timeout), b"", 0
+        no_rebind = params[:1] == ["--no-rebind"]
+        if no_rebind:
+            params = params[1:]
+        if len(params) == 2 and not params[0].startswith("-"):
+            service = "forward:%s%s;%s" % ("norebind:" if no_rebind else "", params[0], params[1])
+            return self.command(service, serialno, timeout), b"", 0
+        return None
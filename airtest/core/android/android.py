@@ -26,7 +26,7 @@ from airtest.core.android.touch_methods.minitouch import Minitouch  # noqa
 from airtest.core.android.touch_methods.maxtouch import Maxtouch  # noqa
 
 from airtest.core.settings import Settings as ST
-from airtest.aircv.screen_recorder import ScreenRecorder, resize_by_max, get_max_size
+from airtest.aircv.screen_recorder import ScreenRecorder, resize_by_max, get_max_size, throttle
 from airtest.utils.snippet import get_absolute_coordinate
 from airtest.utils.logger import get_logger
 
@@ -44,7 +44,8 @@ class Android(Device):
                  display_id=None,
                  input_event=None,
                  adb_path=None,
-                 name=None):
+                 name=None,
+                 adb_transport=None):
         super(Android, self).__init__()
         self.serialno = serialno or self.get_default_device(adb_path=adb_path)
         self._uuid = name or self.serialno
@@ -55,7 +56,8 @@ class Android(Device):
         self.display_id = display_id
         self.input_event = input_event
         # init adb
-        self.adb = ADB(self.serialno, adb_path=adb_path, server_addr=host, display_id=self.display_id, input_event=self.input_event)
+        self.adb = ADB(self.serialno, adb_path=adb_path, server_addr=host, display_id=self.display_id,
+                       input_event=self.input_event, transport=adb_transport)
         self.adb.wait_for_device()
         self.sdk_version = self.adb.sdk_version
         if self.sdk_version >= SDK_VERISON_ANDROID10 and self._touch_method == TOUCH_METHOD.MINITOUCH:
@@ -490,6 +492,55 @@ class Android(Device):
             aircv.imwrite(filename, screen, quality, max_size=max_size)
         return screen
 
+    def snapshot_reduced(self, reduce=1):
+        """
+        Take a screenshot at 1/reduce of the display size for image matching, see ``Device.snapshot_reduced``
+
+        The jpg of minicap/javacap is decoded at the smaller size, or minicap captures a smaller projection
+        with ``Minicap.PROJECTION_REDUCE``.
+
+        Args:
+            reduce: 1, 2, 4 or 8
+
+        Returns:
+            (screenshot, scale), the display coordinates are the screenshot coordinates multiplied by scale
+
+        """
+        # 自定义的截图方法可能不支持reduce参数, 只在需要缩小时传入
+        kwargs = {"reduce": reduce} if reduce != 1 else {}
+        screen = self.screen_proxy.snapshot(ensure_orientation=True, **kwargs)
+        if screen is None:
+            return None, reduce
+        # 按实际截图尺寸换算, 兼容指定了projection的minicap
+        width = self.get_current_resolution()[0]
+        return screen, float(width) / screen.shape[1]
+
+    def frame_stream(self):
+        """
+        Generator of screenshots read from the minicap/javacap stream, see ``Device.frame_stream``
+
+        Returns:
+            generator of screenshots, None if the screen is not captured by minicap/javacap
+
+        """
+        if self.cap_method not in (CAP_METHOD.MINICAP, CAP_METHOD.JAVACAP):
+            return None
+        return self._iter_stream_frames()
+
+    def _iter_stream_frames(self):
+        # 订阅frame bus, 与录屏, 截图共享后台解码的画面流, 每次取比上一帧更新的最新一帧
+        sub = self.screen_proxy.get_frame_bus().subscribe()
+        try:
+            while True:
+                frame = sub.get()
+                if frame is None and not sub.bus.is_alive:
+                    # 画面流已停止(如teardown), 重新订阅
+                    sub.close()
+                    sub = self.screen_proxy.get_frame_bus().subscribe()
+                yield frame.img if frame is not None else None
+        finally:
+            sub.close()
+
     def shell(self, *args, **kwargs):
         """
         Return `adb shell` interpreter
@@ -965,7 +1016,18 @@ class Android(Device):
             return None
 
         max_size = get_max_size(max_size)
-        def get_frame():
+        subscription = []
+
+        def get_shared_frame():
+            # minicap/javacap画面流在后台只解码一次, 通过frame bus与图像识别, 截图共享, 不争抢画面
+            if not subscription:
+                subscription.append(self.screen_proxy.get_frame_bus().subscribe(max_fps=fps))
+            frame = subscription[0].get()
+            if frame is None:
+                return None
+            return resize_by_max(frame.img, max_size) if max_size is not None else frame.img
+
+        def get_stream_frame():
             data = self.screen_proxy.get_frame_from_stream()
             if data is None:
                 LOGGING.warning("get_frame_from_stream failed")
@@ -976,9 +1038,16 @@ class Android(Device):
                 frame = resize_by_max(frame, max_size)
             return frame
 
+        if self.cap_method in (CAP_METHOD.MINICAP, CAP_METHOD.JAVACAP):
+            get_frame = get_shared_frame
+        else:
+            # 其他截图方式没有画面流, 按fps限制截图频率
+            get_frame = throttle(get_stream_frame, fps)
+
         self.recorder = ScreenRecorder(
             save_path, get_frame, fps=fps,
             snapshot_sleep=snapshot_sleep, orientation=orientation)
+        self.recorder.frame_subscription = subscription
         self.recorder.stop_time = max_time
         self.recorder.start()
         LOGGING.info("start recording screen to {}".format(save_path))
@@ -996,6 +1065,8 @@ class Android(Device):
         
         LOGGING.info("stopping recording")
         self.recorder.stop()
+        for sub in getattr(self.recorder, "frame_subscription", []):
+            sub.close()
         self.recorder = None
 
         if output and not is_interrupted:
@@ -1,17 +1,95 @@
 # -*- coding: utf-8 -*-
+import struct
 import warnings
+import cv2
+import numpy as np
 from airtest.core.android.cap_methods.base_cap import BaseCap
 from airtest.core.android.constant import SDK_VERISON_ANDROID7
+from airtest.utils.logger import get_logger
 from airtest import aircv
 
+LOGGING = get_logger(__name__)
+
+# pixel formats of the raw screencap output -> (bytes per pixel, cv2 conversion to BGR)
+RAW_PIXEL_FORMATS = {
+    1: (4, cv2.COLOR_RGBA2BGR),  # RGBA_8888
+    2: (4, cv2.COLOR_RGBA2BGR),  # RGBX_8888
+    3: (3, cv2.COLOR_RGB2BGR),  # RGB_888
+    5: (4, cv2.COLOR_BGRA2BGR),  # BGRA_8888
+}
+
+
+def raw_screencap_to_img(data):
+    """
+    Convert the output of `screencap` (without -p) to a BGR image
+
+    The header is width, height, pixel format, and since Android 8 a color space, 4 bytes each (little endian),
+    followed by the pixels. The pixels are wrapped as a numpy array without copying, then converted to BGR.
+
+    Args:
+        data: bytes of the screencap output
+
+    Returns:
+        numpy.ndarray, None if the format is not supported
+
+    """
+    if len(data) < 12:
+        return None
+    width, height, pixel_format = struct.unpack_from("<3I", data)
+    if pixel_format not in RAW_PIXEL_FORMATS:
+        return None
+    bpp, code = RAW_PIXEL_FORMATS[pixel_format]
+    size = width * height * bpp
+    header_size = len(data) - size
+    if header_size not in (12, 16):
+        return None
+    pixels = np.frombuffer(data, dtype=np.uint8, count=size, offset=header_size).reshape(height, width, bpp)
+    return cv2.cvtColor(pixels, code)
+
 
 class AdbCap(BaseCap):
+    # 通过exec-out screencap获取未压缩的原始画面, 省去手机端的PNG编码和本地的PNG解码(需要SDK>=21)
+    # 原始画面的数据量比PNG大很多, 通过网络连接远程adb server时可以关掉
+    RAW_SCREENCAP = True
+
+    def __init__(self, adb, *args, **kwargs):
+        super(AdbCap, self).__init__(adb, *args, **kwargs)
+        # None: not tried yet
+        self._raw_supported = None
+
     def get_frame_from_stream(self):
         warnings.warn("Currently using ADB screenshots, the efficiency may be very low.")
         return self.adb.snapshot()
 
-    def snapshot(self, ensure_orientation=True):
-        screen = super(AdbCap, self).snapshot()
+    def get_raw_frame(self):
+        """
+        Take a screenshot with `exec-out screencap`
+
+        Returns:
+            numpy.ndarray, None if the raw screencap is not supported by the device or failed
+
+        """
+        if not self.RAW_SCREENCAP or self._raw_supported is False or self.adb.sdk_version < 21:
+            return None
+        try:
+            screen = raw_screencap_to_img(self.adb.screencap_raw())
+        except Exception as e:
+            # AdbError, or the output is not in the expected raw format
+            LOGGING.warning("raw screencap failed, use screencap -p instead: %r" % e)
+            screen = None
+        if screen is None and self._raw_supported is None:
+            LOGGING.warning("raw screencap format not supported, use screencap -p instead")
+            self._raw_supported = False
+        elif screen is not None:
+            self._raw_supported = True
+        return screen
+
+    def snapshot(self, ensure_orientation=True, reduce=1):
+        screen = self.get_raw_frame()
+        if screen is None:
+            screen = super(AdbCap, self).snapshot(reduce=reduce)
+        else:
+            screen = aircv.utils.reduce_image(screen, reduce)
         if ensure_orientation and self.adb.sdk_version <= SDK_VERISON_ANDROID7:
             screen = aircv.rotate(screen, self.adb.display_info["orientation"] * 90, clockwise=False)
         return screen
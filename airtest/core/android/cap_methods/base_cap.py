@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import traceback
 from airtest import aircv
+from airtest.aircv.frame_reader import LatestFrameReader
+from airtest.aircv.frame_bus import FrameBus
 
 
 class BaseCap(object):
@@ -9,6 +11,15 @@ class BaseCap(object):
     所有屏幕截图方法的基类
     """
 
+    # If True, the first snapshot() starts a LatestFrameReader, and snapshot() returns its latest decoded frame,
+    # only for the screen stream methods (Minicap, Javacap)
+    # 为True时, 首次snapshot()会启动后台线程持续接收并解码画面流, 之后snapshot()直接返回最新一帧
+    BACKGROUND_READER = False
+    # the LatestFrameReader started by start_background()
+    frame_reader = None
+    # the FrameBus created by get_frame_bus()
+    frame_bus = None
+
     def __init__(self, adb, *args, **kwargs):
         self.adb = adb
 
@@ -28,20 +39,94 @@ class BaseCap(object):
         return self.get_frame_from_stream()
 
     def teardown_stream(self):
-        pass
+        self.stop_background()
+
+    def start_background(self):
+        """
+        Receive and decode the frames of the screen stream in background threads,
+        snapshot() returns the latest decoded frame at once afterwards
+
+        后台持续接收并解码画面流, 之后snapshot()直接返回最新解码的一帧
+
+        Returns: LatestFrameReader
+
+        """
+        if self.frame_reader is None or not self.frame_reader.is_alive:
+            self.frame_reader = LatestFrameReader(self.get_frame_from_stream,
+                                                  name="%s_reader" % self.__class__.__name__.lower())
+            self.frame_reader.start()
+        return self.frame_reader
+
+    def stop_background(self):
+        """
+        Stop the background threads started by start_background()
+        """
+        reader = self.frame_reader
+        if reader is not None:
+            reader.stop()
+            if not reader.is_alive:
+                self.frame_reader = None
+                if self.frame_bus is not None:
+                    self.frame_bus.stop()
+                    self.frame_bus = None
+
+    def get_frame_bus(self):
+        """
+        Share the frames decoded by the background reader with several consumers, start the reader if not started
+
+        一次解码, 多个订阅者(录屏, 图像识别, 截图)共享同一画面流
+
+        Examples:
+            >>> sub = dev.screen_proxy.get_frame_bus().subscribe(max_fps=10)
+            >>> frame = sub.get()
+
+        Returns: FrameBus
+
+        """
+        reader = self.start_background()
+        if self.frame_bus is None or self.frame_bus.reader is not reader:
+            self.frame_bus = FrameBus(reader, name="%s_bus" % self.__class__.__name__.lower())
+        self.frame_bus.start()
+        return self.frame_bus
+
+    def get_latest_frame(self, newer_than=None, timeout=None):
+        """
+        Get the latest decoded frame of the background reader, start it if not started
+
+        Args:
+            newer_than: wait for a frame whose seq is greater than it
+            timeout: timeout in seconds
+
+        Returns: Frame(seq, timestamp, img), None if timed out
 
-    def snapshot(self, ensure_orientation=True, *args, **kwargs):
+        """
+        return self.start_background().get(newer_than=newer_than, timeout=timeout)
+
+    def snapshot(self, ensure_orientation=True, newer_than=None, reduce=1, *args, **kwargs):
         """
         Take a screenshot and convert it into a cv2 image object
 
         获取一张屏幕截图，并转化成cv2的图像对象
 
+        Args:
+            ensure_orientation: True or False whether to keep the orientation same as display
+            newer_than: with the background reader, wait for a frame whose seq is greater than it
+            reduce: decode the screenshot at 1/reduce size, 1, 2, 4 or 8
+
         Returns: numpy.ndarray
 
         """
+        if self.BACKGROUND_READER or (self.frame_reader is not None and self.frame_reader.is_alive):
+            # 通过frame bus取帧, 与录屏, 图像识别共享同一次解码
+            frame = self.get_frame_bus().get(newer_than=newer_than)
+            if frame is None:
+                return None
+            # frame.img是只读的共享图像, 返回副本, 调用者可以在截图上绘制
+            screen = aircv.utils.reduce_image(frame.img, reduce)
+            return screen.copy() if screen is frame.img else screen
         screen = self.get_frame_from_stream()
         try:
-            screen = aircv.utils.string_2_img(screen)
+            screen = aircv.utils.string_2_img(screen, reduce)
         except Exception:
             # may be black/locked screen or other reason, print exc for debugging
             traceback.print_exc()
@@ -96,7 +96,9 @@ class Javacap(Yosemite, BaseCap):
                 stopping = yield None
             else:
                 frame_size = struct.unpack("<I", header)[0]
-                frame_data = s.recv(frame_size)
+                # a new buffer for every frame, filled by recv_into directly, the frame belongs to the caller
+                frame_data = bytearray(frame_size)
+                s.recv_exact_into(frame_data)
                 stopping = yield frame_data
 
         LOGGING.debug("javacap stream ends")
@@ -133,6 +135,7 @@ class Javacap(Yosemite, BaseCap):
             None
 
         """
+        self.stop_background()
         self._cleanup()
 
         if not self.frame_gen:
@@ -40,6 +40,9 @@ class Minicap(BaseCap):
     VERSION = 5
     RECVTIMEOUT = 3  # default value is None, but the version above 1.2.7 is changed to 3s
     CMD = "LD_LIBRARY_PATH=/data/local/tmp /data/local/tmp/minicap"
+    # 为True时, snapshot(reduce=N)让minicap直接按1/N分辨率投影(-P)截图, 减少传输和解码的数据量,
+    # 但每次截图都要启动一次minicap -s; 为False时从画面流中取图, 解码时缩小
+    PROJECTION_REDUCE = False
 
     def __init__(self, adb, projection=None, rotation_watcher=None, display_id=None, ori_function=None):
         """
@@ -278,10 +281,13 @@ class Minicap(BaseCap):
                 stopping = yield None
             else:
                 frame_size = struct.unpack("<I", header)[0]
+                # a new buffer for every frame, filled by recv_into directly, the frame belongs to the caller
+                frame_data = bytearray(frame_size)
                 if self.RECVTIMEOUT is not None:
-                    frame_data = s.recv_with_timeout(frame_size, self.RECVTIMEOUT)
+                    if s.recv_exact_into_with_timeout(frame_data, timeout=self.RECVTIMEOUT) is None:
+                        frame_data = None
                 else:
-                    frame_data = s.recv(frame_size)
+                    s.recv_exact_into(frame_data)
                 stopping = yield frame_data
 
         LOGGING.debug("minicap stream ends")
@@ -349,28 +355,49 @@ class Minicap(BaseCap):
             self.frame_gen = self.get_stream()
         return six.next(self.frame_gen)
 
-    def snapshot(self, ensure_orientation=True, projection=None):
+    def snapshot(self, ensure_orientation=True, projection=None, newer_than=None, reduce=1):
         """
 
         Args:
             ensure_orientation: True or False whether to keep the orientation same as display
             projection: the size of the desired projection, (width, height)
+            newer_than: with the background reader, wait for a frame whose seq is greater than it
+            reduce: take the screenshot at 1/reduce size, 1, 2, 4 or 8. With PROJECTION_REDUCE, minicap
+                    captures a smaller projection, otherwise the jpg of the stream is decoded at the smaller size
 
         Returns:
 
         """
+        if not projection and reduce > 1 and self.PROJECTION_REDUCE:
+            projection = self.get_reduced_projection(reduce)
+            reduce = 1
         if projection:
             # minicap模式在单张截图时，可以传入projection参数来强制指定图片大小，如手机分辨率(width, height)
             screen = self.get_frame(projection=projection)
             try:
-                screen = aircv.utils.string_2_img(screen)
+                screen = aircv.utils.string_2_img(screen, reduce)
             except Exception:
                 # may be black/locked screen or other reason, print exc for debugging
                 traceback.print_exc()
                 return None
             return screen
         else:
-            return super(Minicap, self).snapshot()
+            return super(Minicap, self).snapshot(newer_than=newer_than, reduce=reduce)
+
+    def get_reduced_projection(self, reduce):
+        """
+        Get the projection of 1/reduce of the display size, used by `-P` of minicap
+
+        Args:
+            reduce: 2, 4 or 8
+
+        Returns:
+            (width, height) of the projection
+
+        """
+        display_info = self.ori_function()
+        width, height = display_info["width"], display_info["height"]
+        return max(1, width // reduce), max(1, height // reduce)
 
     def update_rotation(self, rotation):
         """
@@ -439,6 +466,7 @@ class Minicap(BaseCap):
             None
 
         """
+        self.stop_background()
         # clean up established connections
         self._cleanup()
         if not self.frame_gen:
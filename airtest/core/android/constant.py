@@ -36,6 +36,13 @@ class CAP_METHOD(object):
     JAVACAP = "JAVACAP"
 
 
+class ADB_TRANSPORT(object):
+    # start an adb client process for every command
+    SUBPROCESS = "SUBPROCESS"
+    # talk to the adb server socket directly
+    SOCKET = "SOCKET"
+
+
 class TOUCH_METHOD(object):
     MINITOUCH = "MINITOUCH"
     MAXTOUCH = "MAXTOUCH"
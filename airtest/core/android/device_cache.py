@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import threading
+
+from airtest.utils.logger import get_logger
+
+LOGGING = get_logger(__name__)
+
+
+class DeviceInfoCache(object):
+    """
+    Immutable properties of the devices (whitelisted ro.* props, max_x/max_y...), shared by all the ADB objects
+    of the process, and optionally saved in a json file, so that they are not queried again after a restart.
+
+    The properties are keyed on the device id of the current boot (``ADB.device_id``, ro.serialno + boot_id),
+    they are dropped when the device reboots, or when another device gets the same serialno
+    (e.g. emulator-5554, ip:port).
+
+    Args:
+        path: json file path, None to keep the properties in memory only
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        # serialno -> {"device_id": device_id, "props": {key: value}}
+        self._data = None
+
+    def _load(self):
+        if self._data is not None:
+            return
+        self._data = {}
+        if self.path and os.path.isfile(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self._data = json.load(f)
+            except (IOError, ValueError) as e:
+                LOGGING.warning("load device cache %s failed: %s" % (self.path, e))
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            with open(tmp_path, "w") as f:
+                json.dump(self._data, f)
+            # replace atomically, other processes never read a half written file
+            os.replace(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            LOGGING.warning("save device cache %s failed: %s" % (self.path, e))
+
+    def get(self, serialno, device_id, key):
+        """
+        Get a property of the device
+
+        Returns:
+            property value, None if not cached or if the device id changed
+
+        """
+        with self._lock:
+            self._load()
+            device = self._data.get(serialno)
+            if not device or device.get("device_id") != device_id:
+                return None
+            return device["props"].get(key)
+
+    def set(self, serialno, device_id, key, value):
+        """Cache a property of the device, the value must be json serializable"""
+        with self._lock:
+            self._load()
+            device = self._data.get(serialno)
+            if not device or device.get("device_id") != device_id:
+                device = self._data[serialno] = {"device_id": device_id, "props": {}}
+            device["props"][key] = value
+            self._save()
+
+    def clear(self, serialno=None):
+        """Drop the properties of the device, or of all the devices if serialno is None"""
+        with self._lock:
+            self._load()
+            if serialno is None:
+                self._data.clear()
+            else:
+                self._data.pop(serialno, None)
+            self._save()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import socket
+import threading
+
+from airtest.core.android.adb_socket import AdbConnection, AdbFailError
+from airtest.utils.logger import get_logger
+from airtest.utils.snippet import reg_cleanup
+
+LOGGING = get_logger(__name__)
+
+
+class DeviceTracker(object):
+    """
+    Keep the states of the devices of an adb server up to date with one `host:track-devices` connection
+
+    The adb server sends the whole device list on this connection every time a device is plugged, unplugged
+    or changes its state, so the states are known within milliseconds, without polling `adb devices`.
+    The connection is opened again if the adb server restarts.
+
+    Args:
+        host: adb server host
+        port: adb server port
+
+    Examples:
+        >>> tracker = DeviceTracker.get("127.0.0.1", 5037)
+        >>> tracker.add_callback(lambda serialno, old, new: print(serialno, old, "->", new))
+        >>> tracker.devices(state="device")
+        [('emulator-5554', 'device')]
+
+    """
+
+    # 与adb server断开后, 重新连接的间隔(秒)
+    RECONNECT_INTERVAL = 1
+    # (host, port) -> DeviceTracker
+    _trackers = {}
+    _trackers_lock = threading.Lock()
+
+    def __init__(self, host="127.0.0.1", port=5037):
+        self.host = host
+        self.port = port
+        # serialno -> state
+        self._devices = {}
+        self._callbacks = []
+        self._cond = threading.Condition()
+        self._ready = False
+        self._stopped = threading.Event()
+        self._conn = None
+        self._thread = None
+
+    @classmethod
+    def get(cls, host="127.0.0.1", port=5037):
+        """The tracker of the adb server shared by the process, started on the first call"""
+        with cls._trackers_lock:
+            tracker = cls._trackers.get((host, port))
+            if tracker is None or tracker._stopped.is_set():
+                tracker = cls._trackers[(host, port)] = cls(host, port)
+                tracker.start()
+            return tracker
+
+    @classmethod
+    def stop_all(cls):
+        """Stop all the trackers shared by the process"""
+        with cls._trackers_lock:
+            trackers = list(cls._trackers.values())
+            cls._trackers.clear()
+        for tracker in trackers:
+            tracker.stop()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="adb_device_tracker")
+        self._thread.daemon = True
+        self._thread.start()
+        reg_cleanup(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        conn = self._conn
+        if conn:
+            # wake up the thread blocked on reading
+            conn.close()
+        self._set_ready(False)
+
+    @property
+    def ready(self):
+        """True if the device list is up to date"""
+        return self._ready
+
+    def wait_ready(self, timeout=None):
+        """
+        Wait for the first device list from the adb server
+
+        Returns:
+            True if the device list is up to date, False if timed out
+
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._ready, timeout)
+            return self._ready
+
+    def add_callback(self, callback):
+        """
+        Call `callback(serialno, old_state, new_state)` in the tracker thread when the state of a device changes,
+        old_state is None if the device is new, new_state is None if the device is gone
+        """
+        with self._cond:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        with self._cond:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def devices(self, state=None):
+        """
+        Returns:
+            list of (serialno, state), same as ADB.devices()
+
+        """
+        with self._cond:
+            return [(serialno, s) for serialno, s in self._devices.items() if not state or s == state]
+
+    def get_state(self, serialno):
+        """
+        Returns:
+            state of the device, None if not found
+
+        """
+        with self._cond:
+            return self._devices.get(serialno)
+
+    def wait_for(self, serialno, state="device", timeout=None):
+        """
+        Wait until the device is in the state
+
+        Returns:
+            True if the device is in the state, False if timed out or the tracker is not ready
+
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._ready or self._devices.get(serialno) == state, timeout) \
+                   and self._devices.get(serialno) == state and self._ready
+
+    def _set_ready(self, ready):
+        with self._cond:
+            self._ready = ready
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._conn = AdbConnection(self.host, self.port)
+                if self._stopped.is_set():
+                    break
+                self._conn.request("host:track-devices")
+                while True:
+                    self._update(self._conn.read_string())
+            except (socket.error, AdbFailError, ValueError) as e:
+                if not self._stopped.is_set():
+                    LOGGING.debug("track devices of %s:%s failed: %r" % (self.host, self.port, e))
+            finally:
+                if self._conn:
+                    self._conn.close()
+                    self._conn = None
+            # the device list is stale until the connection is opened again
+            self._set_ready(False)
+            self._stopped.wait(self.RECONNECT_INTERVAL)
+
+    def _update(self, data):
+        devices = {}
+        for line in data.decode("utf-8", "replace").splitlines():
+            if "\t" in line:
+                serialno, state = line.strip().split("\t", 1)
+                devices[serialno] = state
+        with self._cond:
+            old_devices, self._devices = self._devices, devices
+            self._ready = True
+            self._cond.notify_all()
+            # the callbacks added after this update do not get its changes
+            callbacks = list(self._callbacks)
+        for serialno in set(old_devices) | set(devices):
+            old, new = old_devices.get(serialno), devices.get(serialno)
+            if old == new:
+                continue
+            LOGGING.debug("device %s: %s -> %s" % (serialno, old, new))
+            for callback in callbacks:
+                try:
+                    callback(serialno, old, new)
+                except Exception:
+                    LOGGING.exception("device tracker callback %r failed" % callback)
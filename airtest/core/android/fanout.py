@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Run the same adb operation on many devices at once
+
+    >>> from airtest.core.android.fanout import fanout
+    >>> results = fanout("shell getprop ro.build.version.sdk")
+    >>> for serialno, res in results.items():
+    ...     print(serialno, res.result if res.ok else res.error)
+
+    >>> fanout(lambda adb: adb.install_app("test.apk", replace=True), G.DEVICE_LIST, timeout=300)
+"""
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from six import string_types
+
+from airtest.core.android.adb import ADB
+from airtest.utils.logger import get_logger
+
+LOGGING = get_logger(__name__)
+
+
+class FanoutResult(object):
+    """
+    Result of the operation on one device
+
+    Attributes:
+        serialno: serialno of the device
+        result: return value of the operation
+        error: exception raised by the operation, TimeoutError if it timed out
+        elapsed: seconds the operation took, or waited before timing out
+    """
+
+    def __init__(self, serialno, result=None, error=None, elapsed=0.0):
+        self.serialno = serialno
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return "<FanoutResult %s: %r (%.2fs)>" % (self.serialno, self.result, self.elapsed)
+        return "<FanoutResult %s: %r (%.2fs)>" % (self.serialno, self.error, self.elapsed)
+
+
+class AdbFanout(object):
+    """
+    Run an operation on many devices with a bounded thread pool
+
+    All the AdbFanout of the process share the limit of concurrent adb operations, MAX_CONCURRENT,
+    so that the adb server is not swamped by the operations of several fan-outs at the same time.
+
+    Args:
+        max_workers: max threads of this fan-out, default is MAX_WORKERS
+        timeout: timeout in seconds of the operation on each device, counted from the moment it starts
+        adb_kwargs: keyword arguments of the ADB objects created from serialnos, e.g. server_addr
+    """
+
+    # 每次fan-out的默认最大线程数
+    MAX_WORKERS = 16
+    # 整个进程同时执行的adb操作数上限
+    MAX_CONCURRENT = 16
+    _limit = threading.BoundedSemaphore(MAX_CONCURRENT)
+    _limit_lock = threading.Lock()
+
+    def __init__(self, max_workers=None, timeout=None, **adb_kwargs):
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.timeout = timeout
+        self.adb_kwargs = adb_kwargs
+
+    @classmethod
+    def set_max_concurrent(cls, value):
+        """
+        Change the limit of concurrent adb operations of the process
+
+        The operations already running keep the slots of the previous limit until they are done
+        """
+        with cls._limit_lock:
+            AdbFanout.MAX_CONCURRENT = value
+            AdbFanout._limit = threading.BoundedSemaphore(value)
+
+    def _get_adb(self, device):
+        if isinstance(device, ADB):
+            return device
+        if isinstance(device, string_types):
+            return ADB(serialno=device, **self.adb_kwargs)
+        # Android device objects, e.g. the ones of G.DEVICE_LIST
+        adb = getattr(device, "adb", None)
+        if isinstance(adb, ADB):
+            return adb
+        raise TypeError("not an android device: %r" % (device,))
+
+    def _list_devices(self):
+        return [serialno for serialno, _ in ADB(**self.adb_kwargs).devices(state="device")]
+
+    def _run_one(self, func, adb, started):
+        limit = AdbFanout._limit
+        with limit:
+            started[adb.serialno] = time.time()
+            return func(adb)
+
+    def run(self, func, devices=None):
+        """
+        Run the operation on the devices and wait for all of them
+
+        Args:
+            func: callable(adb) called with the ADB object of each device,
+                  or adb command(s) run with `ADB.cmd`, e.g. "shell pm list packages"
+            devices: list of serialnos, ADB objects or android devices, default is all the online devices
+
+        Returns:
+            OrderedDict of serialno -> FanoutResult, in the order of devices
+
+        """
+        if not callable(func):
+            cmds, timeout = func, self.timeout
+            func = lambda adb: adb.cmd(cmds, timeout=timeout)
+        if devices is None:
+            devices = self._list_devices()
+        adbs = [self._get_adb(device) for device in devices]
+        results = OrderedDict((adb.serialno, None) for adb in adbs)
+        if not adbs:
+            return results
+
+        started = {}
+        pool = ThreadPoolExecutor(max_workers=min(self.max_workers, len(adbs)))
+        try:
+            futures = {pool.submit(self._run_one, func, adb, started): adb.serialno for adb in adbs}
+            pending = set(futures)
+            while pending:
+                wait_time = None
+                if self.timeout:
+                    now = time.time()
+                    for future in list(pending):
+                        serialno = futures[future]
+                        if serialno in started and now - started[serialno] >= self.timeout:
+                            # threads can not be killed, the operation goes on in the background
+                            pending.discard(future)
+                            results[serialno] = FanoutResult(serialno, error=TimeoutError(
+                                "operation on %s timed out after %ss" % (serialno, self.timeout)),
+                                                             elapsed=now - started[serialno])
+                    # wake up when the first started operation times out, or check the newly started ones soon
+                    deadlines = [started[futures[f]] + self.timeout - now for f in pending if futures[f] in started]
+                    wait_time = max(min(deadlines + [0.1]), 0.001)
+                done, pending = wait(pending, timeout=wait_time, return_when=FIRST_COMPLETED)
+                for future in done:
+                    serialno = futures[future]
+                    elapsed = time.time() - started.get(serialno, time.time())
+                    try:
+                        results[serialno] = FanoutResult(serialno, result=future.result(), elapsed=elapsed)
+                    except Exception as e:
+                        LOGGING.debug("operation on %s failed: %r" % (serialno, e))
+                        results[serialno] = FanoutResult(serialno, error=e, elapsed=elapsed)
+        finally:
+            # do not wait for the timed out operations
+            pool.shutdown(wait=False)
+        return results
+
+
+def fanout(func, devices=None, max_workers=None, timeout=None, **adb_kwargs):
+    """
+    Run the operation on many devices at once, see AdbFanout
+
+    Args:
+        func: callable(adb), or adb command(s)
+        devices: list of serialnos, ADB objects or android devices, default is all the online devices
+        max_workers: max threads
+        timeout: timeout in seconds of the operation on each device
+        adb_kwargs: keyword arguments of the ADB objects created from serialnos
+
+    Returns:
+        OrderedDict of serialno -> FanoutResult
+
+    """
+    return AdbFanout(max_workers, timeout, **adb_kwargs).run(func, devices)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import re
+import sys
+import time
+import uuid
+import threading
+
+from airtest.core.android.constant import SDK_VERISON_ANDROID7
+from airtest.core.error import AdbError, AdbShellError, DeviceConnectionError
+from airtest.utils.logger import get_logger
+from airtest.utils.nbsp import NonBlockingStreamReader
+from airtest.utils.snippet import split_cmd, kill_proc, get_std_encoding
+
+LOGGING = get_logger(__name__)
+
+
+class ShellSession(object):
+    """
+    One long-lived `adb shell` process running the commands written to its stdin
+
+    Every command is followed by a unique end marker with its exit status on stdout, and by the same marker
+    on stderr, so the stdout, stderr and exit status of each command are split from the two streams.
+    Several commands can be written at once with `batch()`.
+
+    Args:
+        adb: ADB object
+        attach: if True, the `shell` commands of ADB.cmd (so ADB.shell, ADB.getprop...) run in this session
+                while it is open
+
+    Examples:
+        >>> with dev.adb.session() as session:
+        ...     sdk = session.shell("getprop ro.build.version.sdk")
+        ...     size, density = session.batch(["wm size", "wm density"])
+
+        >>> # dozens of adb shell calls, one adb process
+        >>> with dev.adb.session(attach=True):
+        ...     info = dev.adb.get_display_info()
+
+    """
+
+    # 等待命令执行完成的默认超时时间(秒)
+    TIMEOUT = 30
+
+    def __init__(self, adb, attach=False):
+        self.adb = adb
+        self.attach = attach
+        self.proc = None
+        self._stdout = None
+        self._stderr = None
+        self._lock = threading.RLock()
+        self._marker = "AIRTEST%s" % uuid.uuid4().hex
+        self._marker_re = re.compile((re.escape(self._marker) + r":(\d*)").encode("ascii"))
+        # adbd without shell v2 runs the shell in a pty, which mixes stderr into stdout
+        self._split_stderr = True
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        """Start the `adb shell` process"""
+        if self.is_alive:
+            return
+        self._split_stderr = self.adb.sdk_version >= SDK_VERISON_ANDROID7
+        # -T: no pty, so the commands are not echoed, and no warning on stderr
+        self.proc = self.adb.start_shell(["-T"] if self._split_stderr else [])
+        self._stdout = NonBlockingStreamReader(self.proc.stdout, print_output=False,
+                                               name="shell_session_stdout", auto_kill=True)
+        self._stderr = NonBlockingStreamReader(self.proc.stderr, print_output=False,
+                                               name="shell_session_stderr", auto_kill=True)
+        if not self._split_stderr:
+            # the pty echoes the commands written
+            self.execute(["stty -echo 2>/dev/null"])
+        if self.attach:
+            self.adb.shell_session = self
+
+    def close(self):
+        """Exit the `adb shell` process"""
+        if self.attach and self.adb.shell_session is self:
+            self.adb.shell_session = None
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.write(b"exit\n")
+            self.proc.stdin.flush()
+            self.proc.wait(timeout=1)
+        except Exception:
+            pass
+        kill_proc(self.proc)
+        self._stdout.kill()
+        self._stderr.kill()
+        self.proc = None
+
+    def _command_line(self, cmd):
+        cmd = " ".join(split_cmd(cmd))
+        # the command runs in a child shell, so that a syntax error or `exit` does not end the session,
+        # and reads /dev/null, so that it does not read the following commands.
+        # "AIRTEST""xxx" is printed as AIRTESTxxx, the marker does not appear if the command line is echoed.
+        quoted_marker = '"AIRTEST""%s:' % self._marker[len("AIRTEST"):]
+        line = "sh -c '%s' </dev/null; echo %s$?\"" % (cmd.replace("'", "'\\''"), quoted_marker)
+        if self._split_stderr:
+            line += "; echo %s\" >&2" % quoted_marker
+        return line + "\n"
+
+    def execute(self, cmds, timeout=None):
+        """
+        Write the commands at once and read their results
+
+        Args:
+            cmds: list of commands, each one is a string or a list of arguments
+            timeout: timeout in seconds for all the commands, default is TIMEOUT
+
+        Raises:
+            RuntimeError: if the commands timed out, the session is closed
+            AdbError: if the `adb shell` process exited, the session is closed
+
+        Returns:
+            list of (stdout, stderr, returncode), stdout and stderr are bytes
+
+        """
+        with self._lock:
+            if not self.is_alive:
+                self.start()
+            data = "".join(self._command_line(cmd) for cmd in cmds)
+            deadline = time.time() + (timeout or self.TIMEOUT)
+            try:
+                self.proc.stdin.write(data.encode(self.adb.SHELL_ENCODING))
+                self.proc.stdin.flush()
+                results = []
+                for _ in cmds:
+                    stdout, returncode = self._read_until_marker(self._stdout, deadline)
+                    stderr = self._read_until_marker(self._stderr, deadline)[0] if self._split_stderr else b""
+                    results.append((stdout, stderr, returncode))
+                return results
+            except Exception:
+                # the outputs are out of sync now
+                self.close()
+                raise
+
+    def _read_until_marker(self, reader, deadline):
+        lines = []
+        while True:
+            line = reader.readline(timeout=max(deadline - time.time(), 0.001))
+            if line is None:
+                raise RuntimeError("Command(s) in adb shell session timed out")
+            if line == b"":
+                # the adb shell process exited, e.g. device not found
+                stderr = self._stderr.read(0.1)
+                stderr = stderr.decode(get_std_encoding(sys.stderr), "replace")
+                if re.search(DeviceConnectionError.DEVICE_CONNECTION_ERROR, stderr):
+                    raise DeviceConnectionError(stderr)
+                raise AdbError(b"".join(lines), stderr)
+            m = self._marker_re.search(line)
+            if m:
+                lines.append(line[:m.start()])
+                return b"".join(lines), int(m.group(1) or 0)
+            lines.append(line)
+
+    def run(self, args, timeout=None):
+        """
+        Run the `shell <cmd>` adb arguments in the session
+
+        Args:
+            args: adb arguments, e.g. ["shell", "getprop", "ro.build.version.sdk"]
+            timeout: timeout in seconds
+
+        Returns:
+            (stdout, stderr, returncode) as the adb client process would return, None if not a shell command
+
+        """
+        args = split_cmd(args)
+        if args[0] != "shell" or len(args) < 2 or args[1].startswith("-"):
+            return None
+        stdout, stderr, returncode = self.execute([args[1:]], timeout)[0]
+        if not self._split_stderr:
+            # the adb client always returns 0 without shell v2
+            returncode = 0
+        return stdout, stderr, returncode
+
+    def shell(self, cmd, timeout=None):
+        """
+        Run the command in the session, same as ADB.shell
+
+        Raises:
+            AdbShellError: if command return value is non-zero
+
+        Returns:
+            command output
+
+        """
+        return self.batch([cmd], timeout)[0]
+
+    def batch(self, cmds, timeout=None):
+        """
+        Run the commands written at once in the session
+
+        Args:
+            cmds: list of commands
+            timeout: timeout in seconds for all the commands
+
+        Raises:
+            AdbShellError: if the return value of any command is non-zero, after all of them are done
+
+        Returns:
+            list of the command outputs
+
+        """
+        results = self.execute(cmds, timeout)
+        for stdout, stderr, returncode in results:
+            if returncode > 0:
+                raise AdbShellError(stdout.decode(self.adb.SHELL_ENCODING, "replace"),
+                                    stderr.decode(self.adb.SHELL_ENCODING, "replace"))
+        return [stdout.decode(self.adb.SHELL_ENCODING, "replace") for stdout, _, _ in results]
@@ -6,6 +6,7 @@ import os
 import time
 
 from airtest.core.cv import Template, loop_find, try_log_screen
+from airtest.core.cv import find_many as _find_many
 from airtest.core.error import TargetNotFoundError
 from airtest.core.settings import Settings as ST
 from airtest.utils.compat import script_log_dir
@@ -589,7 +590,7 @@ def sleep(secs=1.0):
 
 
 @logwrap
-def wait(v, timeout=None, interval=0.5, intervalfunc=None):
+def wait(v, timeout=None, interval=0.5, intervalfunc=None, stream=None):
     """
     Wait to match the Template on the device screen
 
@@ -597,6 +598,8 @@ def wait(v, timeout=None, interval=0.5, intervalfunc=None):
     :param timeout: time interval to wait for the match, default is None which is ``ST.FIND_TIMEOUT``
     :param interval: time interval in seconds to attempt to find a match
     :param intervalfunc: called after each unsuccessful attempt to find the corresponding match
+    :param stream: match on each new frame of the device screen stream (minicap/javacap/MJPEG) as it arrives,
+        instead of every ``interval`` seconds, default is None which is ``ST.FIND_FROM_STREAM``
     :raise TargetNotFoundError: raised if target is not found after the time limit expired
     :return: coordinates of the matched target
     :platforms: Android, Windows, iOS
@@ -605,6 +608,8 @@ def wait(v, timeout=None, interval=0.5, intervalfunc=None):
         >>> wait(Template(r"tpl1606821804906.png"))  # timeout after ST.FIND_TIMEOUT
         >>> # find Template every 3 seconds, timeout after 120 seconds
         >>> wait(Template(r"tpl1606821804906.png"), timeout=120, interval=3)
+        >>> # match on each new frame of the screen stream, detect the target within about one frame time
+        >>> wait(Template(r"tpl1606821804906.png"), stream=True)
 
         You can specify a callback function every time the search target fails::
 
@@ -614,7 +619,7 @@ def wait(v, timeout=None, interval=0.5, intervalfunc=None):
 
     """
     timeout = timeout or ST.FIND_TIMEOUT
-    pos = loop_find(v, timeout=timeout, interval=interval, intervalfunc=intervalfunc)
+    pos = loop_find(v, timeout=timeout, interval=interval, intervalfunc=intervalfunc, stream=stream)
     return pos
 
 
@@ -647,11 +652,12 @@ def exists(v):
 
 
 @logwrap
-def find_all(v):
+def find_all(v, max_count=None):
     """
     Find all occurrences of the target on the device screen and return their coordinates
 
     :param v: target to find
+    :param max_count: the maximum number of results, default is 10
     :return: list of results, [{'result': (x, y),
                                 'rectangle': ( (left_top, left_bottom, right_bottom, right_top) ),
                                 'confidence': 0.9},
@@ -665,7 +671,32 @@ def find_all(v):
 
     """
     screen = G.DEVICE.snapshot(quality=ST.SNAPSHOT_QUALITY)
-    return v.match_all_in(screen)
+    if max_count is None:
+        # Template subclasses may override match_all_in(screen)
+        return v.match_all_in(screen)
+    return v.match_all_in(screen, max_count=max_count)
+
+
+@logwrap
+def find_many(templates, workers=None):
+    """
+    Check many targets on the device screen with one screenshot
+
+    The screenshot is taken and converted only once, then all targets are matched against it,
+    which is much faster than calling ``exists()`` for each of them.
+
+    :param templates: dict of {key: Template}, or list of Template which uses template filenames as keys
+    :param workers: the number of threads to match the targets at the same time, default is ``ST.FIND_MANY_WORKERS``
+    :return: dict of {key: coordinates}, the coordinates are False if the target is not found
+    :platforms: Android, Windows, iOS
+    :Example:
+
+        >>> ret = find_many({"ok": Template(r"tpl1607511235111.png"), "cancel": Template(r"tpl1607511235222.png")})
+        >>> if ret["ok"]:
+        >>>     touch(ret["ok"])
+
+    """
+    return _find_many(templates, workers=workers)
 
 
 @logwrap
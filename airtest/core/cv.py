@@ -7,7 +7,9 @@ import os
 import sys
 import time
 import types
+import threading
 from six import PY3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from copy import deepcopy
 
 from airtest import aircv
@@ -19,6 +21,7 @@ from airtest.utils.transform import TargetPos
 
 from airtest.aircv.template_matching import TemplateMatching
 from airtest.aircv.multiscale_template_matching import MultiScaleTemplateMatching,MultiScaleTemplateMatchingPre
+from airtest.aircv.keypoint_base import KeypointMatching
 from airtest.aircv.keypoint_matching import KAZEMatching, BRISKMatching, AKAZEMatching, ORBMatching
 from airtest.aircv.keypoint_matching_contrib import SIFTMatching, SURFMatching, BRIEFMatching
 
@@ -35,9 +38,62 @@ MATCHING_METHODS = {
     "brief": BRIEFMatching,
 }
 
+# decoded template images and their resized variants, shared by all Template instances
+TEMPLATE_CACHE = aircv.ImageCache(ST.TEMPLATE_CACHE_SIZE)
+# matching classes accepting aircv.PreparedTemplate as im_search and aircv.PreparedScreen as im_source
+PREPARED_MATCHING_CLASSES = (TemplateMatching, MultiScaleTemplateMatching, KeypointMatching)
+# statistics of searching in the area predicted by record_pos: {method: {"hit": n, "fallback": n}},
+# "fallback" counts the full screen searches after a miss in the area,
+# keyed by the methods of MATCHING_METHODS only, so that it does not grow with the templates matched
+PREDICT_AREA_STATS = {}
+_PREDICT_AREA_STATS_LOCK = threading.Lock()
+# thread pool for ST.CVSTRATEGY_PARALLEL, created on first use and rebuilt when ST.CVSTRATEGY_WORKERS changes
+_CV_EXECUTOR = None
+_CV_EXECUTOR_WORKERS = None
+_CV_EXECUTOR_LOCK = threading.Lock()
+# methods left running by _cv_match_parallel once the result was known: {method: future}
+_CV_ABANDONED = {}
+
+
+def _accepts_prepared(func):
+    """Whether the matching class accepts aircv.PreparedTemplate/PreparedScreen as input."""
+    return isinstance(func, type) and issubclass(func, PREPARED_MATCHING_CLASSES)
+
+
+def _count_predict_area(method, key):
+    if method not in MATCHING_METHODS:
+        return
+    with _PREDICT_AREA_STATS_LOCK:
+        stats = PREDICT_AREA_STATS.setdefault(method, {"hit": 0, "fallback": 0})
+        stats[key] += 1
+        stats = dict(stats)
+    G.LOGGING.debug("[%s] predict area %s, stats: %s" % (method, key, stats))
+
+
+def _get_cv_executor():
+    global _CV_EXECUTOR, _CV_EXECUTOR_WORKERS
+    with _CV_EXECUTOR_LOCK:
+        if _CV_EXECUTOR is not None and _CV_EXECUTOR_WORKERS != ST.CVSTRATEGY_WORKERS:
+            # the running matches finish in the old pool's threads
+            _CV_EXECUTOR.shutdown(wait=False)
+            _CV_EXECUTOR = None
+        if _CV_EXECUTOR is None:
+            _CV_EXECUTOR = ThreadPoolExecutor(max_workers=ST.CVSTRATEGY_WORKERS, thread_name_prefix="airtest-cv")
+            _CV_EXECUTOR_WORKERS = ST.CVSTRATEGY_WORKERS
+        return _CV_EXECUTOR
+
+
+def _busy_cv_methods():
+    """Methods whose match abandoned by a previous _cv_match_parallel call is still running."""
+    with _CV_EXECUTOR_LOCK:
+        for method, future in list(_CV_ABANDONED.items()):
+            if future.done():
+                del _CV_ABANDONED[method]
+        return set(_CV_ABANDONED)
+
 
 @logwrap
-def loop_find(query, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, intervalfunc=None):
+def loop_find(query, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, intervalfunc=None, stream=None):
     """
     Search for image template in the screen until timeout
 
@@ -47,6 +103,9 @@ def loop_find(query, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, inte
         threshold: default is None
         interval: sleep interval before next attempt to find the image template
         intervalfunc: function that is executed after unsuccessful attempt to find the image template
+        stream: read the frames of the device screen stream as they arrive instead of sleeping `interval`,
+            default is None which is ``ST.FIND_FROM_STREAM``. While the frames are unchanged, the sleep
+            between two frames backs off from ``ST.FIND_STREAM_BACKOFF`` up to `interval`.
 
     Raises:
         TargetNotFoundError: when image template is not found in screenshot
@@ -58,32 +117,156 @@ def loop_find(query, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, inte
     """
     G.LOGGING.info("Try finding: %s", query)
     start_time = time.time()
+    # screenshots from the device screen stream, None to take snapshots every `interval` seconds
+    frames = G.DEVICE.frame_stream() if (ST.FIND_FROM_STREAM if stream is None else stream) else None
+    # fingerprint of the last screen the query missed in, and the number of skipped matches
+    last_fingerprint, skipped = None, 0
+    # skips in a row since the last match, and the time of the last match
+    skips_in_row, last_match_time = 0, start_time
+    backoff = 0
     while True:
-        screen = G.DEVICE.snapshot(filename=None, quality=ST.SNAPSHOT_QUALITY)
+        if frames is not None:
+            screen, scale = _stream_frame_for_match(next(frames))
+        else:
+            screen, scale = _snapshot_for_match()
 
         if screen is None:
             G.LOGGING.warning("Screen is None, may be locked")
         else:
             if threshold:
                 query.threshold = threshold
-            match_pos = query.match_in(screen)
-            if match_pos:
-                try_log_screen(screen)
-                return match_pos
+            fingerprint = None
+            if ST.FIND_SKIP_UNCHANGED or ST.FIND_CHANGED_AREA_ONLY or frames is not None:
+                fingerprint = aircv.ScreenFingerprint(screen)
+            unchanged = last_fingerprint is not None and fingerprint.same_as(last_fingerprint)
+            # 画面流没有变化时逐渐延长等待时间, 画面变化后立即恢复逐帧识别
+            backoff = min(max(backoff * 2, ST.FIND_STREAM_BACKOFF), interval) if unchanged else 0
+            # 指纹可能漏掉很小的变化, 连续跳过太多次或太久时强制重新识别
+            skip = (unchanged and ST.FIND_SKIP_UNCHANGED and skips_in_row < ST.FIND_SKIP_MAX
+                    and time.time() - last_match_time < ST.FIND_SKIP_MAX_TIME)
+            if skip:
+                # 屏幕没有变化, 沿用上次未找到的结果
+                skipped += 1
+                skips_in_row += 1
+                G.LOGGING.debug("Screen unchanged, skip matching %s (%d skipped)" % (query, skipped))
+            else:
+                skips_in_row, last_match_time = 0, time.time()
+                area = None
+                if ST.FIND_CHANGED_AREA_ONLY and last_fingerprint is not None:
+                    area = fingerprint.changed_area(last_fingerprint)
+                # 缩小的截图上识别, 结果换算回设备坐标
+                match_screen = aircv.PreparedScreen(screen, scale) if scale != 1 else screen
+                match_pos = query.match_in(match_screen) if area is None else query.match_in(match_screen, area)
+                if match_pos:
+                    if skipped:
+                        G.LOGGING.info("Skipped %d matches on unchanged screens", skipped)
+                    try_log_screen(screen, resolution=_display_resolution(screen, scale))
+                    return match_pos
+                last_fingerprint = fingerprint
 
         if intervalfunc is not None:
             intervalfunc()
 
         # 超时则raise，未超时则进行下次循环:
         if (time.time() - start_time) > timeout:
-            try_log_screen(screen)
+            if skipped:
+                G.LOGGING.info("Skipped %d matches on unchanged screens", skipped)
+            try_log_screen(screen, resolution=_display_resolution(screen, scale))
             raise TargetNotFoundError('Picture %s not found in screen' % query)
-        else:
+        elif frames is None:
             time.sleep(interval)
+        elif backoff or screen is None:
+            time.sleep(backoff or interval)
+
+
+def _snapshot_for_match():
+    """
+    Take a screenshot for image matching, see ``ST.FIND_SCREEN_REDUCE``
+
+    Returns:
+        (screen, scale), the display coordinates are the screen coordinates multiplied by scale
+
+    """
+    if ST.FIND_SCREEN_REDUCE == 1:
+        return G.DEVICE.snapshot(filename=None, quality=ST.SNAPSHOT_QUALITY), 1
+    return G.DEVICE.snapshot_reduced(ST.FIND_SCREEN_REDUCE)
+
+
+def _stream_frame_for_match(frame):
+    """
+    Reduce a frame of ``G.DEVICE.frame_stream()`` for image matching, see ``ST.FIND_SCREEN_REDUCE``
+
+    The frame may be smaller than the display already, e.g. minicap capturing a smaller projection,
+    so the scale is computed from the frame size, the same as ``Android.snapshot_reduced``.
+
+    Returns:
+        (screen, scale), the display coordinates are the screen coordinates multiplied by scale
+
+    """
+    if frame is None:
+        return None, 1
+    screen = aircv.utils.reduce_image(frame, ST.FIND_SCREEN_REDUCE)
+    width = G.DEVICE.get_current_resolution()[0]
+    return screen, float(width) / screen.shape[1]
+
+
+def _display_resolution(screen, scale):
+    """Resolution of the display the screen was taken from, None to use the screen size."""
+    if screen is None or scale == 1:
+        return None
+    return aircv.PreparedScreen(screen, scale).display_resolution
+
+
+@logwrap
+def find_many(templates, workers=None):
+    """
+    Match many image templates against one screenshot
+
+    The screen is captured and converted (gray/HSV) only once, all templates are matched against it.
+
+    Args:
+        templates: dict of {key: Template}, or list of Template which uses template filenames as keys
+        workers: the number of threads to match templates at the same time, default is ST.FIND_MANY_WORKERS
+
+    Returns:
+        dict of {key: position}, the position is False if the template is not found
+
+    """
+    if isinstance(templates, dict):
+        items = list(templates.items())
+    else:
+        items = [(query.filename, query) for query in templates]
+    screen, scale = _snapshot_for_match()
+    if screen is None:
+        G.LOGGING.warning("Screen is None, may be locked")
+        return {key: False for key, _ in items}
+
+    prepared_screen = aircv.PreparedScreen(screen, scale)
+    # convert the screen before matching, so that the workers share the results
+    prepared_screen.gray
+    if any(query.rgb for _, query in items):
+        prepared_screen.hsv
+
+    def match(query):
+        match_result = query._match_screen(prepared_screen)
+        if not match_result:
+            return False
+        return TargetPos().getXY(match_result, query.target_pos)
+
+    workers = workers or ST.FIND_MANY_WORKERS
+    if workers > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="airtest-find-many") as executor:
+            positions = list(executor.map(match, [query for _, query in items]))
+    else:
+        positions = [match(query) for _, query in items]
+    result = {key: pos for (key, _), pos in zip(items, positions)}
+    G.LOGGING.debug("find many: %s" % result)
+    try_log_screen(screen, resolution=_display_resolution(screen, scale))
+    return result
 
 
 @logwrap
-def try_log_screen(screen=None, quality=None, max_size=None):
+def try_log_screen(screen=None, quality=None, max_size=None, resolution=None):
     """
     Save screenshot to file
 
@@ -91,6 +274,8 @@ def try_log_screen(screen=None, quality=None, max_size=None):
         screen: screenshot to be saved
         quality: The image quality, default is ST.SNAPSHOT_QUALITY
         max_size: the maximum size of the picture, e.g 1200
+        resolution: the display resolution the positions in the log refer to,
+            default is the size of screen, see ``ST.FIND_SCREEN_REDUCE``
 
     Returns:
         {"screen": filename, "resolution": aircv.get_resolution(screen)}
@@ -108,7 +293,7 @@ def try_log_screen(screen=None, quality=None, max_size=None):
     filepath = os.path.join(ST.LOG_DIR, filename)
     if screen is not None:
         aircv.imwrite(filepath, screen, quality, max_size=max_size)
-        return {"screen": filename, "resolution": aircv.get_resolution(screen)}
+        return {"screen": filename, "resolution": resolution or aircv.get_resolution(screen)}
     return None
 
 
@@ -134,6 +319,7 @@ class Template(object):
         self.rgb = rgb
         self.scale_max = scale_max
         self.scale_step = scale_step
+        self._prepared = []
 
     @property
     def filepath(self):
@@ -150,40 +336,190 @@ class Template(object):
         filepath = self.filepath if PY3 else self.filepath.encode(sys.getfilesystemencoding())
         return "Template(%s)" % filepath
 
-    def match_in(self, screen):
-        match_result = self._cv_match(screen)
+    def match_in(self, screen, area=None):
+        match_result = self._cv_match(screen, area)
         G.LOGGING.debug("match result: %s", match_result)
         if not match_result:
             return None
         focus_pos = TargetPos().getXY(match_result, self.target_pos)
         return focus_pos
 
-    def match_all_in(self, screen):
+    def match_all_in(self, screen, max_count=None):
+        """
+        Find all occurrences of the template in the screen
+
+        Args:
+            screen: screen image
+            max_count: the maximum number of results, default is TemplateMatching.MAX_RESULT_COUNT
+
+        Returns:
+            list of match results, None if not found
+
+        """
         image = self._imread()
         image = self._resize_image(image, screen, ST.RESIZE_METHOD)
-        return self._find_all_template(image, screen)
+        return self._find_all_template(self._get_prepared(image), screen, max_count)
 
     @logwrap
-    def _cv_match(self, screen):
+    def _cv_match(self, screen, area=None):
+        return self._match_screen(screen, area)
+
+    def _match_screen(self, screen, area=None):
+        """
+        Match with the methods in ST.CVSTRATEGY, screen can be an image or an aircv.PreparedScreen.
+
+        If area (xmin, ymin, xmax, ymax) is given, the target is only searched around it,
+        see ``_match_prepared``.
+        """
+        screen = aircv.prepare_screen(screen)
         # in case image file not exist in current directory:
         ori_image = self._imread()
-        image = self._resize_image(ori_image, screen, ST.RESIZE_METHOD)
+        image = self._resize_image(ori_image, screen.image, ST.RESIZE_METHOD, self._record_resolution(screen))
+        if ST.CVSTRATEGY_PARALLEL and len(ST.CVSTRATEGY) > 1:
+            return screen.result_to_display(self._cv_match_parallel(ori_image, image, screen, area))
         ret = None
         for method in ST.CVSTRATEGY:
             # get function definition and execute:
-            func = MATCHING_METHODS.get(method, None)
-            if func is None:
-                raise InvalidMatchingMethodError("Undefined method in CVSTRATEGY: '%s', try 'kaze'/'brisk'/'akaze'/'orb'/'surf'/'sift'/'brief' instead." % method)
-            else:
-                if method in ["mstpl", "gmstpl"]:
-                    ret = self._try_match(func, ori_image, screen, threshold=self.threshold, rgb=self.rgb, record_pos=self.record_pos,
-                                            resolution=self.resolution, scale_max=self.scale_max, scale_step=self.scale_step)
-                else:
-                    ret = self._try_match(func, image, screen, threshold=self.threshold, rgb=self.rgb)
+            func = self._get_matching_method(method)
+            ret = self._match_with_method(method, func, ori_image, image, screen, area)
             if ret:
                 break
+        # the positions in a reduced screen are mapped back to the display coordinates
+        return screen.result_to_display(ret)
+
+    def _cv_match_parallel(self, ori_image, image, screen, area=None):
+        """
+        Run all methods in ST.CVSTRATEGY at the same time on a thread pool
+
+        ST.CVSTRATEGY_PARALLEL_MODE:
+            "priority": return the confident result of the method which comes first in ST.CVSTRATEGY
+            "first": return the first confident result and cancel the remaining methods
+
+        A running match can not be interrupted: in "first" mode, the methods still running when the result
+        is known are skipped by the next calls until they finish, instead of queueing behind them.
+        """
+        strategy = list(ST.CVSTRATEGY)
+        busy = _busy_cv_methods() if ST.CVSTRATEGY_PARALLEL_MODE == "first" else set()
+        if busy and not busy.issuperset(strategy):
+            G.LOGGING.debug("parallel match: skip %s, still running" % sorted(busy))
+            strategy = [method for method in strategy if method not in busy]
+        funcs = [self._get_matching_method(method) for method in strategy]
+        # prepare template images in current thread, the workers only match them against the screen
+        args = [(method, func, self._get_prepared(ori_image if method in ["mstpl", "gmstpl"] else image, func))
+                for method, func in zip(strategy, funcs)]
+        executor = _get_cv_executor()
+        futures = {}
+        for method, func, search in args:
+            futures[executor.submit(self._timed_match, method, func, search, screen, area)] = method
+
+        results, winner, pending = {}, None, set(futures)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+            for method in strategy:
+                if method not in results:
+                    if ST.CVSTRATEGY_PARALLEL_MODE == "first":
+                        continue
+                    # a method with higher priority is still running
+                    break
+                if results[method][0]:
+                    winner = method
+                    break
+        for future in pending:
+            if not future.cancel():
+                with _CV_EXECUTOR_LOCK:
+                    _CV_ABANDONED[futures[future]] = future
+
+        method_times = {method: round(cost, 3) for method, (_, cost) in results.items()}
+        G.LOGGING.debug("parallel match: winner=%s, method times=%s, cancelled=%s" % (
+            winner, method_times, [futures[f] for f in pending]))
+        if winner is None:
+            return None
+        ret = results[winner][0]
+        ret["method"] = winner
+        ret["method_times"] = method_times
         return ret
 
+    def _timed_match(self, method, func, search, screen, area=None):
+        start = time.time()
+        ret = self._match_prepared(method, func, search, screen, area)
+        cost = time.time() - start
+        G.LOGGING.debug("[%s] match cost %.3fs, result: %s" % (method, cost, ret))
+        return ret, cost
+
+    def _match_with_method(self, method, func, ori_image, image, screen, area=None):
+        search = self._get_prepared(ori_image if method in ["mstpl", "gmstpl"] else image, func)
+        return self._match_prepared(method, func, search, screen, area)
+
+    def _match_prepared(self, method, func, search, screen, area=None):
+        """
+        Match with one method, search in the area predicted by record_pos first, then in the full screen.
+        "mstpl" only searches in the predicted area, unless ST.PREDICT_AREA_MSTPL_FALLBACK is set.
+
+        If area is given, "tpl" and the keypoint methods only search in the area extended by the template size.
+        "mstpl" and "gmstpl" always search in the full screen, their scales depend on the screen size.
+        """
+        resolution = self._record_resolution(screen)
+        if not _accepts_prepared(func):
+            screen = screen.image
+        if method in ["mstpl", "gmstpl"]:
+            kwargs = dict(threshold=self.threshold, rgb=self.rgb, resolution=resolution,
+                          scale_max=self.scale_max, scale_step=self.scale_step)
+            if method == "mstpl" and self._use_predict_area(method):
+                # "mstpl" crops the predicted area by itself according to record_pos
+                ret = self._try_match(func, search, screen, record_pos=self.record_pos, **kwargs)
+                if ret:
+                    _count_predict_area(method, "hit")
+                    return ret
+                if not ST.PREDICT_AREA_MSTPL_FALLBACK:
+                    return None
+                _count_predict_area(method, "fallback")
+                return self._try_match(func, search, screen, record_pos=None, **kwargs)
+            return self._try_match(func, search, screen, record_pos=self.record_pos, **kwargs)
+
+        if area is not None:
+            w, h = aircv.get_resolution(search.image if isinstance(search, aircv.PreparedTemplate) else search)
+            xmin, ymin, xmax, ymax = area
+            screen_w, screen_h = aircv.get_resolution(screen.image if isinstance(screen, aircv.PreparedScreen) else screen)
+            # aircv.crop_image drops the last column/row, search in the full screen near the right/bottom edge
+            if xmax + w < screen_w and ymax + h < screen_h:
+                return self._find_result_in_area(func, search, screen, (xmin - w, ymin - h, xmax + w, ymax + h))
+
+        if self._use_predict_area(method):
+            ret = self._find_result_in_predict_area(func, search, screen)
+            if ret:
+                _count_predict_area(method, "hit")
+                return ret
+            _count_predict_area(method, "fallback")
+        return self._try_match(func, search, screen, threshold=self.threshold, rgb=self.rgb)
+
+    def _record_resolution(self, screen):
+        """
+        Recording resolution of the template
+
+        Without self.resolution, the template is regarded as recorded on the display when the screen
+        has been reduced (see ``ST.FIND_SCREEN_REDUCE``), so that it is reduced as much as the screen.
+        """
+        if self.resolution or not isinstance(screen, aircv.PreparedScreen) or screen.scale == 1:
+            return self.resolution
+        return screen.display_resolution
+
+    def _use_predict_area(self, method):
+        """Whether to search in the area predicted by record_pos before the full screen."""
+        if not self.record_pos or not ST.PREDICT_AREA_SEARCH or method == "gmstpl":
+            return False
+        if method not in ["tpl", "mstpl"] and not ST.KEYPOINT_MATCHING_PREDICTION:
+            return False
+        return True
+
+    @staticmethod
+    def _get_matching_method(method):
+        func = MATCHING_METHODS.get(method, None)
+        if func is None:
+            raise InvalidMatchingMethodError("Undefined method in CVSTRATEGY: '%s', try 'kaze'/'brisk'/'akaze'/'orb'/'surf'/'sift'/'brief' instead." % method)
+        return func
+
     @staticmethod
     def _try_match(func, *args, **kwargs):
         G.LOGGING.debug("try match with %s" % func.__name__)
@@ -198,56 +534,93 @@ class Template(object):
         else:
             return ret
 
+    def _get_prepared(self, image, func=None):
+        """
+        Get the aircv.PreparedTemplate of image, so that the search-side state is computed only once
+
+        The original image and the resized one are kept, other matching classes get the image itself.
+        """
+        if func is not None and not _accepts_prepared(func):
+            return image
+        kept = getattr(self, "_prepared", [])
+        for prepared in kept:
+            if prepared.image is image:
+                return prepared
+        prepared = aircv.PreparedTemplate(image)
+        self._prepared = [prepared] + kept[:1]
+        return prepared
+
     def _imread(self):
-        return aircv.imread(self.filepath)
+        if TEMPLATE_CACHE.max_bytes != ST.TEMPLATE_CACHE_SIZE:
+            TEMPLATE_CACHE.max_bytes = ST.TEMPLATE_CACHE_SIZE
+        return TEMPLATE_CACHE.imread(self.filepath)
 
-    def _find_all_template(self, image, screen):
-        return TemplateMatching(image, screen, threshold=self.threshold, rgb=self.rgb).find_all_results()
+    def _find_all_template(self, image, screen, max_count=None):
+        return TemplateMatching(image, screen, threshold=self.threshold, rgb=self.rgb,
+                                max_count=max_count).find_all_results()
 
-    def _find_keypoint_result_in_predict_area(self, func, image, screen):
+    def _find_result_in_predict_area(self, func, image, screen):
         if not self.record_pos:
             return None
-        # calc predict area in screen
+        if isinstance(screen, aircv.PreparedScreen):
+            screen = screen.image
+        # calc predict area in screen, image has been resized to fit the screen resolution
         image_wh, screen_resolution = aircv.get_resolution(image), aircv.get_resolution(screen)
-        xmin, ymin, xmax, ymax = Predictor.get_predict_area(self.record_pos, image_wh, self.resolution, screen_resolution)
-        # crop predict image from screen
-        predict_area = aircv.crop_image(screen, (xmin, ymin, xmax, ymax))
-        if not predict_area.any():
+        area = Predictor.get_predict_area(self.record_pos, image_wh, (), screen_resolution)
+        return self._find_result_in_area(func, image, screen, area)
+
+    def _find_result_in_area(self, func, image, screen, area):
+        """Match in the area (xmin, ymin, xmax, ymax) of screen, the result is in screen coordinates."""
+        if isinstance(screen, aircv.PreparedScreen):
+            screen = screen.image
+        image_wh, (w, h) = aircv.get_resolution(image), aircv.get_resolution(screen)
+        # crop the area from screen, the same bounds as aircv.crop_image
+        xmin, ymin, xmax, ymax = area
+        xmin, ymin = min(max(0, int(xmin)), w - 1), min(max(0, int(ymin)), h - 1)
+        xmax, ymax = min(max(0, int(xmax)), w - 1), min(max(0, int(ymax)), h - 1)
+        if xmax - xmin < image_wh[0] or ymax - ymin < image_wh[1]:
             return None
-        # keypoint matching in predicted area:
-        ret_in_area = func(image, predict_area, threshold=self.threshold, rgb=self.rgb)
+        area_image = aircv.crop_image(screen, (xmin, ymin, xmax, ymax))
+        # matching in the area:
+        ret_in_area = self._try_match(func, image, area_image, threshold=self.threshold, rgb=self.rgb)
         # calc cv ret if found
         if not ret_in_area:
             return None
         ret = deepcopy(ret_in_area)
         if "rectangle" in ret:
-            for idx, item in enumerate(ret["rectangle"]):
-                ret["rectangle"][idx] = (item[0] + xmin, item[1] + ymin)
+            ret["rectangle"] = [(item[0] + xmin, item[1] + ymin) for item in ret["rectangle"]]
         ret["result"] = (ret_in_area["result"][0] + xmin, ret_in_area["result"][1] + ymin)
         return ret
 
-    def _resize_image(self, image, screen, resize_method):
-        """模板匹配中，将输入的截图适配成 等待模板匹配的截图."""
+    def _resize_image(self, image, screen, resize_method, resolution=None):
+        """模板匹配中，将输入的截图适配成 等待模板匹配的截图, resolution默认为录制分辨率self.resolution."""
+        resolution = self.resolution if resolution is None else resolution
         # 未记录录制分辨率，跳过
-        if not self.resolution:
+        if not resolution:
             return image
         screen_resolution = aircv.get_resolution(screen)
         # 如果分辨率一致，则不需要进行im_search的适配:
-        if tuple(self.resolution) == tuple(screen_resolution) or resize_method is None:
+        if tuple(resolution) == tuple(screen_resolution) or resize_method is None:
             return image
         if isinstance(resize_method, types.MethodType):
             resize_method = resize_method.__func__
+        # 同一模板在同一屏幕分辨率下的缩放结果是固定的，直接从缓存中取:
+        cache_key = (TEMPLATE_CACHE.file_key(self.filepath), image.shape, tuple(resolution),
+                     tuple(screen_resolution), resize_method)
+        resized = TEMPLATE_CACHE.get(cache_key)
+        if resized is not None:
+            return resized
         # 分辨率不一致则进行适配，默认使用cocos_min_strategy:
         h, w = image.shape[:2]
-        w_re, h_re = resize_method(w, h, self.resolution, screen_resolution)
+        w_re, h_re = resize_method(w, h, resolution, screen_resolution)
         # 确保w_re和h_re > 0, 至少有1个像素:
         w_re, h_re = max(1, w_re), max(1, h_re)
         # 调试代码: 输出调试信息.
         G.LOGGING.debug("resize: (%s, %s)->(%s, %s), resolution: %s=>%s" % (
-                        w, h, w_re, h_re, self.resolution, screen_resolution))
+                        w, h, w_re, h_re, resolution, screen_resolution))
         # 进行图片缩放:
         image = cv2.resize(image, (w_re, h_re))
-        return image
+        return TEMPLATE_CACHE.put(cache_key, image)
 
 
 class Predictor(object):
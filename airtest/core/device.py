@@ -1,5 +1,6 @@
 # encoding=utf-8
 from six import with_metaclass
+from airtest import aircv
 
 
 class MetaDevice(type):
@@ -40,6 +41,36 @@ class Device(with_metaclass(MetaDevice, object)):
     def snapshot(self, *args, **kwargs):
         self._raise_not_implemented_error()
 
+    def snapshot_reduced(self, reduce=1):
+        """
+        Take a screenshot at 1/reduce of the display size for image matching, see ``ST.FIND_SCREEN_REDUCE``
+
+        The screenshot is resized after it is taken by default, the devices able to capture or decode
+        a smaller screenshot directly should override it.
+
+        Args:
+            reduce: 1, 2, 4 or 8
+
+        Returns:
+            (screenshot, scale), the display coordinates are the screenshot coordinates multiplied by scale,
+            screenshot is None if failed
+
+        """
+        screen = self.snapshot(filename=None)
+        return aircv.utils.reduce_image(screen, reduce), reduce
+
+    def frame_stream(self):
+        """
+        Generator of screenshots read from a continuous screen stream, each one as soon as it arrives
+
+        Used by ``loop_find`` to wait for a target in the streaming mode, see ``ST.FIND_FROM_STREAM``.
+
+        Returns:
+            generator of screenshots, None if the device does not capture the screen from a stream
+
+        """
+        return None
+
     def touch(self, target, **kwargs):
         self._raise_not_implemented_error()
 
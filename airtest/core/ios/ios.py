@@ -30,7 +30,7 @@ from airtest.core.ios.instruct_cmd import InstructHelper
 from airtest.utils.logger import get_logger
 from airtest.core.ios.mjpeg_cap import MJpegcap
 from airtest.core.settings import Settings as ST
-from airtest.aircv.screen_recorder import ScreenRecorder, resize_by_max, get_max_size
+from airtest.aircv.screen_recorder import ScreenRecorder, resize_by_max, get_max_size, throttle
 from airtest.core.error import LocalDeviceError, AirtestError
 from airtest.core.helper import logwrap
 
@@ -978,6 +978,32 @@ class IOS(Device):
 
         return screen
 
+    def frame_stream(self):
+        """
+        Generator of screenshots read from the MJPEG stream, see ``Device.frame_stream``
+
+        Returns:
+            generator of screenshots, None if the screen is not captured by MJPEG
+
+        """
+        if self.cap_method != CAP_METHOD.MJPEG:
+            return None
+        return self._iter_stream_frames()
+
+    def _iter_stream_frames(self):
+        # 后台线程持续读取mjpeg流, 每次取比上一帧更新的最新一帧, 不会识别积压的旧画面
+        for screen in self.mjpegcap.iter_frames():
+            if screen is not None:
+                # mjpeg画面可能经过缩放, 缩放回snapshot()的分辨率, 保证识别坐标一致
+                info = self.display_info
+                if info["orientation"] in [wda.LANDSCAPE, wda.LANDSCAPE_RIGHT]:
+                    size = (info["height"], info["width"])
+                else:
+                    size = (info["width"], info["height"])
+                if (screen.shape[1], screen.shape[0]) != size:
+                    screen = aircv.cv2.resize(screen, size)
+            yield screen
+
     def get_frame_from_stream(self):
         if self.cap_method == CAP_METHOD.MJPEG:
             try:
@@ -1629,8 +1655,18 @@ class IOS(Device):
                 save_path = os.path.join(logdir, output)
 
         max_size = get_max_size(max_size)
-
-        def get_frame():
+        subscription = []
+
+        def get_shared_frame():
+            # mjpeg画面流在后台只解码一次, 通过frame bus与图像识别, 截图共享, 不争抢画面
+            if not subscription:
+                subscription.append(self.mjpegcap.get_frame_bus().subscribe(max_fps=fps))
+            shared = subscription[0].get()
+            if shared is None:
+                return None
+            return resize_by_max(shared.img, max_size) if max_size is not None else shared.img
+
+        def get_stream_frame():
             data = self.get_frame_from_stream()
             frame = aircv.utils.string_2_img(data)
 
@@ -1638,9 +1674,16 @@ class IOS(Device):
                 frame = resize_by_max(frame, max_size)
             return frame
 
+        if self.cap_method == CAP_METHOD.MJPEG:
+            get_frame = get_shared_frame
+        else:
+            # wda截图没有画面流, 按fps限制截图频率
+            get_frame = throttle(get_stream_frame, fps)
+
         self.recorder = ScreenRecorder(
             save_path, get_frame, fps=fps,
             snapshot_sleep=snapshot_sleep, orientation=orientation)
+        self.recorder.frame_subscription = subscription
         self.recorder.stop_time = max_time
         self.recorder.start()
         LOGGING.info("start recording screen to {}".format(save_path))
@@ -1651,6 +1694,8 @@ class IOS(Device):
         """
         LOGGING.info("stopping recording")
         self.recorder.stop()
+        for sub in getattr(self.recorder, "frame_subscription", []):
+            sub.close()
         return None
 
     def push(self, local_path, remote_path, bundle_id=None, timeout=None):
@@ -1,9 +1,14 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
+import time
 import numpy
 import socket
+import threading
 import traceback
+from collections import namedtuple
 from airtest import aircv
+from airtest.aircv.frame_reader import LatestFrameReader
+from airtest.aircv.frame_bus import FrameBus
 from airtest.utils.snippet import reg_cleanup, on_method_ready, ready_method
 from airtest.core.ios.constant import ROTATION_MODE, DEFAULT_MJPEG_PORT
 from airtest.utils.logger import get_logger
@@ -14,39 +19,210 @@ LOGGING = get_logger(__name__)
 
 
 class SocketBuffer(SafeSocket):
-    def __init__(self, sock: socket.socket):
+    """
+    Buffered reader of the MJPEG stream
+
+    The data is received with recv_into into one reusable buffer, and read_until() goes on searching from
+    where the last search stopped, so that each byte of the stream is copied and scanned only once.
+    """
+
+    # 接收缓冲区的初始大小, 放不下一帧时自动扩大
+    BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, sock: socket.socket, size=None):
         super(SocketBuffer, self).__init__(sock)
+        self._data = bytearray(size or self.BUFFER_SIZE)
+        self._view = memoryview(self._data)
+        # 未读数据为self._data[self._start:self._end]
+        self._start = 0
+        self._end = 0
+        # read_until已经查找过的位置, 下次从这里继续查找
+        self._scan = 0
+
+    @property
+    def buffered(self):
+        """the number of bytes received but not read yet"""
+        return self._end - self._start
+
+    def _compact(self, need=0):
+        """Move the unread data to the head of the buffer, grow the buffer if it can not hold `need` bytes"""
+        size = self._end - self._start
+        capacity = len(self._data)
+        if max(size, need) >= capacity:
+            while max(size, need) >= capacity:
+                capacity *= 2
+            data = bytearray(capacity)
+            data[:size] = self._view[self._start:self._end]
+            self._data, self._view = data, memoryview(data)
+        elif size:
+            self._view[:size] = self._view[self._start:self._end]
+        self._scan = max(self._scan - self._start, 0)
+        self._start, self._end = 0, size
 
     def _drain(self):
-        _data = self.sock.recv(1024)
-        if _data is None or _data == b"":
+        if self._start == self._end and self._start:
+            # 数据已读完, 直接从头开始接收
+            self._start = self._end = self._scan = 0
+        elif self._end == len(self._data):
+            self._compact()
+        n = self.sock.recv_into(self._view[self._end:], min(len(self._data) - self._end, self.recv_size))
+        if not n:
             raise IOError("socket closed")
-        self.buf += _data
-        return len(_data)
+        self._end += n
+        return n
+
+    def _consume(self, end, skip=0):
+        ret = bytes(self._view[self._start:end])
+        self._start = self._scan = end + skip
+        return ret
 
     def read_until(self, delimeter: bytes) -> bytes:
         """ return without delimeter """
         while True:
-            index = self.buf.find(delimeter)
+            index = self._data.find(delimeter, max(self._scan, self._start), self._end)
             if index != -1:
-                _return = self.buf[:index]
-                self.buf = self.buf[index + len(delimeter):]
-                return _return
+                return self._consume(index, len(delimeter))
+            # 末尾可能是分隔符的前半部分, 下次从那里继续查找
+            self._scan = max(self._start, self._end - len(delimeter) + 1)
             self._drain()
 
     def read_bytes(self, length: int) -> bytes:
-        while length > len(self.buf):
+        if len(self._data) - self._start < length:
+            self._compact(length)
+        while length > self._end - self._start:
             self._drain()
-
-        _return, self.buf = self.buf[:length], self.buf[length:]
-        return _return
+        return self._consume(self._start + length)
 
     def write(self, data: bytes):
         return self.sock.sendall(data)
 
 
+# seq: 帧序号, 从1开始递增; timestamp: 收到该帧的时间; data: jpg数据
+JpegFrame = namedtuple("JpegFrame", ["seq", "timestamp", "data"])
+
+
+class MJpegReader(object):
+    """
+    Keep reading the MJPEG stream in a background thread and keep only the latest complete JPEG
+
+    The stream is drained as fast as WDA sends it, so the frames never pile up in the connection,
+    and the latest frame is got at once.
+
+    Args:
+        read_frame: callable reading the next JPEG from the stream, raising IOError if the stream is broken
+        name: name of the thread
+
+    """
+
+    # 等待第一帧的默认超时时间(秒)
+    TIMEOUT = 3
+    # 停止时等待后台线程退出的时间(秒)
+    STOP_TIMEOUT = 3
+    # 画面流断开后, 重新连接的间隔(秒)
+    RECONNECT_INTERVAL = 0.5
+    # 连续重连失败这么多次后放弃, 后台线程退出
+    MAX_RECONNECTS = 10
+
+    def __init__(self, read_frame, name="mjpeg_reader"):
+        self.read_frame = read_frame
+        self.name = name
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._seq = 0
+        self._frame = None
+        # the number of frames read, and the number of times the stream broke
+        self.received = 0
+        self.errors = 0
+        # the number of failures since the last frame read
+        self._failures = 0
+
+    @property
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    @property
+    def is_broken(self):
+        """the stream broke and no frame has been read since, i.e. reconnecting"""
+        return self._failures > 0
+
+    def start(self):
+        if self.is_alive:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._read_loop, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stop the thread
+
+        Args:
+            wait: wait for the thread to exit, the thread blocked in recv exits after the socket is closed
+
+        """
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.STOP_TIMEOUT)
+
+    def get(self, newer_than=None, timeout=None):
+        """
+        Get the latest JPEG, O(1) once the first frame has been read
+
+        Args:
+            newer_than: wait for a frame whose seq is greater than it, None to return the latest frame
+            timeout: timeout in seconds, default is TIMEOUT
+
+        Returns:
+            JpegFrame(seq, timestamp, data), None if timed out or the stream is broken
+
+        """
+        newer_than = newer_than or 0
+        with self._cond:
+            self._cond.wait_for(lambda: (self._frame is not None and self._frame.seq > newer_than)
+                                or self._stop_event.is_set(), self.TIMEOUT if timeout is None else timeout)
+            if self._frame is None or self._frame.seq <= newer_than:
+                return None
+            return self._frame
+
+    def _read_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                data = self.read_frame()
+            except Exception:
+                if self._stop_event.is_set():
+                    break
+                self.errors += 1
+                self._failures += 1
+                with self._cond:
+                    # 画面流断开后旧画面不再是最新的, 等待重连后的新画面
+                    self._frame = None
+                    if self._failures > self.MAX_RECONNECTS:
+                        LOGGING.warning("mjpeg stream broken, give up after %s reconnections" % self.MAX_RECONNECTS)
+                        self._stop_event.set()
+                        self._cond.notify_all()
+                        break
+                LOGGING.debug("mjpeg stream broken, reconnect later", exc_info=True)
+                self._stop_event.wait(self.RECONNECT_INTERVAL)
+                continue
+            self._failures = 0
+            with self._cond:
+                self._seq += 1
+                self.received += 1
+                self._frame = JpegFrame(self._seq, time.time(), data)
+                self._cond.notify_all()
+
+
 class MJpegcap(object):
 
+    # 为True时(默认), 首次get_frame_from_stream()启动后台线程持续读取画面流, 只保留最新的一帧jpg,
+    # 之后直接返回最新一帧; 后台线程只读取不解码, 解码只在get_frame_bus()后才启动.
+    # 为False时, 每次调用时才从连接中读取一帧, 可能是积压在连接中的旧画面
+    BACKGROUND_READER = True
+
     def __init__(self, instruct_helper=None, ip='localhost', port=None, ori_function=None):
         self.instruct_helper = instruct_helper
         self.port = int(port or DEFAULT_MJPEG_PORT)
@@ -57,6 +233,15 @@ class MJpegcap(object):
         self.sock = None
         self.buf = None
         self._is_running = False
+        # held while reading self.buf, so that restart_stream() does not close it under a reader
+        self._read_lock = threading.RLock()
+        # the MJpegReader draining the stream in background, see BACKGROUND_READER
+        self.stream_reader = None
+        # the LatestFrameReader and FrameBus created by get_frame_bus()
+        self.frame_reader = None
+        self.frame_bus = None
+        # (MJpegReader, seq) of the last frame passed to frame_reader
+        self._last_frame = (None, None)
 
     @ready_method
     def setup_stream_server(self):
@@ -81,37 +266,158 @@ class MJpegcap(object):
 
     @on_method_ready('setup_stream_server')
     def get_frame_from_stream(self):
-        if self._is_running is False:
-            self.init_sock()
+        if self.BACKGROUND_READER or (self.stream_reader is not None and self.stream_reader.is_alive):
+            reader = self.get_stream_reader()
+            # 重连期间不等待, 和直接读取时一样立即返回黑屏图像
+            frame = reader.get(timeout=0 if reader.is_broken else None)
+            if frame is None:
+                # 画面流断开, 后台线程正在重连, 临时返回黑屏图像
+                return self.get_blank_screen()
+            return frame.data
         try:
-            while True:
-                line = self.buf.read_until(b'\r\n')
-                if line.startswith(b"Content-Length"):
-                    length = int(line.decode('utf-8').split(": ")[1])
-                    break
-            while True:
-                if self.buf.read_until(b'\r\n') == b'':
-                    break
-            imdata = self.buf.read_bytes(length)
-            return imdata
+            return self._read_frame()
         except IOError:
             # 如果暂停获取mjpegsock的数据一段时间，可能会导致它断开，这里将self.buf关闭并临时返回黑屏图像
             # 等待下一次需要获取屏幕时，再进行重连
             LOGGING.debug("mjpegsock is closed")
-            self._is_running = False
-            self.buf.close()
             return self.get_blank_screen()
 
+    def _read_frame(self):
+        """
+        Read the next JPEG from the multipart stream, reconnect first if the stream is closed
+
+        Raises:
+            IOError: if the stream is broken, self.buf is closed and reconnected on the next read
+
+        Returns:
+            jpg data
+
+        """
+        with self._read_lock:
+            if self._is_running is False:
+                self.init_sock()
+            try:
+                while True:
+                    line = self.buf.read_until(b'\r\n')
+                    if line.startswith(b"Content-Length"):
+                        length = int(line.decode('utf-8').split(": ")[1])
+                        break
+                while True:
+                    if self.buf.read_until(b'\r\n') == b'':
+                        break
+                return self.buf.read_bytes(length)
+            except IOError:
+                self._is_running = False
+                self.buf.close()
+                raise
+
+    @on_method_ready('setup_stream_server')
+    def get_stream_reader(self):
+        """
+        Start the background thread draining the MJPEG stream if not started, see BACKGROUND_READER
+
+        The first connection is made in the calling thread, so that its errors (e.g. ConnectionRefusedError)
+        are raised to the caller. The thread exits after MJpegReader.MAX_RECONNECTS failed reconnections,
+        the next call connects again in the calling thread.
+
+        Returns: MJpegReader
+
+        """
+        if self.stream_reader is None or not self.stream_reader.is_alive:
+            if self._is_running is False:
+                self.init_sock()
+            self.stream_reader = MJpegReader(self._read_frame, name="mjpegcap_stream")
+            self.stream_reader.start()
+        return self.stream_reader
+
+    def _get_new_frame(self):
+        """The JPEG newer than the one got last time, None if no new frame, used by the background decoding"""
+        reader = self.stream_reader
+        if reader is None or not reader.is_alive:
+            # 重连失败后后台线程已退出, 不在这里重连, 直到再次调用get_frame_bus()
+            time.sleep(MJpegReader.RECONNECT_INTERVAL)
+            return None
+        last_reader, last_seq = self._last_frame
+        frame = reader.get(newer_than=last_seq if last_reader is reader else None)
+        if frame is None:
+            return None
+        self._last_frame = (reader, frame.seq)
+        return frame.data
+
+    def iter_frames(self, ensure_orientation=True):
+        """
+        Generator of the screenshots of the MJPEG stream, each one newer than the previous one
+
+        The frames are decoded once in background and shared through the FrameBus with the screen recording
+        and snapshot(), so that each screenshot is the latest frame even if the caller is slower than the stream,
+        e.g. image matching in ``loop_find``.
+
+        Yields: numpy.ndarray, None if no new frame in LatestFrameReader.TIMEOUT or the stream is broken
+
+        """
+        sub = self.get_frame_bus().subscribe()
+        try:
+            while True:
+                frame = sub.get()
+                if frame is None:
+                    # 画面流断开时在调用线程中重连, 重连失败抛出异常
+                    self.get_stream_reader()
+                    if not sub.bus.is_alive:
+                        sub.close()
+                        sub = self.get_frame_bus().subscribe()
+                    yield None
+                    continue
+                yield self._rotate_screen(frame.img, ensure_orientation)
+        finally:
+            sub.close()
+
+    def restart_stream(self):
+        """
+        Reconnect to the MJPEG stream on the next read, drop the stale frames piled up in the connection
+
+        Nothing to do while the background reader is draining the stream, no frame piles up.
+        """
+        if self.stream_reader is not None and self.stream_reader.is_alive:
+            return
+        # 等待正在读取的一帧(如录屏线程)读完, 不在读取过程中关闭连接
+        with self._read_lock:
+            if self.stream_reader is not None and self.stream_reader.is_alive:
+                return
+            if self._is_running:
+                self._is_running = False
+                self.buf.close()
+
     def get_frame(self):
         # 获得单张屏幕截图
         return self.get_frame_from_stream()
 
+    @on_method_ready('setup_stream_server')
+    def get_frame_bus(self):
+        """
+        Decode the MJPEG stream in background threads and share the frames with several consumers
+
+        一次解码, 多个订阅者(录屏, 图像识别, 截图)共享同一画面流
+
+        Returns: FrameBus
+
+        """
+        # 在调用线程中连接画面流, 连接失败时直接抛出异常
+        self.get_stream_reader()
+        if self.frame_reader is None:
+            # 后台线程读取画面流, 只解码比上次更新的帧, 不重复解码同一帧
+            self.frame_reader = LatestFrameReader(self._get_new_frame, name="mjpegcap_reader")
+        if self.frame_bus is None:
+            self.frame_bus = FrameBus(self.frame_reader, name="mjpegcap_bus")
+        self.frame_bus.start()
+        return self.frame_bus
+
     def snapshot(self, ensure_orientation=True, *args, **kwargs):
         """
         Take a screenshot and convert it into a cv2 image object
 
         获取一张屏幕截图，并转化成cv2的图像对象
-        !!! 注意，该方法拿到的截图可能不是队列中最新的，除非一直在消费队列中的图像，否则可能会是过往图像内容，请谨慎使用
+        BACKGROUND_READER为True(默认)或者调用过get_frame_bus()时, 后台线程一直在消费画面流, 拿到的是最新的一帧;
+        !!! 否则，该方法拿到的截图可能不是队列中最新的，除非一直在消费队列中的图像，否则可能会是过往图像内容，请谨慎使用
 
         Args:
             ensure_orientation: True or False whether to keep the orientation same as display
@@ -119,14 +425,26 @@ class MJpegcap(object):
         Returns: numpy.ndarray
 
         """
-        screen = self.get_frame_from_stream()
+        if self.frame_bus is not None and self.frame_bus.is_alive:
+            # 后台线程一直在解码画面流, 通过frame bus取最新的一帧, 与录屏, 图像识别共享
+            frame = self.frame_bus.get()
+            if frame is None:
+                return None
+            # frame.img是只读的共享图像, 返回副本, 调用者可以在截图上绘制
+            screen = self._rotate_screen(frame.img, ensure_orientation)
+            return screen.copy() if screen is frame.img else screen
+        return self._decode_screen(self.get_frame_from_stream(), ensure_orientation)
+
+    def _decode_screen(self, data, ensure_orientation=True):
         try:
-            screen = aircv.utils.string_2_img(screen)
+            screen = aircv.utils.string_2_img(data)
         except Exception:
             # may be black/locked screen or other reason, print exc for debugging
             traceback.print_exc()
             return None
+        return self._rotate_screen(screen, ensure_orientation)
 
+    def _rotate_screen(self, screen, ensure_orientation=True):
         if ensure_orientation:
             if self.ori_function:
                 display_info = self.ori_function()
@@ -153,8 +471,20 @@ class MJpegcap(object):
         return img_string
 
     def teardown_stream(self):
+        if self.frame_bus:
+            self.frame_bus.stop()
+            self.frame_bus = None
+        if self.frame_reader:
+            self.frame_reader.stop()
+            self.frame_reader = None
+        stream_reader, self.stream_reader = self.stream_reader, None
+        if stream_reader:
+            stream_reader.stop(wait=False)
         if self.buf:
+            # 关闭连接后, 阻塞在recv中的后台线程才能退出
             self.buf.close()
+        if stream_reader:
+            stream_reader.stop()
         if self.port_forwarding:
             self.instruct_helper.remove_proxy(self.port)
         self.port = None
@@ -15,7 +15,38 @@ class Settings(object):
     CVSTRATEGY = ["mstpl", "tpl", "sift", "brisk"]
     if Version('3.4.2') < Version(cv2.__version__) < Version('4.4.0'):
         CVSTRATEGY = ["mstpl", "tpl", "brisk"]
+    # run the methods in CVSTRATEGY at the same time on a thread pool
+    CVSTRATEGY_PARALLEL = False
+    # "priority": return the confident result of the method which comes first in CVSTRATEGY
+    # "first": return the first confident result and cancel the remaining methods
+    CVSTRATEGY_PARALLEL_MODE = "priority"
+    # the thread pool is rebuilt on the next match when it is changed
+    CVSTRATEGY_WORKERS = 4
+    # search in the area predicted by record_pos first, then in the full screen on a miss
+    PREDICT_AREA_SEARCH = True
+    # "mstpl" searches in the predicted area only, True to search in the full screen again on a miss,
+    # which costs another multi-scale search
+    PREDICT_AREA_MSTPL_FALLBACK = False
     KEYPOINT_MATCHING_PREDICTION = True
+    # the number of threads used by find_many() to match templates against one screen
+    FIND_MANY_WORKERS = 1
+    # loop_find() does not match again when the screen is unchanged since the last miss.
+    # Off by default: the screen fingerprint may miss small changes, e.g. a small button or badge appearing
+    FIND_SKIP_UNCHANGED = False
+    # with FIND_SKIP_UNCHANGED, match again anyway after FIND_SKIP_MAX skips in a row,
+    # or FIND_SKIP_MAX_TIME seconds after the last match
+    FIND_SKIP_MAX = 3
+    FIND_SKIP_MAX_TIME = 2.0
+    # loop_find() only matches around the changed area of the screen after a miss ("tpl" and keypoint methods)
+    FIND_CHANGED_AREA_ONLY = False
+    # loop_find() reads the frames of the device screen stream (minicap/javacap/MJPEG) as they arrive,
+    # instead of taking snapshots every `interval` seconds
+    FIND_FROM_STREAM = False
+    # the first backoff in seconds while the stream frames are unchanged, doubled up to `interval`
+    FIND_STREAM_BACKOFF = 0.02
+    # loop_find() and find_many() take the screenshots at 1/N of the display size (1, 2, 4 or 8),
+    # the matched positions are mapped back to the display coordinates. Small targets may be missed at 4 or 8
+    FIND_SCREEN_REDUCE = 1
     THRESHOLD = 0.7  # [0, 1]
     THRESHOLD_STRICT = None  # dedicated parameter for assert_exists
     OPDELAY = 0.1
@@ -26,3 +57,5 @@ class Settings(object):
     # Image compression size, e.g. 1200, means that the size of the screenshot does not exceed 1200*1200
     IMAGE_MAXSIZE = os.environ.get("IMAGE_MAXSIZE", None)
     SAVE_IMAGE = True
+    # Max bytes of decoded template images cached in memory, 0 to disable the cache
+    TEMPLATE_CACHE_SIZE = 64 * 1024 * 1024
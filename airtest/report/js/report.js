@@ -408,6 +408,9 @@ function StepPannel(data, root){
     if (step.screen && step.screen.confidence) {
       argHtml += '<p class="desc"><span class="point glyphicon glyphicon-play"></span><span lang="en">Confidence: </span>%s</p>'.format(step.screen.confidence)
     }
+    if (step.screen && step.screen.method) {
+      argHtml += '<p class="desc"><span class="point glyphicon glyphicon-play"></span><span lang="en">Method: </span>%s %s</p>'.format(step.screen.method, JSON.stringify(step.screen.method_times))
+    }
 
     argHtml = argHtml || '<p class="desc">None</p>'
     argHtml = "<div class='fluid infos'>" + argHtml + "</div>"
@@ -194,6 +194,10 @@ class LogToHtml(object):
                 rect = self.div_rect(cv_result['rectangle'])
                 screen['rect'].append(rect)
                 screen['confidence'] = cv_result['confidence']
+                # matching method which won in ST.CVSTRATEGY_PARALLEL mode, and the time cost of each method
+                if cv_result.get('method'):
+                    screen['method'] = cv_result['method']
+                    screen['method_times'] = cv_result.get('method_times')
                 break
 
         if step["data"]["name"] in ["touch", "assert_exists", "wait", "exists"]:
@@ -5,11 +5,17 @@ import errno
 
 class SafeSocket(object):
     """safe and exact recv & send"""
-    def __init__(self, sock=None):
+
+    # 单次recv_into的最大字节数, 接收大块数据(如屏幕帧)时减少系统调用次数
+    RECV_SIZE = 256 * 1024
+
+    def __init__(self, sock=None, recv_size=None):
         if sock is None:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         else:
             self.sock = sock
+        self.recv_size = recv_size or self.RECV_SIZE
+        # data received but not consumed yet, e.g. a part of a message before a timeout
         self.buf = b""
 
     def __enter__(self):
@@ -39,13 +45,48 @@ class SafeSocket(object):
             totalsent += sent
 
     def recv(self, size):
-        while len(self.buf) < size:
-            trunk = self.sock.recv(min(size-len(self.buf), 4096))
-            if trunk == b"":
-                raise socket.error("socket connection broken")
-            self.buf += trunk
-        ret, self.buf = self.buf[:size], self.buf[size:]
-        return ret
+        if len(self.buf) >= size:
+            ret, self.buf = self.buf[:size], self.buf[size:]
+            return ret
+        buf = bytearray(size)
+        self.recv_exact_into(buf)
+        return bytes(buf)
+
+    def recv_exact_into(self, buf, size=None):
+        """
+        Receive exactly `size` bytes into the preallocated buffer, without intermediate copies
+
+        Args:
+            buf: bytearray or writable memoryview
+            size: number of bytes to receive, default is len(buf)
+
+        Raises:
+            socket.error: if the connection is closed
+            socket.timeout: if the socket timed out, the bytes received are kept for the next recv,
+                same for the other errors of a non-blocking socket
+
+        Returns:
+            memoryview of the first `size` bytes of buf
+
+        """
+        view = memoryview(buf)
+        if size is None:
+            size = len(view)
+        view = view[:size]
+        pos = min(len(self.buf), size)
+        if pos:
+            view[:pos] = self.buf[:pos]
+            self.buf = self.buf[pos:]
+        try:
+            while pos < size:
+                n = self.sock.recv_into(view[pos:], min(size - pos, self.recv_size))
+                if n == 0:
+                    raise socket.error("socket connection broken")
+                pos += n
+        except socket.error:
+            self.buf = bytes(view[:pos]) + self.buf
+            raise
+        return view
 
     def recv_with_timeout(self, size, timeout=2):
         self.sock.settimeout(timeout)
@@ -57,6 +98,17 @@ class SafeSocket(object):
             self.sock.settimeout(None)
         return ret
 
+    def recv_exact_into_with_timeout(self, buf, size=None, timeout=2):
+        """Same as recv_exact_into, returns None if timed out"""
+        self.sock.settimeout(timeout)
+        try:
+            ret = self.recv_exact_into(buf, size)
+        except socket.timeout:
+            ret = None
+        finally:
+            self.sock.settimeout(None)
+        return ret
+
     def recv_nonblocking(self, size):
         self.sock.settimeout(0)
         try:
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""This module measures the wall time of adb operations fanned out to many simulated devices.
+
+The devices are simulated by the fake adb server of the tests, every shell command takes SHELL_DELAY seconds
+on the "device", no adb binary and no real device is needed:
+
+    python adb_fanout_benchmark.py
+"""
+
+import os
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+from fake_adb_server import FakeAdbServer
+from airtest.core.android.adb import ADB
+from airtest.core.android.constant import ADB_TRANSPORT
+from airtest.core.android.fanout import AdbFanout
+
+# 模拟设备上每条shell命令的耗时(秒)
+SHELL_DELAY = 0.05
+# 每台设备上执行的shell命令数
+COMMANDS_PER_DEVICE = 4
+DEVICE_COUNTS = [1, 8, 32, 64]
+
+
+def operation(adb):
+    """模拟一次批量操作: 连续执行几条shell命令."""
+    return [adb.shell("getprop ro.build.version.sdk") for _ in range(COMMANDS_PER_DEVICE)]
+
+
+def run_sequential(server, serials):
+    """逐台设备执行."""
+    for serialno in serials:
+        operation(ADB(serialno, server_addr=server.addr, transport=ADB_TRANSPORT.SOCKET))
+
+
+def run_fanout(server, serials, max_workers):
+    """并发执行."""
+    results = AdbFanout(max_workers=max_workers, server_addr=server.addr,
+                        transport=ADB_TRANSPORT.SOCKET).run(operation, serials)
+    assert all(res.ok for res in results.values()), results
+
+
+def measure(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def main():
+    logging.getLogger("airtest").setLevel(logging.WARNING)
+    print("%8s %12s %12s %12s" % ("devices", "sequential", "fanout(16)", "fanout(64)"))
+    for count in DEVICE_COUNTS:
+        serials = ["emulator-%d" % (5554 + i * 2) for i in range(count)]
+        server = FakeAdbServer(devices={serialno: "device" for serialno in serials})
+        server.shell_outputs["getprop ro.build.version.sdk"] = "30\n"
+        server.shell_delay = SHELL_DELAY
+        try:
+            AdbFanout.set_max_concurrent(16)
+            sequential = measure(run_sequential, server, serials)
+            fanout_16 = measure(run_fanout, server, serials, 16)
+            # the global limit caps the concurrent adb operations, whatever the number of workers
+            AdbFanout.set_max_concurrent(64)
+            fanout_64 = measure(run_fanout, server, serials, 64)
+        finally:
+            server.stop()
+        print("%8d %11.2fs %11.2fs %11.2fs" % (count, sequential, fanout_16, fanout_64))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""Compare keypoint matching with and without the reused detectors and the cached template descriptors.
+
+Each template is matched REPEAT times against the screen, as loop_find does while waiting for it.
+
+Run in this directory: python keypoint_benchmark.py
+"""
+
+import os
+import time
+
+from airtest.aircv import imread
+from airtest.aircv.error import BaseError
+from airtest.aircv.keypoint_base import KeypointMatching
+from airtest.aircv.keypoint_matching import KAZEMatching, BRISKMatching, AKAZEMatching, ORBMatching
+from airtest.aircv.keypoint_matching_contrib import SIFTMatching
+
+
+SAMPLES = [
+    # (name, search_file, screen_file)
+    ("high_dpi", os.path.join("sample", "high_dpi", "tpl1551940579340.png"),
+     os.path.join("sample", "high_dpi", "tpl1551944272194.png")),
+    ("rich_texture", os.path.join("sample", "rich_texture", "search.png"),
+     os.path.join("sample", "rich_texture", "screen.png")),
+    ("text", os.path.join("sample", "text", "search.png"), os.path.join("sample", "text", "screen.png")),
+    ("keypoint", os.path.join("..", "tests", "matching_images", "keypoint_search.png"),
+     os.path.join("..", "tests", "matching_images", "keypoint_screen.png")),
+]
+METHODS = [
+    ("kaze", KAZEMatching),
+    ("brisk", BRISKMatching),
+    ("akaze", AKAZEMatching),
+    ("orb", ORBMatching),
+    ("sift", SIFTMatching),
+]
+REPEAT = 5
+
+
+def run_match(method, im_search, im_source, cached, flann=False):
+    """Run find_best_result REPEAT times, return the last result and the average wall time."""
+    KeypointMatching.clear_cache()
+    method.USE_FLANN = flann
+    cost = 0
+    result = None
+    for _ in range(REPEAT):
+        if not cached:
+            # the detectors were created and the template descriptors computed on every match before
+            KeypointMatching.clear_cache()
+        start = time.time()
+        try:
+            result = method(im_search, im_source, threshold=0.7, rgb=False).find_best_result()
+        except BaseError:
+            result = None
+        cost += time.time() - start
+    method.USE_FLANN = False
+    return result, cost / REPEAT
+
+
+def same_result(ret1, ret2):
+    if ret1 is None or ret2 is None:
+        return ret1 is None and ret2 is None
+    # 中心点偏差在3个像素以内视为结果一致
+    return all(abs(a - b) <= 3 for a, b in zip(ret1["result"], ret2["result"]))
+
+
+def benchmark():
+    KeypointMatching.FLANN_MIN_DESCRIPTORS = 0
+    print("%-12s %-6s %-10s %-10s %-8s %-10s %-8s %s" % (
+        "sample", "method", "uncached", "cached", "speedup", "flann", "speedup", "parity(cached/flann)"))
+    for name, search_file, screen_file in SAMPLES:
+        if not (os.path.isfile(search_file) and os.path.isfile(screen_file)):
+            print("%-12s skipped, sample images not found" % name)
+            continue
+        im_search, im_source = imread(search_file), imread(screen_file)
+        for method_name, method in METHODS:
+            ret_old, t_old = run_match(method, im_search, im_source, cached=False)
+            ret_new, t_new = run_match(method, im_search, im_source, cached=True)
+            ret_flann, t_flann = run_match(method, im_search, im_source, cached=True, flann=True)
+            print("%-12s %-6s %-10.3f %-10.3f %-8.1f %-10.3f %-8.1f %s/%s" % (
+                name, method_name, t_old, t_new, t_old / t_new if t_new else 0,
+                t_flann, t_old / t_flann if t_flann else 0,
+                same_result(ret_old, ret_new), same_result(ret_old, ret_flann)))
+
+
+if __name__ == '__main__':
+    benchmark()
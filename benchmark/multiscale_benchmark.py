@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""Compare the coarse-to-fine and the exhaustive scale search of MultiScaleTemplateMatching.
+
+Run in this directory: python multiscale_benchmark.py
+"""
+
+import os
+import time
+import cv2
+
+from airtest.aircv import imread
+from airtest.aircv.multiscale_template_matching import MultiScaleTemplateMatching
+
+
+SAMPLES = [
+    # (name, search_file, screen_file)
+    ("high_dpi", os.path.join("sample", "high_dpi", "tpl1551940579340.png"),
+     os.path.join("sample", "high_dpi", "tpl1551944272194.png")),
+    ("rich_texture", os.path.join("sample", "rich_texture", "search.png"),
+     os.path.join("sample", "rich_texture", "screen.png")),
+    ("text", os.path.join("sample", "text", "search.png"), os.path.join("sample", "text", "screen.png")),
+    ("template", os.path.join("..", "tests", "matching_images", "template_search.png"),
+     os.path.join("..", "tests", "matching_images", "template_screen.png")),
+    ("keypoint", os.path.join("..", "tests", "matching_images", "keypoint_search.png"),
+     os.path.join("..", "tests", "matching_images", "keypoint_screen.png")),
+]
+# 将屏幕缩放, 模拟跨分辨率的识别
+SCREEN_SCALES = [1.0, 0.75, 1.25]
+REPEAT = 3
+
+
+def run_search(im_search, im_source, coarse_to_fine):
+    """Run find_best_result REPEAT times, return the result and the average wall time."""
+    cost = 0
+    result = None
+    for _ in range(REPEAT):
+        matcher = MultiScaleTemplateMatching(im_search, im_source, threshold=0.7, rgb=False)
+        matcher.COARSE_TO_FINE = coarse_to_fine
+        start = time.time()
+        result = matcher.find_best_result()
+        cost += time.time() - start
+    return result, cost / REPEAT
+
+
+def benchmark():
+    print("%-14s %-6s %-12s %-12s %-8s %s" % ("sample", "scale", "exhaustive", "coarse2fine", "speedup", "parity"))
+    for name, search_file, screen_file in SAMPLES:
+        if not (os.path.isfile(search_file) and os.path.isfile(screen_file)):
+            print("%-14s skipped, sample images not found" % name)
+            continue
+        im_search, screen = imread(search_file), imread(screen_file)
+        for scale in SCREEN_SCALES:
+            im_source = cv2.resize(screen, (int(screen.shape[1] * scale), int(screen.shape[0] * scale)))
+            if im_search.shape[0] > im_source.shape[0] or im_search.shape[1] > im_source.shape[1]:
+                continue
+            ret_full, t_full = run_search(im_search, im_source, False)
+            ret_fast, t_fast = run_search(im_search, im_source, True)
+            if ret_full is None or ret_fast is None:
+                parity = ret_full is None and ret_fast is None
+            else:
+                # 中心点偏差在3个像素以内视为结果一致
+                parity = all(abs(a - b) <= 3 for a, b in zip(ret_full["result"], ret_fast["result"]))
+            print("%-14s %-6s %-12.3f %-12.3f %-8.1f %s" % (
+                name, scale, t_full, t_fast, t_full / t_fast if t_fast else 0, parity))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""This module measures the receive throughput of SafeSocket with minicap-like frames.
+
+Every frame is a 4 bytes length header followed by FRAME_SIZE bytes, sent through a local socket pair:
+
+    python safesocket_benchmark.py
+"""
+
+import socket
+import struct
+import threading
+import time
+
+from airtest.utils.safesocket import SafeSocket
+
+# 模拟的1080p JPEG帧大小
+FRAME_SIZE = 1536 * 1024
+FRAME_COUNT = 200
+
+
+class LegacySafeSocket(SafeSocket):
+    """旧的接收方式: 每次最多4096字节, 拼接bytes后切片."""
+
+    def recv(self, size):
+        while len(self.buf) < size:
+            trunk = self.sock.recv(min(size - len(self.buf), 4096))
+            if trunk == b"":
+                raise socket.error("socket connection broken")
+            self.buf += trunk
+        ret, self.buf = self.buf[:size], self.buf[size:]
+        return ret
+
+
+def send_frames(sock):
+    frame = struct.pack("<I", FRAME_SIZE) + b"\xff" * FRAME_SIZE
+    for _ in range(FRAME_COUNT):
+        sock.sendall(frame)
+
+
+def recv_legacy(s):
+    for _ in range(FRAME_COUNT):
+        size = struct.unpack("<I", s.recv(4))[0]
+        s.recv(size)
+
+
+def recv_into(s):
+    for _ in range(FRAME_COUNT):
+        size = struct.unpack("<I", s.recv(4))[0]
+        s.recv_exact_into(bytearray(size))
+
+
+def measure(sock_class, recv_func):
+    """返回接收速度(MB/s)."""
+    a, b = socket.socketpair()
+    t = threading.Thread(target=send_frames, args=(a,))
+    start = time.time()
+    t.start()
+    recv_func(sock_class(b))
+    elapsed = time.time() - start
+    t.join()
+    a.close()
+    b.close()
+    return FRAME_SIZE * FRAME_COUNT / 1024.0 / 1024.0 / elapsed
+
+
+def main():
+    print("%d frames of %d KB" % (FRAME_COUNT, FRAME_SIZE // 1024))
+    print("%-36s %10.1f MB/s" % ("recv, 4KB chunks + bytes concat", measure(LegacySafeSocket, recv_legacy)))
+    print("%-36s %10.1f MB/s" % ("recv", measure(SafeSocket, recv_legacy)))
+    print("%-36s %10.1f MB/s" % ("recv_exact_into", measure(SafeSocket, recv_into)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+# encoding=utf-8
+"""
+A local fake adb server speaking the smart-socket protocol, to test ADB without adb and devices.
+
+    >>> server = FakeAdbServer(devices={"serial1": "device"})
+    >>> server.shell_outputs["getprop ro.build.version.sdk"] = "30\\n"
+    >>> adb = ADB("serial1", server_addr=server.addr, transport="SOCKET")
+    >>> server.stop()
+"""
+import re
+import stat
+import select
+import socket
+import struct
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+HOST_SERIAL_RE = re.compile(r"host-serial:(.+?):(get-state|features|forward:.*|killforward:.*|killforward-all|"
+                            r"list-forward)$")
+
+STDIN_SIZE_RE = re.compile(r"package install(?:-write)? .*-S (\d+)")
+# `rm -r "<path>"` and `mkdir -p "<path>"`, run on the files of the sync protocol
+FILE_CMD_RE = re.compile(r'^(rm -r|mkdir -p) "(.+)"$')
+
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.buf = b""
+
+    def recv(self, size):
+        while len(self.buf) < size:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                raise EOFError
+            self.buf += chunk
+        ret, self.buf = self.buf[:size], self.buf[size:]
+        return ret
+
+    def read_request(self):
+        length = int(self.recv(4), 16)
+        return self.recv(length).decode("utf-8")
+
+    def okay(self, data=None):
+        self.request.sendall(b"OKAY")
+        if data is not None:
+            self.send_string(data)
+
+    def fail(self, message):
+        self.request.sendall(b"FAIL")
+        self.send_string(message)
+
+    def send_string(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        self.request.sendall(("%04x" % len(data)).encode("ascii") + data)
+
+    def handle(self):
+        server = self.server.fake
+        try:
+            while True:
+                req = self.read_request()
+                server.requests.append(req)
+                if not self.handle_request(server, req):
+                    break
+        except (EOFError, socket.error):
+            pass
+
+    def handle_request(self, server, req):
+        """Returns True if the connection goes on with another request"""
+        if req == "host:devices":
+            self.okay("".join("%s\t%s\n" % item for item in server.devices.items()))
+            return False
+        if req.startswith("host:transport"):
+            serialno = req.split(":", 2)[2] if req.startswith("host:transport:") else server.default_serial()
+            if serialno not in server.devices:
+                self.fail("device '%s' not found" % serialno)
+                return False
+            self.okay()
+            self.serialno = serialno
+            return True
+        if req == "host:track-devices":
+            self.okay()
+            self.handle_track_devices(server)
+            return False
+        if req == "sync:":
+            self.okay()
+            self.handle_sync(server)
+            return False
+        if req.startswith("shell") or req.startswith("exec:"):
+            self.handle_shell(server, req)
+            return False
+        m = HOST_SERIAL_RE.match(req)
+        if m:
+            serialno, service = m.groups()
+        elif req.startswith("host:"):
+            serialno, service = server.default_serial(), req[5:]
+        else:
+            self.fail("unknown request %s" % req)
+            return False
+        if serialno not in server.devices:
+            self.fail("device '%s' not found" % serialno)
+        elif service == "get-state":
+            self.okay(server.devices[serialno])
+        elif service == "features":
+            self.okay(",".join(server.features))
+        elif service == "list-forward":
+            self.okay("".join("%s %s %s\n" % (s, l, r) for (s, l), r in server.forwards.items()))
+        elif service.startswith("forward:"):
+            spec = service[len("forward:"):]
+            no_rebind = spec.startswith("norebind:")
+            if no_rebind:
+                spec = spec[len("norebind:"):]
+            local, remote = spec.split(";")
+            if no_rebind and (serialno, local) in server.forwards:
+                self.fail("cannot rebind existing socket")
+            else:
+                server.forwards[(serialno, local)] = remote
+                self.request.sendall(b"OKAYOKAY")
+        elif service.startswith("killforward:"):
+            local = service[len("killforward:"):]
+            if server.forwards.pop((serialno, local), None) is None:
+                self.fail("listener '%s' not found" % local)
+            else:
+                self.request.sendall(b"OKAYOKAY")
+        elif service == "killforward-all":
+            for key in [k for k in server.forwards if k[0] == serialno]:
+                server.forwards.pop(key)
+            self.request.sendall(b"OKAYOKAY")
+        else:
+            self.fail("unknown host service %s" % service)
+        return False
+
+    def handle_track_devices(self, server):
+        sent = None
+        while not server.stopped:
+            devices = dict(server.devices)
+            if devices != sent:
+                self.send_string("".join("%s\t%s\n" % item for item in devices.items()))
+                sent = devices
+            # the client closed the connection
+            if select.select([self.request], [], [], 0.01)[0] and not self.request.recv(1):
+                return
+
+    def handle_sync(self, server):
+        while True:
+            sync_id = self.recv(4)
+            length = struct.unpack("<I", self.recv(4))[0]
+            if sync_id == b"QUIT":
+                return
+            path = self.recv(length).decode("utf-8")
+            if sync_id == b"STAT":
+                mode, size, mtime = server.stat_file(path)
+                self.request.sendall(b"STAT" + struct.pack("<3I", mode, size, mtime))
+            elif sync_id == b"LIST":
+                for name, (mode, size, mtime) in server.list_dir(path):
+                    name = name.encode("utf-8")
+                    self.request.sendall(b"DENT" + struct.pack("<4I", mode, size, mtime, len(name)) + name)
+                self.request.sendall(b"DONE" + struct.pack("<4I", 0, 0, 0, 0))
+            elif sync_id == b"SEND":
+                path, mode = path.rsplit(",", 1)
+                chunks = []
+                while True:
+                    sync_id = self.recv(4)
+                    length = struct.unpack("<I", self.recv(4))[0]
+                    if sync_id == b"DONE":
+                        break
+                    chunks.append(self.recv(length))
+                    server.sync_chunks.append(length)
+                server.files[path] = (int(mode) & 0o7777, b"".join(chunks), length)
+                self.request.sendall(b"OKAY" + struct.pack("<I", 0))
+            elif sync_id == b"RECV":
+                if path not in server.files:
+                    message = b"No such file or directory"
+                    self.request.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                    continue
+                data = server.files[path][1]
+                for i in range(0, len(data), 65536):
+                    self.request.sendall(b"DATA" + struct.pack("<I", len(data[i:i + 65536])) + data[i:i + 65536])
+                self.request.sendall(b"DONE" + struct.pack("<I", 0))
+
+    def handle_shell(self, server, req):
+        service, cmd = req.split(":", 1)
+        self.okay()
+        m = STDIN_SIZE_RE.search(cmd)
+        if service == "exec" and m:
+            # the command reads <size> bytes of stdin, e.g. `cmd package install -S <size>`
+            server.stdin_data[cmd] = self.recv(int(m.group(1)))
+        stdout, stderr, code = server.run_shell(cmd)
+        if service == "exec":
+            self.request.sendall(stdout)
+        elif service.startswith("shell,v2"):
+            for packet_id, data in ((1, stdout), (2, stderr)):
+                if data:
+                    self.request.sendall(struct.pack("<BI", packet_id, len(data)) + data)
+            self.request.sendall(struct.pack("<BIB", 3, 1, code))
+        else:
+            self.request.sendall(stdout + stderr)
+
+
+class FakeAdbServer(object):
+    """
+    Fake adb server listening on a random local port
+
+    Args:
+        devices: dict of serialno -> state
+        features: features of the devices, "shell_v2" enables the shell v2 protocol
+    """
+
+    def __init__(self, devices=None, features=("shell_v2", "cmd")):
+        self.devices = dict(devices or {"serial1": "device"})
+        self.features = list(features)
+        # shell command -> stdout, or (stdout, stderr, exit code)
+        self.shell_outputs = {}
+        # seconds to sleep before replying a shell command
+        self.shell_delay = 0
+        # (serialno, local) -> remote
+        self.forwards = {}
+        # files on the device for the sync protocol: path -> (permission bits, data, mtime)
+        self.files = {}
+        # directories created by `mkdir -p`
+        self.dirs = set()
+        # sizes of the DATA packets received
+        self.sync_chunks = []
+        # exec command -> data read from stdin
+        self.stdin_data = {}
+        self.requests = []
+        self.stopped = False
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeAdbHandler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.addr = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def default_serial(self):
+        return next(iter(self.devices), None)
+
+    def run_shell(self, cmd):
+        if self.shell_delay:
+            time.sleep(self.shell_delay)
+        out = self.shell_outputs.get(cmd)
+        if out is None and all(FILE_CMD_RE.match(part) for part in cmd.split("; ")):
+            for part in cmd.split("; "):
+                op, path = FILE_CMD_RE.match(part).groups()
+                if op == "rm -r":
+                    for name in list(self.files):
+                        if name == path or name.startswith(path.rstrip("/") + "/"):
+                            del self.files[name]
+                else:
+                    self.dirs.add(path.rstrip("/"))
+            return b"", b"", 0
+        if out is None:
+            return b"", ("/system/bin/sh: %s: not found\n" % cmd.split()[0]).encode("utf-8"), 127
+        if not isinstance(out, tuple):
+            out = (out, "", 0)
+        stdout, stderr, code = out
+        return _to_bytes(stdout), _to_bytes(stderr), code
+
+    def stat_file(self, path):
+        path = path.rstrip("/") or "/"
+        if path in self.files:
+            mode, data, mtime = self.files[path]
+            return stat.S_IFREG | mode, len(data), mtime
+        prefix = path.rstrip("/") + "/"
+        if path in self.dirs or any(name.startswith(prefix) for name in self.files):
+            return stat.S_IFDIR | 0o755, 4096, 0
+        return 0, 0, 0
+
+    def list_dir(self, path):
+        prefix = path.rstrip("/") + "/"
+        names = {name[len(prefix):].split("/")[0] for name in self.files if name.startswith(prefix)}
+        return [(name, self.stat_file(prefix + name)) for name in sorted(names | {".", ".."})]
+
+    def stop(self):
+        self.stopped = True
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _to_bytes(data):
+    return data if isinstance(data, bytes) else data.encode("utf-8")
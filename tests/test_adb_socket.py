@@ -0,0 +1,615 @@
+# encoding=utf-8
+from airtest.core.android.adb import ADB, AdbError, AdbShellError, DeviceConnectionError
+from airtest.core.android.adb_socket import AdbSocketClient, AdbConnectionPool
+from airtest.core.android.constant import ADB_TRANSPORT
+from airtest.core.android.device_tracker import DeviceTracker
+from airtest.core.android.device_cache import DeviceInfoCache
+from airtest.core.android.cap_methods.adbcap import AdbCap, raw_screencap_to_img
+from airtest.core.android.android import Android
+from airtest import aircv
+from fake_adb_server import FakeAdbServer
+import io
+import os
+import time
+import types
+import struct
+import numpy as np
+import shutil
+import tempfile
+import threading
+import unittest
+import subprocess
+from mock import patch
+from six import text_type
+
+
+class TestADBSocketTransport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeAdbServer(devices={"serial1": "device", "10.0.0.1:5555": "offline"})
+        cls.server.shell_outputs.update({
+            "getprop ro.build.version.sdk": "30\n",
+            "echo hello world": "hello world\n",
+            "ls /nonexistent": ("", "ls: /nonexistent: No such file or directory\n", 1),
+            "pm list packages": "".join("package:com.test%d\n" % i for i in range(10000)),
+        })
+        cls.adb = ADB("serial1", server_addr=cls.server.addr, transport=ADB_TRANSPORT.SOCKET)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_shell(self):
+        self.assertEqual(self.adb.shell("echo hello world"), "hello world\n")
+        self.assertEqual(self.adb.raw_shell(["echo", "hello", "world"], ensure_unicode=False), b"hello world\n")
+        self.assertIsInstance(self.adb.cmd("shell echo hello world"), text_type)
+        self.assertEqual(self.adb.sdk_version, 30)
+
+    def test_shell_exit_status(self):
+        with self.assertRaises(AdbShellError) as cm:
+            self.adb.shell("ls /nonexistent")
+        self.assertIn(b"No such file", cm.exception.stderr)
+        with self.assertRaises(AdbError):
+            self.adb.raw_shell("ls /nonexistent")
+
+    def test_shell_v1(self):
+        server = FakeAdbServer(devices={"serial1": "device"}, features=())
+        try:
+            server.shell_outputs["ls /nonexistent"] = ("", "No such file or directory\n", 1)
+            adb = ADB("serial1", server_addr=server.addr, transport=ADB_TRANSPORT.SOCKET)
+            # without shell v2 the exit status is lost, same as the adb client
+            self.assertEqual(adb.raw_shell("ls /nonexistent"), "No such file or directory\n")
+            self.assertIn("shell:ls /nonexistent", server.requests)
+        finally:
+            server.stop()
+
+    def test_shell_v1_returncode(self):
+        server = FakeAdbServer(devices={"serial1": "device"}, features=())
+        try:
+            server.shell_outputs.update({
+                "echo hello ; echo ---$?---": "hello\r\n---0---\r\n",
+                "ls /nonexistent ; echo ---$?---": "No such file or directory\r\n---1---\r\n",
+            })
+            adb = ADB("serial1", server_addr=server.addr, transport=ADB_TRANSPORT.SOCKET)
+            adb._sdk_version = 23
+            self.assertEqual(adb.shell("echo hello"), "hello\r\n")
+            with self.assertRaises(AdbShellError):
+                adb.shell("ls /nonexistent")
+            self.assertEqual(list(adb.iter_shell("echo hello")), ["hello\r\n"])
+            with self.assertRaises(AdbShellError):
+                list(adb.iter_shell("ls /nonexistent"))
+        finally:
+            server.stop()
+
+    def test_iter_shell(self):
+        lines = list(self.adb.iter_shell("pm list packages"))
+        self.assertEqual(len(lines), 10000)
+        self.assertEqual(lines[-1], "package:com.test9999\n")
+        self.assertEqual(next(self.adb.iter_shell("echo hello world", ensure_unicode=False)), b"hello world\n")
+        gen = self.adb.iter_shell("ls /nonexistent")
+        with self.assertRaises(AdbShellError):
+            next(gen)
+        adb = ADB("unknown", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+        adb._sdk_version = 30
+        with self.assertRaises(DeviceConnectionError):
+            list(adb.iter_shell("echo hello world"))
+
+    def test_iter_shell_subprocess(self):
+        adb = ADB("serial1", server_addr=self.server.addr)
+        adb._sdk_version = 30
+
+        def start_shell(cmds):
+            return subprocess.Popen(["sh", "-c", "printf 'line1\nline2'; echo error >&2; exit 3"],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        with patch.object(adb, "start_shell", side_effect=start_shell):
+            gen = adb.iter_shell("whatever")
+            self.assertEqual(next(gen), "line1\n")
+            self.assertEqual(next(gen), "line2")
+            with self.assertRaises(AdbShellError) as cm:
+                next(gen)
+            self.assertIn("error", cm.exception.stderr)
+
+    def test_devices(self):
+        self.assertEqual(sorted(self.adb.devices()), [("10.0.0.1:5555", "offline"), ("serial1", "device")])
+        self.assertEqual(self.adb.devices(state="device"), [("serial1", "device")])
+
+    def test_get_status(self):
+        self.assertEqual(self.adb.get_status(), "device")
+        adb = ADB("unknown", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+        self.assertIsNone(adb.get_status())
+
+    def test_device_not_found(self):
+        adb = ADB("unknown", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+        with self.assertRaises(DeviceConnectionError):
+            adb.cmd("shell echo hello world")
+
+    def test_forward(self):
+        self.adb.forward("tcp:11111", "localabstract:minicap")
+        self.assertIn(("serial1", "tcp:11111", "localabstract:minicap"), list(self.adb.get_forwards()))
+        with self.assertRaises(AdbError):
+            self.adb.forward("tcp:11111", "tcp:8000")
+        self.adb.forward("tcp:11111", "tcp:8000", no_rebind=False)
+        self.assertIn(("serial1", "tcp:11111", "tcp:8000"), list(self.adb.get_forwards()))
+        self.adb.remove_forward("tcp:11111")
+        self.assertNotIn("tcp:11111", [local for _, local, _ in self.adb.get_forwards()])
+        self.adb.forward("tcp:11112", "tcp:8000")
+        self.adb.forward("tcp:11113", "tcp:8001")
+        self.adb.remove_forward()
+        self.assertEqual(list(self.adb.get_forwards()), [])
+        # unregister for cleanup
+        self.adb.remove_forward("tcp:11112")
+        self.adb.remove_forward("tcp:11113")
+
+    def test_timeout(self):
+        self.server.shell_delay = 1
+        try:
+            with self.assertRaises(RuntimeError):
+                self.adb.cmd("shell echo hello world", timeout=0.2)
+        finally:
+            self.server.shell_delay = 0
+
+    def test_unsupported_command(self):
+        client = AdbSocketClient(*self.server.addr)
+        self.assertIsNone(client.run(["install", "test.apk"], "serial1"))
+        self.assertIsNone(client.run(["shell"], "serial1"))
+        self.assertIsNone(client.run(["forward", "--unknown"], "serial1"))
+
+
+class TestAdbConnectionPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeAdbServer(devices={"serial1": "device"})
+        cls.server.shell_outputs["echo hello"] = "hello\n"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def wait_idle(self, client, count=1):
+        for _ in range(50):
+            if client.pool_metrics("serial1")["idle"] >= count:
+                return
+            time.sleep(0.01)
+
+    def test_reuse_transport(self):
+        client = AdbSocketClient(*self.server.addr, pool=AdbConnectionPool())
+        for _ in range(5):
+            self.assertEqual(client.shell("echo hello", "serial1"), (b"hello\n", b"", 0))
+            self.wait_idle(client)
+        metrics = client.pool_metrics("serial1")
+        self.assertEqual(metrics["borrows"], 5)
+        self.assertEqual(metrics["misses"], 1)
+        self.assertEqual(metrics["hits"], 4)
+        self.assertEqual(metrics["in_use"], 0)
+        self.assertGreaterEqual(metrics["idle"], 1)
+        client.pool.clear()
+        self.assertEqual(client.pool_metrics("serial1")["idle"], 0)
+
+    def test_idle_timeout(self):
+        pool = AdbConnectionPool()
+        client = AdbSocketClient(*self.server.addr, pool=pool)
+        client.shell("echo hello", "serial1")
+        self.wait_idle(client)
+        pool.IDLE_TIMEOUT = 0
+        pool.prune()
+        metrics = client.pool_metrics("serial1")
+        self.assertEqual(metrics["idle"], 0)
+        self.assertGreaterEqual(metrics["evictions"], 1)
+        # the idle connection has expired, a new one is opened
+        self.assertEqual(client.shell("echo hello", "serial1"), (b"hello\n", b"", 0))
+        self.assertEqual(client.pool_metrics("serial1")["misses"], 2)
+
+    def test_max_active(self):
+        pool = AdbConnectionPool()
+        pool.MAX_ACTIVE = 1
+        client = AdbSocketClient(*self.server.addr, pool=pool)
+        self.server.shell_delay = 0.2
+        try:
+            start = time.time()
+            threads = [threading.Thread(target=client.shell, args=("echo hello", "serial1")) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertGreaterEqual(time.time() - start, 0.55)
+        finally:
+            self.server.shell_delay = 0
+
+    def test_device_not_found(self):
+        client = AdbSocketClient(*self.server.addr, pool=AdbConnectionPool())
+        self.assertEqual(client.run(["shell", "echo", "hello"], "unknown")[2], 1)
+        self.assertEqual(client.pool_metrics("unknown")["in_use"], 0)
+
+
+class TestDeviceInfoCache(unittest.TestCase):
+
+    DEVICE_ID_CMD = "getprop ro.serialno;cat /proc/sys/kernel/random/boot_id"
+
+    def setUp(self):
+        self.server = FakeAdbServer(devices={"serial1": "device"})
+        self.server.shell_outputs.update({
+            self.DEVICE_ID_CMD: "0A1B2C3D\n6f1c2f60-2c4e-4a57-9d8e-0f7d4bb1e001\n",
+            "getprop ro.build.version.sdk": "33\n",
+            "getprop ro.sf.lcd_density": "440\n",
+            "getprop ro.product.model": "Pixel 4a\n",
+            "getprop ro.product.manufacturer": "Google\n",
+            "getprop ro.product.cpu.abi": "arm64-v8a\n",
+            "wm size": "Physical size: 1080x2340\n",
+            "dumpsys SurfaceFlinger": "orientation=0\n",
+            "getevent -p": "  ABS (0003): 0035  : value 0, min 0, max 1079, fuzz 0, flat 0, resolution 0\n"
+                           "              0036  : value 0, min 0, max 2339, fuzz 0, flat 0, resolution 0\n",
+        })
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmpdir, "device_cache.json")
+        self.old_cache = ADB.DEVICE_CACHE
+        ADB.DEVICE_CACHE = DeviceInfoCache(self.cache_path)
+
+    def tearDown(self):
+        ADB.DEVICE_CACHE = self.old_cache
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def new_adb(self):
+        return ADB("serial1", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+
+    def count(self, cmd):
+        return sum(1 for r in self.server.requests if r.endswith(":" + cmd))
+
+    def test_display_info(self):
+        info = self.new_adb().get_display_info()
+        self.assertEqual((info["width"], info["height"], info["max_x"], info["max_y"]), (1080, 2340, 1079, 2339))
+        self.assertEqual(info["density"], 440 / 160.0)
+        self.assertEqual(self.count("getevent -p"), 1)
+        # another ADB object of the same device
+        self.assertEqual(self.new_adb().get_display_info(), info)
+        self.assertEqual(self.count("getevent -p"), 1)
+        self.assertEqual(self.count("getprop ro.sf.lcd_density"), 1)
+        # restarted process
+        ADB.DEVICE_CACHE = DeviceInfoCache(self.cache_path)
+        self.assertEqual(self.new_adb().get_display_info(), info)
+        self.assertEqual(self.count("getevent -p"), 1)
+        # the wm size and orientation may change, they are not cached
+        self.assertEqual(self.count("wm size"), 3)
+
+    def test_rebooted(self):
+        self.assertEqual(self.new_adb().sdk_version, 33)
+        # e.g. upgraded and rebooted
+        self.server.shell_outputs[self.DEVICE_ID_CMD] = "0A1B2C3D\n6f1c2f60-2c4e-4a57-9d8e-0f7d4bb1e002\n"
+        self.server.shell_outputs["getprop ro.build.version.sdk"] = "34\n"
+        self.assertEqual(self.new_adb().sdk_version, 34)
+        self.assertEqual(self.count("getprop ro.build.version.sdk"), 2)
+
+    def test_serialno_reused(self):
+        self.assertEqual(self.new_adb().get_display_info()["max_x"], 1079)
+        # another emulator on the same emulator-5554/ip:port serialno, booted at the same time
+        self.server.shell_outputs[self.DEVICE_ID_CMD] = "EMULATOR2\n6f1c2f60-2c4e-4a57-9d8e-0f7d4bb1e001\n"
+        self.server.shell_outputs["getevent -p"] = self.server.shell_outputs["getevent -p"].replace("1079", "719")
+        self.assertEqual(self.new_adb().get_display_info()["max_x"], 719)
+        self.assertEqual(self.count("getevent -p"), 2)
+
+    def test_not_whitelisted(self):
+        self.server.shell_outputs["getprop ro.boottime.init"] = "1234\n"
+        adb = self.new_adb()
+        for _ in range(2):
+            self.assertEqual(adb.getprop("ro.boottime.init"), "1234")
+        self.assertEqual(self.count("getprop ro.boottime.init"), 2)
+
+    def test_no_device_id(self):
+        del self.server.shell_outputs[self.DEVICE_ID_CMD]
+        self.assertEqual(self.new_adb().sdk_version, 33)
+        self.assertEqual(self.new_adb().sdk_version, 33)
+        self.assertEqual(self.count("getprop ro.build.version.sdk"), 2)
+
+    def test_memory_only(self):
+        ADB.DEVICE_CACHE = DeviceInfoCache()
+        self.assertEqual(self.new_adb().sdk_version, 33)
+        self.assertEqual(self.new_adb().sdk_version, 33)
+        self.assertEqual(self.count("getprop ro.build.version.sdk"), 1)
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_device_info(self):
+        self.server.shell_delay = 0.1
+        start = time.time()
+        info = self.new_adb().get_device_info()
+        # 10+ shell commands in about 4 rounds with 4 threads
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(info["model"], "Pixel 4a")
+        self.assertEqual(info["manufacturer"], "Google")
+        self.assertEqual(info["cpuabi"], "arm64-v8a")
+        self.assertEqual(info["display"]["width"], 1080)
+        self.assertIsNone(info["gpu"])
+
+
+class TestRawScreencap(unittest.TestCase):
+
+    def setUp(self):
+        self.bgr = np.random.randint(0, 256, (40, 30, 3), dtype=np.uint8)
+        self.rgba = np.dstack([self.bgr[:, :, ::-1], np.full((40, 30), 255, np.uint8)])
+        self.server = FakeAdbServer(devices={"serial1": "device"})
+        self.server.shell_outputs.update({
+            "getprop ro.build.version.sdk": "33\n",
+            "screencap": struct.pack("<4I", 30, 40, 1, 0) + self.rgba.tobytes(),
+            "screencap -p": aircv.utils.img_2_string(self.bgr),
+        })
+        self.adb = ADB("serial1", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_raw_to_img(self):
+        for header in (struct.pack("<3I", 30, 40, 1), struct.pack("<4I", 30, 40, 1, 0)):
+            self.assertTrue(np.array_equal(raw_screencap_to_img(header + self.rgba.tobytes()), self.bgr))
+        bgra = struct.pack("<3I", 30, 40, 5) + np.dstack([self.bgr, self.rgba[:, :, 3]]).tobytes()
+        self.assertTrue(np.array_equal(raw_screencap_to_img(bgra), self.bgr))
+        # RGB_565 is not supported, truncated data
+        self.assertIsNone(raw_screencap_to_img(struct.pack("<3I", 30, 40, 4) + b"\0" * 30 * 40 * 2))
+        self.assertIsNone(raw_screencap_to_img(struct.pack("<3I", 30, 40, 1) + self.rgba.tobytes()[:-4]))
+
+    def test_adbcap(self):
+        cap = AdbCap(self.adb)
+        self.assertTrue(np.array_equal(cap.snapshot(), self.bgr))
+        self.assertIn("exec:screencap", self.server.requests)
+        self.assertTrue(cap._raw_supported)
+
+    def test_adbcap_fallback(self):
+        self.server.shell_outputs["screencap"] = struct.pack("<3I", 30, 40, 4) + b"\0" * 30 * 40 * 2
+        cap = AdbCap(self.adb)
+        self.assertTrue(np.array_equal(cap.snapshot(), self.bgr))
+        self.assertFalse(cap._raw_supported)
+        cap.snapshot()
+        self.assertEqual(self.server.requests.count("exec:screencap"), 1)
+
+    def test_adbcap_error(self):
+        # falls back to screencap -p when the raw screencap fails or can not be parsed
+        cap = AdbCap(self.adb)
+        with patch.object(self.adb, "screencap_raw", side_effect=AdbError("", "screencap failed")):
+            self.assertTrue(np.array_equal(cap.snapshot(), self.bgr))
+        self.assertFalse(cap._raw_supported)
+        cap = AdbCap(self.adb)
+        with patch("airtest.core.android.cap_methods.adbcap.raw_screencap_to_img", side_effect=ValueError):
+            self.assertTrue(np.array_equal(cap.snapshot(), self.bgr))
+        self.assertFalse(cap._raw_supported)
+
+    def test_snapshot_reduced_old_signature(self):
+        bgr = self.bgr
+
+        class OldCap(object):
+            def snapshot(self, ensure_orientation=True):
+                return bgr
+
+        dev = types.SimpleNamespace(screen_proxy=OldCap(), get_current_resolution=lambda: (30, 40))
+        screen, scale = Android.snapshot_reduced(dev, 1)
+        self.assertIs(screen, bgr)
+        self.assertEqual(scale, 1)
+
+
+class TestSyncPushPull(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeAdbServer()
+        self.server.shell_outputs["getprop ro.build.version.sdk"] = "30\n"
+        self.adb = ADB("serial1", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+        self.tmpdir = tempfile.mkdtemp()
+        self.data = os.urandom(200 * 1024)
+        self.local = os.path.join(self.tmpdir, "test.bin")
+        with open(self.local, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_push_pull_file(self):
+        progress = []
+        self.assertEqual(self.adb.push(self.local, "/sdcard/a.bin",
+                                       progress=lambda *args: progress.append(args)), "/sdcard/test.bin")
+        self.assertEqual(self.server.files["/sdcard/a.bin"][1], self.data)
+        # streamed in 64KB chunks
+        self.assertEqual(self.server.sync_chunks, [65536, 65536, 65536, 8192])
+        self.assertEqual(progress[-1], (os.path.abspath(self.local), len(self.data), len(self.data)))
+        # to a directory
+        self.assertEqual(self.adb.push(self.local, "/sdcard"), "/sdcard/test.bin")
+        self.assertIn("/sdcard/test.bin", self.server.files)
+
+        dst = os.path.join(self.tmpdir, "pulled.bin")
+        progress = []
+        self.adb.pull("/sdcard/a.bin", dst, progress=lambda *args: progress.append(args))
+        with open(dst, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(progress[-1], ("/sdcard/a.bin", len(self.data), len(self.data)))
+        with self.assertRaises(AdbError):
+            self.adb.pull("/sdcard/nonexistent", dst)
+
+    def test_sync_skip_same(self):
+        with self.adb.sync() as sync:
+            self.assertTrue(sync.push(self.local, "/sdcard/a.bin"))
+            self.assertFalse(sync.push(self.local, "/sdcard/a.bin"))
+            self.assertEqual(len(self.server.sync_chunks), 4)
+            os.utime(self.local, (0, 0))
+            self.assertTrue(sync.push(self.local, "/sdcard/a.bin"))
+            self.assertEqual(len(self.server.sync_chunks), 8)
+
+    def test_push_file_to_new_dir(self):
+        # the same layout as the subprocess transport: mkdir -p /sdcard/newdir, then push into it
+        self.assertEqual(self.adb.push(self.local, "/sdcard/newdir"), "/sdcard/newdir/test.bin")
+        self.assertEqual(sorted(self.server.files), ["/sdcard/newdir/test.bin"])
+        self.assertEqual(self.server.requests.count("sync:"), 1)
+
+    def make_dir(self, name):
+        local = os.path.join(self.tmpdir, name)
+        os.makedirs(os.path.join(local, "dir"))
+        for path in ("a.txt", "dir/b.txt"):
+            with open(os.path.join(local, path), "wb") as f:
+                f.write(b"data")
+        return local
+
+    def test_push_dir_to_new_dir(self):
+        local = self.make_dir("test_dir")
+        self.assertEqual(self.adb.push(local, "/sdcard/files"), "/sdcard/files/test_dir")
+        self.assertEqual(sorted(self.server.files), ["/sdcard/files/test_dir/a.txt", "/sdcard/files/test_dir/dir/b.txt"])
+
+    def test_push_dir_to_existing_dir(self):
+        local = self.make_dir("test_dir")
+        self.server.files["/sdcard/files/other.txt"] = (0o644, b"", 0)
+        self.server.files["/sdcard/files/test_dir/old.txt"] = (0o644, b"", 0)
+        self.assertEqual(self.adb.push(local, "/sdcard/files"), "/sdcard/files/test_dir")
+        # the existing target is removed first
+        self.assertEqual(sorted(self.server.files), ["/sdcard/files/other.txt", "/sdcard/files/test_dir/a.txt",
+                                                     "/sdcard/files/test_dir/dir/b.txt"])
+        # the same name as the target: the contents are pushed into it, not into test_dir/test_dir
+        self.server.files["/sdcard/files/test_dir/old.txt"] = (0o644, b"", 0)
+        self.assertEqual(self.adb.push(local, "/sdcard/files/test_dir"), "/sdcard/files/test_dir")
+        self.assertEqual(sorted(self.server.files), ["/sdcard/files/other.txt", "/sdcard/files/test_dir/a.txt",
+                                                     "/sdcard/files/test_dir/dir/b.txt"])
+
+    def test_push_pull_dir(self):
+        local = self.make_dir("assets")
+        with open(os.path.join(local, "test.bin"), "wb") as f:
+            f.write(self.data)
+        self.assertEqual(self.adb.push(local, "/sdcard/assets"), "/sdcard/assets")
+
+        pulled = os.path.join(self.tmpdir, "pulled")
+        self.adb.pull("/sdcard/assets", pulled)
+        with open(os.path.join(pulled, "dir", "b.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"data")
+        with open(os.path.join(pulled, "test.bin"), "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_sync_file_object(self):
+        with self.adb.sync() as sync:
+            sync.push(io.BytesIO(b"hello"), "/data/local/tmp/hello.txt", mtime=100)
+            self.assertEqual(sync.stat("/data/local/tmp/hello.txt")[1:], (5, 100))
+            self.assertIsNone(sync.stat("/data/local/tmp/nonexistent"))
+            out = io.BytesIO()
+            sync.pull("/data/local/tmp/hello.txt", out)
+            self.assertEqual(out.getvalue(), b"hello")
+            names = [entry[0] for entry in sync.list("/data/local/tmp")]
+            self.assertIn("hello.txt", names)
+
+    def test_sync_device_not_found(self):
+        adb = ADB("serial2", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+        with self.assertRaises(DeviceConnectionError):
+            adb.push(self.local, "/sdcard/a.bin")
+
+
+class TestDeviceTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeAdbServer(devices={"serial1": "device"})
+        self.adb = ADB("serial1", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+
+    def tearDown(self):
+        DeviceTracker.stop_all()
+        self.server.stop()
+
+    def test_devices(self):
+        self.assertEqual(self.adb.devices(), [("serial1", "device")])
+        self.assertEqual(self.adb.get_status(), "device")
+        self.server.devices["serial2"] = "offline"
+        time.sleep(0.1)
+        self.assertEqual(sorted(self.adb.devices()), [("serial1", "device"), ("serial2", "offline")])
+        self.assertEqual(self.adb.devices(state="offline"), [("serial2", "offline")])
+        # no more requests once the device list is tracked
+        self.assertNotIn("host:devices", self.server.requests)
+        self.assertEqual(self.server.requests.count("host:track-devices"), 1)
+
+    def test_callback(self):
+        tracker = DeviceTracker.get(*self.server.addr)
+        self.assertTrue(tracker.wait_ready(1))
+        changes = []
+        event = threading.Event()
+        tracker.add_callback(lambda *args: (changes.append(args), event.set()))
+        start = time.time()
+        self.server.devices.pop("serial1")
+        self.assertTrue(event.wait(1))
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(changes, [("serial1", "device", None)])
+        self.assertIsNone(self.adb.get_status())
+
+    def test_wait_for_device(self):
+        self.server.devices["serial1"] = "offline"
+        threading.Timer(0.2, self.server.devices.__setitem__, ("serial1", "device")).start()
+        self.adb.wait_for_device(timeout=2)
+        self.server.devices["serial1"] = "offline"
+        time.sleep(0.1)
+        with self.assertRaises(DeviceConnectionError):
+            self.adb.wait_for_device(timeout=0.2)
+
+    def test_reconnect(self):
+        tracker = DeviceTracker.get(*self.server.addr)
+        self.assertTrue(tracker.wait_ready(1))
+        tracker._conn.close()
+        time.sleep(0.1)
+        self.assertTrue(tracker.wait_ready(tracker.RECONNECT_INTERVAL + 1))
+        self.assertEqual(self.server.requests.count("host:track-devices"), 2)
+        # no tracker without socket transport
+        self.assertIsNone(ADB("serial1", server_addr=self.server.addr).get_device_tracker())
+
+
+class TestStreamInstall(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeAdbServer()
+        self.server.shell_outputs.update({
+            "getprop ro.build.version.sdk": "30\n",
+            "dumpsys package com.test": "    versionCode=2 minSdk=21 targetSdk=30\n",
+            "cmd package install-create -S 3072 -r": "Success: created install session [7]\n",
+            "cmd package install-commit 7": "Success\n",
+        })
+        self.adb = ADB("serial1", server_addr=self.server.addr, transport=ADB_TRANSPORT.SOCKET)
+        self.tmpdir = tempfile.mkdtemp()
+        self.apks = []
+        for i, name in enumerate(["base.apk", "split_config.arm64_v8a.apk", "split_config.xxhdpi.apk"]):
+            path = os.path.join(self.tmpdir, name)
+            with open(path, "wb") as f:
+                f.write(bytes([i]) * 1024)
+            self.apks.append(path)
+            self.server.shell_outputs["cmd package install-write -S 1024 7 %d_%s -" % (i, name)] = \
+                "Success: streamed 1024 bytes\n"
+        patcher = patch("airtest.core.android.adb.APK")
+        self.apk = patcher.start()
+        self.apk.return_value.get_package.return_value = "com.test"
+        self.apk.return_value.get_androidversion_code.return_value = "3"
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_install(self):
+        self.server.shell_outputs["cmd package install -S 1024 -g -r"] = "Success\n"
+        self.assertEqual(self.adb.stream_install(self.apks[0], replace=True, install_options=["-g"]), "Success\n")
+        self.assertEqual(self.server.stdin_data["cmd package install -S 1024 -g -r"], b"\0" * 1024)
+        # no copy in the tmp dir
+        self.assertFalse([req for req in self.server.requests if req == "sync:" or "rm " in req])
+
+        self.server.shell_outputs["dumpsys package com.test"] = "    versionCode=3 minSdk=21 targetSdk=30\n"
+        self.assertEqual(self.adb.stream_install(self.apks[0]), "Skipped")
+        self.assertEqual(len(self.server.stdin_data), 1)
+
+    def test_install_failure(self):
+        self.server.shell_outputs["cmd package install -S 1024"] = "Failure [INSTALL_FAILED_INVALID_APK]\n"
+        with self.assertRaises(AdbShellError):
+            self.adb.stream_install(self.apks[0])
+
+    def test_install_splits(self):
+        self.assertEqual(self.adb.stream_install(self.apks, replace=True), "Success\n")
+        for i, name in enumerate(["base.apk", "split_config.arm64_v8a.apk", "split_config.xxhdpi.apk"]):
+            self.assertEqual(self.server.stdin_data["cmd package install-write -S 1024 7 %d_%s -" % (i, name)],
+                             bytes([i]) * 1024)
+
+        self.server.shell_outputs["cmd package install-commit 7"] = "Failure [INSTALL_FAILED_MISSING_SPLIT]\n"
+        with self.assertRaises(AdbShellError):
+            self.adb.stream_install(self.apks, replace=True)
+        self.assertIn("exec:cmd package install-abandon 7", self.server.requests)
+
+
+def tearDownModule():
+    DeviceTracker.stop_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
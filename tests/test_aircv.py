@@ -5,12 +5,21 @@
 
 
 import unittest
+from unittest import mock
+import numpy as np
 from airtest.aircv import imread
 from airtest.aircv.keypoint_matching import *  # noqa
 from airtest.aircv.keypoint_matching_contrib import *  # noqa
 from airtest.aircv.template_matching import *  # noqa
 from airtest.aircv.sift import find_sift
 from airtest.aircv.template import find_template, find_all_template
+from airtest.aircv.image_cache import ImageCache
+from airtest.aircv.screen_fingerprint import ScreenFingerprint
+from airtest.aircv.prepared_template import PreparedTemplate, PreparedScreen
+from airtest.aircv.multiscale_template_matching import MultiScaleTemplateMatching
+from airtest.aircv.utils import string_2_img, reduce_image
+from airtest.aircv.cal_confidence import cal_hsv_confidences
+from airtest.core.cv import Template
 
 
 class TestAircv(unittest.TestCase):
@@ -45,6 +54,63 @@ class TestAircv(unittest.TestCase):
         result = TemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_all_results()
         self.assertIsInstance(result, list)
 
+    def test_find_all_template_grid(self):
+        """Find every copy of the template in a grid, the result count is capped by max_count."""
+        h, w = self.template_sch.shape[:2]
+        screen = np.full((3 * h + 40, 3 * w + 40, 3), 200, dtype=np.uint8)
+        for i in range(3):
+            for j in range(3):
+                screen[10 + i * (h + 10):10 + i * (h + 10) + h, 10 + j * (w + 10):10 + j * (w + 10) + w] = self.template_sch
+        result = TemplateMatching(self.template_sch, screen, threshold=self.THRESHOLD, rgb=self.RGB, max_count=20).find_all_results()
+        self.assertEqual(len(result), 9)
+        self.assertEqual(len(set(r["result"] for r in result)), 9)
+        result = TemplateMatching(self.template_sch, screen, threshold=self.THRESHOLD, rgb=self.RGB, max_count=3).find_all_results()
+        self.assertEqual(len(result), 3)
+
+    def grid_screen(self, n):
+        h, w = self.template_sch.shape[:2]
+        screen = np.full((n * (h + 10) + 30, n * (w + 10) + 30, 3), 200, dtype=np.uint8)
+        for i in range(n):
+            for j in range(n):
+                screen[10 + i * (h + 10):10 + i * (h + 10) + h, 10 + j * (w + 10):10 + j * (w + 10) + w] = self.template_sch
+        return screen
+
+    def test_find_all_template_default_count(self):
+        """Without max_count, at most MAX_RESULT_COUNT results are returned (MAX_RESULT_COUNT + 1 before)."""
+        screen = self.grid_screen(4)
+        for rgb in (False, True):
+            result = TemplateMatching(self.template_sch, screen, threshold=self.THRESHOLD, rgb=rgb).find_all_results()
+            self.assertEqual(len(result), TemplateMatching.MAX_RESULT_COUNT)
+        query = Template("matching_images/template_search.png", threshold=self.THRESHOLD)
+        self.assertEqual(len(query.match_all_in(screen)), TemplateMatching.MAX_RESULT_COUNT)
+        self.assertEqual(len(query.match_all_in(screen, max_count=16)), 16)
+
+    def test_find_all_template_rgb_confidences(self):
+        """The RGB confidences computed in one batch are the same as computed one by one."""
+        screen = self.grid_screen(3)
+        screen[10:30, 10:30] = 0
+        matching = TemplateMatching(self.template_sch, screen, threshold=0, rgb=True, max_count=20)
+        h, w = self.template_sch.shape[:2]
+        peaks = list(zip(range(20), matching._iter_peaks(matching._get_template_result_matrix(), w, h)))
+        peaks = [peak for _, peak in peaks]
+        expected = [matching._get_confidence_from_matrix(loc, val, w, h) for loc, val in peaks]
+        # the template is higher than BATCH_CONFIDENCE_MAX_HEIGHT, compare the batch function directly
+        confidences = cal_hsv_confidences([matching.prepared_source.hsv_crop(loc[0], loc[1], w, h) for loc, _ in peaks],
+                                          matching.prepared)
+        self.assertEqual(len(confidences), len(peaks))
+        for a, b in zip(confidences, expected):
+            self.assertAlmostEqual(a, b, places=5)
+        self.assertEqual(matching._get_confidences_from_matrix(peaks, w, h), expected)
+
+    def test_find_all_small_template_rgb(self):
+        """Small templates take the batch RGB confidences in find_all_results."""
+        template = np.ascontiguousarray(self.template_sch[40:64, 40:64])
+        screen = np.full((200, 200, 3), 200, dtype=np.uint8)
+        for x, y in ((10, 10), (100, 30), (50, 150)):
+            screen[y:y + 24, x:x + 24] = template
+        result = TemplateMatching(template, screen, threshold=0.9, rgb=True).find_all_results()
+        self.assertEqual(sorted(r["result"] for r in result), [(22, 22), (62, 162), (112, 42)])
+
     def test_find_kaze(self):
         """KAZE matching."""
         # 较慢,稍微稳定一点.
@@ -102,6 +168,212 @@ class TestAircv(unittest.TestCase):
         result = find_all_template(self.template_src, self.template_sch, threshold=self.THRESHOLD, rgb=self.RGB)
         self.assertIsInstance(result, list)
 
+    def test_prepared_template(self):
+        """Matching with PreparedTemplate gives the same results as with the raw image."""
+        prepared = PreparedTemplate(self.template_sch)
+        for _ in range(2):
+            result = TemplateMatching(prepared, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+            expected = TemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+            self.assertEqual(result["result"], expected["result"])
+            self.assertAlmostEqual(result["confidence"], expected["confidence"])
+
+        prepared = PreparedTemplate(self.keypoint_sch)
+        for _ in range(2):
+            result = BRISKMatching(prepared, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+            self.assertIsInstance(result, dict)
+
+    def test_prepared_multiscale_template(self):
+        prepared = PreparedTemplate(self.template_sch)
+        expected = MultiScaleTemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        for _ in range(2):
+            result = MultiScaleTemplateMatching(prepared, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+            self.assertEqual(result["result"], expected["result"])
+
+    def test_prepared_screen(self):
+        """Many templates matched against one PreparedScreen give the same results as with the raw screen."""
+        screen = PreparedScreen(self.template_src)
+        for method in (TemplateMatching, MultiScaleTemplateMatching):
+            result = method(self.template_sch, screen, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+            expected = method(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+            self.assertEqual(result["result"], expected["result"])
+            self.assertAlmostEqual(result["confidence"], expected["confidence"])
+
+        screen = PreparedScreen(self.keypoint_src)
+        for _ in range(2):
+            result = BRISKMatching(self.keypoint_sch, screen, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+            self.assertIsInstance(result, dict)
+
+    def test_keypoint_reuse(self):
+        """Detectors are reused and template descriptors cached across matches."""
+        KeypointMatching.clear_cache()
+        first = BRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB)
+        expected = first.find_best_result()
+        second = BRISKMatching(self.keypoint_sch.copy(), self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB)
+        result = second.find_best_result()
+        self.assertIs(first.detector, second.detector)
+        self.assertIs(first.kp_sch, second.kp_sch)
+        self.assertEqual(result["result"], expected["result"])
+
+    def test_keypoint_detector_key(self):
+        """Detectors are reused by class and DETECTOR_PARAMS, only DETECTOR_ATTRS are shared."""
+
+        class ThresholdBRISKMatching(BRISKMatching):
+            BRISK_THRESHOLD = 30
+            DETECTOR_PARAMS = ("BRISK_THRESHOLD", )
+
+            def init_detector(self):
+                self.detector = cv2.BRISK_create(self.BRISK_THRESHOLD)
+                self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+
+        KeypointMatching.clear_cache()
+        first = ThresholdBRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB)
+        first.find_best_result()
+        second = ThresholdBRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=0.1, rgb=self.RGB)
+        second.BRISK_THRESHOLD = 40
+        second.find_best_result()
+        third = ThresholdBRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=0.2, rgb=self.RGB)
+        third.find_best_result()
+        self.assertIsNot(first.detector, second.detector)
+        self.assertIs(first.detector, third.detector)
+        self.assertIs(first.matcher, third.matcher)
+        self.assertEqual(third.threshold, 0.2)
+        # not the detectors of the parent class
+        brisk = BRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB)
+        brisk.find_best_result()
+        self.assertIsNot(brisk.detector, first.detector)
+
+    def test_keypoint_flann(self):
+        """FLANN (LSH for binary descriptors) matching finds the same target as brute-force matching."""
+        expected = BRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        BRISKMatching.USE_FLANN, BRISKMatching.FLANN_MIN_DESCRIPTORS = True, 0
+        try:
+            result = BRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        finally:
+            del BRISKMatching.USE_FLANN, BRISKMatching.FLANN_MIN_DESCRIPTORS
+        self.assertLessEqual(abs(result["result"][0] - expected["result"][0]), 3)
+        self.assertLessEqual(abs(result["result"][1] - expected["result"][1]), 3)
+
+    def test_keypoint_flann_index(self):
+        """FLANN of float descriptors uses the KD tree index, even if a subclass sets FLANN_INDEX_KDTREE to linear as SIFT."""
+        class LinearKAZEMatching(KAZEMatching):
+            FLANN_INDEX_KDTREE = 0
+
+        kaze = LinearKAZEMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB)
+        with mock.patch("airtest.aircv.keypoint_base.cv2.FlannBasedMatcher") as matcher:
+            kaze._get_flann_matcher(np.zeros((1, 64), dtype=np.float32))
+            kaze._get_flann_matcher(np.zeros((1, 64), dtype=np.uint8))
+        self.assertEqual(matcher.call_args_list[0][0][0]["algorithm"], 1)
+        self.assertEqual(matcher.call_args_list[1][0][0]["algorithm"], 6)
+
+    def test_multiscale_coarse_to_fine(self):
+        """Coarse-to-fine scale search finds the same target as the exhaustive one."""
+        exhaustive = MultiScaleTemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB)
+        exhaustive.COARSE_TO_FINE = False
+        expected = exhaustive.find_best_result()
+        result = MultiScaleTemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        self.assertIsInstance(result, dict)
+        self.assertLessEqual(abs(result["result"][0] - expected["result"][0]), 3)
+        self.assertLessEqual(abs(result["result"][1] - expected["result"][1]), 3)
+
+
+class TestImageCache(unittest.TestCase):
+    """Test decoded image cache."""
+
+    def test_imread_cached(self):
+        cache = ImageCache()
+        img1 = cache.imread("matching_images/template_search.png")
+        img2 = cache.imread("matching_images/template_search.png")
+        self.assertIs(img1, img2)
+        self.assertFalse(img1.flags.writeable)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_lru_eviction(self):
+        img = imread("matching_images/template_search.png")
+        cache = ImageCache(max_bytes=img.nbytes * 2)
+        cache.put("a", img.copy())
+        cache.put("b", img.copy())
+        cache.get("a")
+        cache.put("c", img.copy())
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_disabled(self):
+        cache = ImageCache(max_bytes=0)
+        cache.imread("matching_images/template_search.png")
+        self.assertEqual(len(cache), 0)
+
+
+class TestScreenFingerprint(unittest.TestCase):
+    """Test screen change detection."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.screen = imread("matching_images/template_screen.png")
+
+    def test_unchanged(self):
+        fingerprint = ScreenFingerprint(self.screen)
+        self.assertTrue(ScreenFingerprint(self.screen.copy()).same_as(fingerprint))
+        self.assertIsNone(ScreenFingerprint(self.screen).changed_area(fingerprint))
+
+    def test_changed_area(self):
+        fingerprint = ScreenFingerprint(self.screen)
+        changed = self.screen.copy()
+        changed[300:400, 200:300] = 255 - changed[300:400, 200:300]
+        new_fingerprint = ScreenFingerprint(changed)
+        self.assertFalse(new_fingerprint.same_as(fingerprint))
+        xmin, ymin, xmax, ymax = new_fingerprint.changed_area(fingerprint)
+        self.assertTrue(xmin <= 200 and ymin <= 300 and xmax >= 300 and ymax >= 400)
+        h, w = self.screen.shape[:2]
+        self.assertLess((xmax - xmin) * (ymax - ymin), w * h / 4)
+
+    def test_resolution_changed(self):
+        fingerprint = ScreenFingerprint(self.screen)
+        rotated = ScreenFingerprint(self.screen.transpose(1, 0, 2).copy())
+        h, w = self.screen.shape[:2]
+        self.assertEqual(rotated.changed_area(fingerprint), (0, 0, h, w))
+
+
+class TestReducedScreen(unittest.TestCase):
+    """Test matching in screens taken at a reduced size."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.screen = imread("matching_images/template_screen.png")
+
+    def test_decode_reduced(self):
+        data = cv2.imencode(".jpg", self.screen)[1].tobytes()
+        for reduce in (1, 2, 4, 8):
+            img = string_2_img(data, reduce)
+            self.assertEqual(img.shape, reduce_image(self.screen, reduce).shape)
+        h, w = self.screen.shape[:2]
+        self.assertEqual(img.shape[:2], ((h + 7) // 8, (w + 7) // 8))
+        with self.assertRaises(ValueError):
+            string_2_img(data, 3)
+
+    def test_result_to_display(self):
+        screen = PreparedScreen(reduce_image(self.screen, 2), scale=2)
+        h, w = screen.image.shape[:2]
+        self.assertEqual(screen.display_resolution, (w * 2, h * 2))
+        result = screen.result_to_display({"result": (10, 20), "rectangle": [(1, 2), (3, 4)], "confidence": 0.9})
+        self.assertEqual(result["result"], (20, 40))
+        self.assertEqual(result["rectangle"], [(2, 4), (6, 8)])
+        self.assertIsNone(screen.result_to_display(None))
+
+    def test_match_reduced_screen(self):
+        """The positions matched in a reduced screen are in the display coordinates."""
+        query = Template("matching_images/template_search.png", threshold=0.6)
+        expected = query._match_screen(self.screen)
+        screen = PreparedScreen(reduce_image(self.screen, 2), scale=2)
+        result = query._match_screen(screen)
+        self.assertIsInstance(result, dict)
+        self.assertLessEqual(abs(result["result"][0] - expected["result"][0]), 4)
+        self.assertLessEqual(abs(result["result"][1] - expected["result"][1]), 4)
+        for pt, expected_pt in zip(result["rectangle"], expected["rectangle"]):
+            self.assertLessEqual(abs(pt[0] - expected_pt[0]), 4)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,339 @@
+# encoding=utf-8
+from airtest.core import cv
+from airtest.core.cv import Template, loop_find, MATCHING_METHODS
+from airtest.core.device import Device
+from airtest.core.error import TargetNotFoundError
+from airtest.core.helper import G
+from airtest.core.settings import Settings as ST
+from airtest.aircv import imread
+from airtest.aircv.utils import reduce_image
+from airtest.aircv.multiscale_template_matching import MultiScaleTemplateMatchingPre
+import numpy as np
+import time
+import unittest
+from unittest import mock
+
+
+SEARCH = "matching_images/template_search.png"
+# the area around the target of template_screen.png, to keep the tests fast
+SCREEN = imread("matching_images/template_screen.png")[400:800, 100:500]
+# the same screen without the target
+BLANK = np.full(SCREEN.shape, 200, dtype=np.uint8)
+
+
+class FakeDevice(Device):
+    """Device returning the screens in order, the last one again once they are all taken"""
+
+    def __init__(self, screens):
+        super(FakeDevice, self).__init__()
+        self.screens = list(screens)
+        self.snapshots = 0
+
+    def snapshot(self, filename=None, quality=10, **kwargs):
+        self.snapshots += 1
+        return self.screens.pop(0) if len(self.screens) > 1 else self.screens[0]
+
+
+class FakeStreamDevice(FakeDevice):
+    """FakeDevice whose screens are read from frame_stream(), the frames may be smaller than the display"""
+
+    def __init__(self, screens, resolution=None):
+        super(FakeStreamDevice, self).__init__(screens)
+        self.resolution = resolution or (SCREEN.shape[1], SCREEN.shape[0])
+        self.frames = 0
+
+    def frame_stream(self):
+        while True:
+            self.frames += 1
+            yield self.screens.pop(0) if len(self.screens) > 1 else self.screens[0]
+
+    def get_current_resolution(self):
+        return self.resolution
+
+
+class CountingTemplate(Template):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingTemplate, self).__init__(*args, **kwargs)
+        self.matches = 0
+        self.areas = []
+
+    def match_in(self, screen, area=None):
+        self.matches += 1
+        self.areas.append(area)
+        return super(CountingTemplate, self).match_in(screen, area)
+
+
+def fake_method(pos, delay=0):
+    """Matching class returning a result at pos (None for a miss) after delay seconds"""
+
+    class FakeMatching(object):
+        calls = 0
+
+        def __init__(self, im_search, im_source, threshold=0.8, rgb=True):
+            pass
+
+        def find_best_result(self):
+            FakeMatching.calls += 1
+            time.sleep(delay)
+            if pos is None:
+                return None
+            return {"result": pos, "rectangle": [pos] * 4, "confidence": 0.9}
+
+    FakeMatching.__name__ = "FakeMatching%s" % (pos, )
+    return FakeMatching
+
+
+class CvTestCase(unittest.TestCase):
+    """Restore G.DEVICE and the settings changed by the tests"""
+
+    SETTINGS = ["FIND_SKIP_UNCHANGED", "FIND_SKIP_MAX", "FIND_SKIP_MAX_TIME", "FIND_CHANGED_AREA_ONLY",
+                "FIND_SCREEN_REDUCE", "CVSTRATEGY", "CVSTRATEGY_PARALLEL", "CVSTRATEGY_PARALLEL_MODE",
+                "CVSTRATEGY_WORKERS", "PREDICT_AREA_SEARCH", "PREDICT_AREA_MSTPL_FALLBACK", "FIND_FROM_STREAM",
+                "FIND_STREAM_BACKOFF"]
+
+    def setUp(self):
+        self._device = G._DEVICE
+        self._settings = {name: getattr(ST, name) for name in self.SETTINGS}
+        ST.CVSTRATEGY = ["tpl"]
+
+    def tearDown(self):
+        G.DEVICE = self._device
+        for name, value in self._settings.items():
+            setattr(ST, name, value)
+
+
+class TestLoopFind(CvTestCase):
+
+    def test_found(self):
+        G.DEVICE = FakeDevice([BLANK, SCREEN])
+        query = CountingTemplate(SEARCH)
+        pos = loop_find(query, timeout=2, interval=0.01)
+        self.assertEqual(query.matches, 2)
+        self.assertLessEqual(abs(pos[0] - 185), 2)
+        self.assertLessEqual(abs(pos[1] - 219), 2)
+
+    def test_timeout(self):
+        G.DEVICE = FakeDevice([BLANK])
+        query = CountingTemplate(SEARCH)
+        with self.assertRaises(TargetNotFoundError):
+            loop_find(query, timeout=0.2, interval=0.01)
+        # every screen is matched by default, even an unchanged one
+        self.assertEqual(query.matches, G.DEVICE.snapshots)
+
+    def test_skip_unchanged(self):
+        ST.FIND_SKIP_UNCHANGED = True
+        ST.FIND_SKIP_MAX, ST.FIND_SKIP_MAX_TIME = 1000, 1000
+        G.DEVICE = FakeDevice([BLANK])
+        query = CountingTemplate(SEARCH)
+        with self.assertRaises(TargetNotFoundError):
+            loop_find(query, timeout=0.2, interval=0.01)
+        self.assertGreater(G.DEVICE.snapshots, 3)
+        self.assertEqual(query.matches, 1)
+
+    def test_rematch_after_skips(self):
+        ST.FIND_SKIP_UNCHANGED = True
+        ST.FIND_SKIP_MAX, ST.FIND_SKIP_MAX_TIME = 2, 1000
+        # a change too small for the fingerprint: the target is found by the forced match
+        G.DEVICE = FakeDevice([BLANK, BLANK, BLANK, BLANK, SCREEN])
+        query = CountingTemplate(SEARCH)
+        self.assertTrue(loop_find(query, timeout=2, interval=0.01))
+        # match, skip, skip, match(forced) ...
+        self.assertLess(query.matches, G.DEVICE.snapshots)
+
+        G.DEVICE = FakeDevice([BLANK])
+        query = CountingTemplate(SEARCH)
+        with self.assertRaises(TargetNotFoundError):
+            loop_find(query, timeout=0.3, interval=0.01)
+        snapshots = G.DEVICE.snapshots
+        self.assertAlmostEqual(query.matches, (snapshots + 2) // 3, delta=1)
+
+    def test_rematch_after_time(self):
+        ST.FIND_SKIP_UNCHANGED = True
+        ST.FIND_SKIP_MAX, ST.FIND_SKIP_MAX_TIME = 1000, 0.1
+        G.DEVICE = FakeDevice([BLANK])
+        query = CountingTemplate(SEARCH)
+        with self.assertRaises(TargetNotFoundError):
+            loop_find(query, timeout=0.5, interval=0.02)
+        self.assertGreaterEqual(query.matches, 2)
+        self.assertLess(query.matches, G.DEVICE.snapshots)
+
+    def test_changed_area_only(self):
+        ST.FIND_CHANGED_AREA_ONLY = True
+        G.DEVICE = FakeDevice([BLANK, SCREEN])
+        query = CountingTemplate(SEARCH)
+        pos = loop_find(query, timeout=2, interval=0.01)
+        self.assertLessEqual(abs(pos[0] - 185), 2)
+        # the second screen is only searched in the area changed since the first one
+        self.assertIsNone(query.areas[0])
+        xmin, ymin, xmax, ymax = query.areas[1]
+        self.assertTrue(xmin <= pos[0] <= xmax and ymin <= pos[1] <= ymax)
+
+
+class TestStreamMode(CvTestCase):
+
+    def setUp(self):
+        super(TestStreamMode, self).setUp()
+        ST.FIND_FROM_STREAM = True
+
+    def assertFoundTarget(self, pos, delta=2):
+        self.assertLessEqual(abs(pos[0] - 185), delta)
+        self.assertLessEqual(abs(pos[1] - 219), delta)
+
+    def test_found(self):
+        G.DEVICE = FakeStreamDevice([BLANK, BLANK, SCREEN])
+        query = CountingTemplate(SEARCH)
+        # the frames are matched as they arrive, not every `interval` seconds
+        start = time.time()
+        self.assertFoundTarget(loop_find(query, timeout=2, interval=1))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(G.DEVICE.frames, 3)
+        self.assertEqual(G.DEVICE.snapshots, 0)
+
+    def test_reduced(self):
+        ST.FIND_SCREEN_REDUCE = 2
+        G.DEVICE = FakeStreamDevice([BLANK, SCREEN])
+        self.assertFoundTarget(loop_find(Template(SEARCH), timeout=2, interval=0.01), delta=4)
+
+    def test_projection(self):
+        # frames captured at half of the display size, e.g. minicap with a projection
+        G.DEVICE = FakeStreamDevice([reduce_image(BLANK, 2), reduce_image(SCREEN, 2)])
+        self.assertFoundTarget(loop_find(Template(SEARCH), timeout=2, interval=0.01), delta=4)
+        ST.FIND_SCREEN_REDUCE = 2
+        G.DEVICE = FakeStreamDevice([reduce_image(BLANK, 2), reduce_image(SCREEN, 2)])
+        self.assertFoundTarget(loop_find(Template(SEARCH), timeout=2, interval=0.01), delta=8)
+
+    def test_backoff(self):
+        ST.FIND_STREAM_BACKOFF = 0.02
+        G.DEVICE = FakeStreamDevice([BLANK])
+        with self.assertRaises(TargetNotFoundError):
+            loop_find(Template(SEARCH), timeout=0.5, interval=0.2)
+        # sleeps 0.02, 0.04, 0.08, 0.16, 0.2 ... between the unchanged frames
+        self.assertGreaterEqual(G.DEVICE.frames, 4)
+        self.assertLessEqual(G.DEVICE.frames, 10)
+
+    def test_no_stream(self):
+        # the devices without a screen stream take snapshots
+        G.DEVICE = FakeDevice([BLANK, SCREEN])
+        self.assertFoundTarget(loop_find(Template(SEARCH), timeout=2, interval=0.01))
+        self.assertEqual(G.DEVICE.snapshots, 2)
+
+
+class TestPredictArea(CvTestCase):
+
+    def setUp(self):
+        super(TestPredictArea, self).setUp()
+        ST.PREDICT_AREA_SEARCH = True
+        cv.PREDICT_AREA_STATS.clear()
+
+    def match(self, record_pos):
+        h, w = SCREEN.shape[:2]
+        query = Template(SEARCH, record_pos=record_pos, resolution=(w, h))
+        return query._cv_match(SCREEN)
+
+    def assertFoundTarget(self, ret):
+        self.assertLessEqual(abs(ret["result"][0] - 185), 2)
+        self.assertLessEqual(abs(ret["result"][1] - 219), 2)
+
+    def test_hit(self):
+        self.assertFoundTarget(self.match((-0.0375, 0.0475)))
+        self.assertEqual(cv.PREDICT_AREA_STATS, {"tpl": {"hit": 1, "fallback": 0}})
+
+    def test_fallback(self):
+        # the target is out of the predicted area, found in the full screen
+        self.assertFoundTarget(self.match((0.4, -0.4)))
+        self.assertEqual(cv.PREDICT_AREA_STATS, {"tpl": {"hit": 0, "fallback": 1}})
+        self.assertFoundTarget(self.match((-0.0375, 0.0475)))
+        self.assertEqual(cv.PREDICT_AREA_STATS, {"tpl": {"hit": 1, "fallback": 1}})
+
+    def test_mstpl_searches_per_miss(self):
+        searches = []
+
+        class CountingMatching(MultiScaleTemplateMatchingPre):
+            def __init__(self, *args, **kwargs):
+                searches.append(kwargs.get("record_pos"))
+                super(CountingMatching, self).__init__(*args, **kwargs)
+
+        ST.CVSTRATEGY = ["mstpl"]
+        with mock.patch.dict(MATCHING_METHODS, {"mstpl": CountingMatching}):
+            # one multi-scale search per miss, in the predicted area only
+            self.assertIsNone(self.match((0.4, -0.4)))
+            self.assertEqual(searches, [(0.4, -0.4)])
+            self.assertEqual(cv.PREDICT_AREA_STATS, {})
+            # the full screen search on a miss is opt-in
+            ST.PREDICT_AREA_MSTPL_FALLBACK = True
+            del searches[:]
+            self.assertFoundTarget(self.match((0.4, -0.4)))
+            self.assertEqual(searches, [(0.4, -0.4), None])
+            self.assertEqual(cv.PREDICT_AREA_STATS, {"mstpl": {"hit": 0, "fallback": 1}})
+
+    def test_disabled(self):
+        ST.PREDICT_AREA_SEARCH = False
+        self.assertFoundTarget(self.match((0.4, -0.4)))
+        self.assertEqual(cv.PREDICT_AREA_STATS, {})
+
+    def test_stats_bounded(self):
+        for _ in range(3):
+            cv._count_predict_area("tpl", "hit")
+            cv._count_predict_area("unknown", "hit")
+        self.assertEqual(cv.PREDICT_AREA_STATS, {"tpl": {"hit": 3, "fallback": 0}})
+
+
+class TestParallelMatch(CvTestCase):
+
+    def setUp(self):
+        super(TestParallelMatch, self).setUp()
+        self.methods = {
+            "slow_hit": fake_method((1, 1), delay=0.3),
+            "fast_hit": fake_method((2, 2)),
+            "fast_miss": fake_method(None),
+        }
+        MATCHING_METHODS.update(self.methods)
+
+    def tearDown(self):
+        super(TestParallelMatch, self).tearDown()
+        for method in self.methods:
+            del MATCHING_METHODS[method]
+        # wait for the abandoned methods, not to be skipped by the next test
+        for future in list(cv._CV_ABANDONED.values()):
+            future.result()
+
+    def match(self, strategy, parallel, mode="priority"):
+        ST.CVSTRATEGY, ST.CVSTRATEGY_PARALLEL, ST.CVSTRATEGY_PARALLEL_MODE = strategy, parallel, mode
+        ret = Template(SEARCH)._cv_match(SCREEN)
+        return ret and (ret["result"], ret.get("method"))
+
+    def test_priority(self):
+        for strategy in (["slow_hit", "fast_hit"], ["fast_miss", "slow_hit", "fast_hit"],
+                         ["fast_miss", "fast_hit", "slow_hit"], ["fast_miss"]):
+            sequential = self.match(strategy, False)
+            parallel = self.match(strategy, True)
+            self.assertEqual(parallel and parallel[0], sequential and sequential[0], strategy)
+        self.assertEqual(self.match(["fast_miss", "slow_hit", "fast_hit"], True), ((1, 1), "slow_hit"))
+
+    def test_first(self):
+        start = time.time()
+        self.assertEqual(self.match(["slow_hit", "fast_miss", "fast_hit"], True, "first"), ((2, 2), "fast_hit"))
+        self.assertLess(time.time() - start, 0.2)
+        # "slow_hit" can not be cancelled once running, it is skipped by the next match instead of delaying it
+        self.assertIn("slow_hit", cv._CV_ABANDONED)
+        start = time.time()
+        self.assertEqual(self.match(["slow_hit", "fast_hit"], True, "first"), ((2, 2), "fast_hit"))
+        self.assertLess(time.time() - start, 0.2)
+        self.assertEqual(self.methods["slow_hit"].calls, 1)
+        # all methods busy: wait for them
+        self.assertEqual(self.match(["slow_hit"], True, "first"), ((1, 1), None))
+
+    def test_workers_changed(self):
+        ST.CVSTRATEGY_WORKERS = 2
+        executor = cv._get_cv_executor()
+        self.assertIs(cv._get_cv_executor(), executor)
+        ST.CVSTRATEGY_WORKERS = 3
+        rebuilt = cv._get_cv_executor()
+        self.assertIsNot(rebuilt, executor)
+        self.assertEqual(rebuilt._max_workers, 3)
+        self.assertEqual(self.match(["fast_miss", "fast_hit"], True), ((2, 2), "fast_hit"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# encoding=utf-8
+from airtest.core.android.adb import ADB, AdbShellError
+from airtest.core.android.constant import ADB_TRANSPORT
+from airtest.core.android.device_tracker import DeviceTracker
+from airtest.core.android.fanout import AdbFanout, fanout
+from fake_adb_server import FakeAdbServer
+import time
+import threading
+import unittest
+
+
+class TestFanout(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.serials = ["serial%d" % i for i in range(8)]
+        cls.server = FakeAdbServer(devices={serialno: "device" for serialno in cls.serials})
+        cls.server.shell_outputs.update({"echo hello": "hello\n", "getprop ro.build.version.sdk": "30\n",
+                                         "ls /nonexistent": ("", "No such file or directory\n", 1)})
+        cls.kwargs = dict(server_addr=cls.server.addr, transport=ADB_TRANSPORT.SOCKET)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def tearDown(self):
+        AdbFanout.set_max_concurrent(16)
+
+    def test_command(self):
+        results = fanout("shell echo hello", **self.kwargs)
+        self.assertEqual(list(results), self.serials)
+        for serialno, res in results.items():
+            self.assertTrue(res.ok)
+            self.assertEqual(res.serialno, serialno)
+            self.assertEqual(res.result, "hello\n")
+
+    def test_callable(self):
+        adbs = [ADB(serialno, **self.kwargs) for serialno in self.serials[:3]]
+        results = fanout(lambda adb: adb.serialno.upper(), adbs)
+        self.assertEqual([res.result for res in results.values()], ["SERIAL0", "SERIAL1", "SERIAL2"])
+
+    def test_error(self):
+        def func(adb):
+            if adb.serialno == "serial1":
+                return adb.shell("ls /nonexistent")
+            return adb.shell("echo hello")
+
+        results = fanout(func, self.serials[:3], **self.kwargs)
+        self.assertTrue(results["serial0"].ok)
+        self.assertIsInstance(results["serial1"].error, AdbShellError)
+        self.assertTrue(results["serial2"].ok)
+        with self.assertRaises(TypeError):
+            fanout(func, [1])
+
+    def test_timeout(self):
+        def func(adb):
+            time.sleep(2 if adb.serialno == "serial0" else 0)
+            return adb.serialno
+
+        start = time.time()
+        results = fanout(func, self.serials[:3], timeout=0.3)
+        self.assertLess(time.time() - start, 1.5)
+        self.assertIsInstance(results["serial0"].error, TimeoutError)
+        self.assertEqual(results["serial1"].result, "serial1")
+        self.assertEqual(results["serial2"].result, "serial2")
+
+    def test_max_concurrent(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def func(adb):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        AdbFanout.set_max_concurrent(2)
+        threads = [threading.Thread(target=fanout, args=(func, self.serials), kwargs=self.kwargs) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # two fan-outs of 8 workers, at most 2 operations at the same time
+        self.assertEqual(running[1], 2)
+
+
+def tearDownModule():
+    DeviceTracker.stop_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+# encoding=utf-8
+from airtest.aircv.frame_reader import LatestFrameReader
+from airtest.aircv.utils import string_2_img
+from airtest.aircv.frame_bus import FrameBus, POLICY_LATEST, POLICY_QUEUE
+from airtest.aircv.screen_recorder import throttle
+from airtest.core.android.android import Android
+from test_frame_reader import FakeStream, FakeCap
+import time
+import types
+import threading
+import unittest
+
+
+class CountingStream(FakeStream):
+    """FakeStream counting the frames decoded by the reader"""
+
+    def __init__(self, interval=0.01):
+        super(CountingStream, self).__init__(interval)
+        self.decoded = 0
+
+    def decode(self, data):
+        self.decoded += 1
+        return string_2_img(data)
+
+
+class TestFrameBus(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = CountingStream()
+        self.reader = LatestFrameReader(self.stream.get_frame, decode=self.stream.decode)
+        self.bus = FrameBus(self.reader, slots=3)
+
+    def tearDown(self):
+        self.bus.stop()
+        self.reader.stop()
+
+    def test_shared_decode(self):
+        subs = [self.bus.subscribe() for _ in range(3)]
+        results = [[] for _ in subs]
+
+        def consume(sub, result):
+            for _ in range(10):
+                frame = sub.get()
+                if frame is not None:
+                    result.append(frame)
+
+        threads = [threading.Thread(target=consume, args=args) for args in zip(subs, results)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertTrue(all(len(r) == 10 for r in results))
+        # each frame is decoded once, whatever the number of subscribers
+        self.assertLessEqual(self.stream.decoded, self.stream.count)
+        # the subscribers share the same image, which can not be modified
+        img = results[0][-1].img
+        self.assertFalse(img.flags.writeable)
+        with self.assertRaises(ValueError):
+            img[0, 0, 0] = 0
+
+    def test_max_fps(self):
+        sub = self.bus.subscribe(max_fps=10)
+        start = time.time()
+        frames = [sub.get() for _ in range(4)]
+        self.assertGreaterEqual(time.time() - start, 0.29)
+        self.assertTrue(all(frames))
+        # the frames decoded between are skipped with POLICY_LATEST
+        self.assertGreater(sub.dropped, 0)
+
+    def test_queue_policy(self):
+        sub = self.bus.subscribe(policy=POLICY_QUEUE)
+        first = sub.get()
+        second = sub.get()
+        self.assertGreater(second.seq, first.seq)
+        # falling behind more than the slots, the oldest frames are dropped
+        time.sleep(0.3)
+        frame = sub.get()
+        self.assertGreaterEqual(self.bus.latest_seq - frame.seq, 0)
+        self.assertLess(self.bus.latest_seq - frame.seq, self.bus.slots)
+        self.assertGreater(sub.dropped, 0)
+        self.assertLessEqual(len(self.bus._frames), self.bus.slots)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self.bus.subscribe(policy="unknown")
+
+    def test_close_and_stop(self):
+        with self.bus.subscribe() as sub:
+            self.assertIsNotNone(sub.get())
+        self.assertTrue(sub.closed)
+        self.assertIsNone(sub.get(timeout=0.1))
+        self.assertEqual(self.bus._subscribers, [])
+
+        sub = self.bus.subscribe(policy=POLICY_LATEST)
+        self.assertIsNotNone(sub.get())
+        self.bus.stop()
+        self.assertFalse(self.bus.is_alive)
+        self.assertIsNone(sub.get(timeout=0.1))
+        self.assertEqual(list(sub), [])
+
+
+    def test_get(self):
+        frame = self.bus.get()
+        self.assertIsNotNone(frame)
+        newer = self.bus.get(newer_than=frame.seq)
+        self.assertGreater(newer.seq, frame.seq)
+        self.assertIsNone(self.bus.get(newer_than=10 ** 9, timeout=0.1))
+        # the one-off subscribers are removed
+        self.assertEqual(self.bus._subscribers, [])
+
+
+class TestCapFrameBus(unittest.TestCase):
+
+    def test_get_frame_bus(self):
+        cap = FakeCap()
+        bus = cap.get_frame_bus()
+        try:
+            self.assertIs(cap.get_frame_bus(), bus)
+            self.assertTrue(cap.frame_reader.is_alive)
+            sub = bus.subscribe()
+            frame = sub.get()
+            self.assertIsNotNone(frame)
+            # snapshot() reads the same background reader as the subscribers
+            self.assertGreaterEqual(cap.get_latest_frame().seq, frame.seq)
+        finally:
+            cap.teardown_stream()
+        self.assertIsNone(cap.frame_bus)
+        self.assertFalse(bus.is_alive)
+        self.assertIsNone(sub.get(timeout=0.1))
+
+    def test_snapshot_copy(self):
+        cap = FakeCap()
+        cap.stream.interval = 0.3
+        try:
+            sub = cap.get_frame_bus().subscribe()
+            frame = sub.get()
+            screen = cap.snapshot(newer_than=frame.seq - 1)
+            self.assertEqual(cap.get_latest_frame().seq, frame.seq)
+            # the snapshot can be drawn on without changing the frames of the other consumers
+            screen[:] = 255
+            self.assertEqual(frame.img[0, 0, 0], frame.seq % 256)
+            self.assertEqual(cap.get_latest_frame().img[0, 0, 0], frame.seq % 256)
+            self.assertFalse(cap.get_latest_frame().img.flags.writeable)
+        finally:
+            cap.teardown_stream()
+
+    def test_stream_frames(self):
+        # loop_find and snapshot() read the frames through the frame bus, as the screen recording does
+        cap = FakeCap()
+        try:
+            frames = Android._iter_stream_frames(types.SimpleNamespace(screen_proxy=cap))
+            first = next(frames)
+            second = next(frames)
+            self.assertGreater(second[0, 0, 0], first[0, 0, 0])
+            self.assertEqual(len(cap.frame_bus._subscribers), 1)
+            self.assertIsNotNone(cap.snapshot())
+            self.assertEqual(len(cap.frame_bus._subscribers), 1)
+            frames.close()
+            self.assertEqual(cap.frame_bus._subscribers, [])
+        finally:
+            cap.teardown_stream()
+
+
+class TestThrottle(unittest.TestCase):
+
+    def test_throttle(self):
+        calls = []
+        get_frame = throttle(lambda: calls.append(time.time()), fps=20)
+        for _ in range(5):
+            get_frame()
+        self.assertEqual(len(calls), 5)
+        for prev, cur in zip(calls, calls[1:]):
+            self.assertGreaterEqual(cur - prev, 0.05 - 0.005)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# encoding=utf-8
+from airtest.core.android.cap_methods.base_cap import BaseCap
+from airtest.aircv.frame_reader import LatestFrameReader
+import cv2
+import time
+import threading
+import numpy as np
+import unittest
+
+
+def encode(value):
+    img = np.full((20, 30, 3), value, dtype=np.uint8)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+class FakeStream(object):
+    """Frames whose pixels are their index, one every `interval` seconds"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.count = 0
+
+    def get_frame(self):
+        time.sleep(self.interval)
+        self.count += 1
+        return encode(self.count % 256)
+
+
+class FakeCap(BaseCap):
+
+    def __init__(self, adb=None):
+        super(FakeCap, self).__init__(adb)
+        self.stream = FakeStream()
+
+    def get_frame_from_stream(self):
+        return self.stream.get_frame()
+
+
+class TestLatestFrameReader(unittest.TestCase):
+
+    def test_get(self):
+        reader = LatestFrameReader(FakeStream().get_frame)
+        reader.start()
+        try:
+            frame = reader.get()
+            self.assertIsNotNone(frame)
+            self.assertEqual(frame.img.shape, (20, 30, 3))
+            # the pixels are the seq of the frame
+            self.assertEqual(frame.img[0, 0, 0], frame.seq)
+            newer = reader.get(newer_than=frame.seq)
+            self.assertGreater(newer.seq, frame.seq)
+            self.assertGreaterEqual(newer.timestamp, frame.timestamp)
+            self.assertIsNone(reader.get(newer_than=10 ** 9, timeout=0.1))
+        finally:
+            reader.stop()
+        self.assertFalse(reader.is_alive)
+
+    def test_drop_stale_frames(self):
+        def slow_decode(data):
+            time.sleep(0.1)
+            return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+        reader = LatestFrameReader(FakeStream(0.005).get_frame, decode=slow_decode)
+        reader.start()
+        try:
+            time.sleep(0.5)
+            frame = reader.get()
+            # the frames received while decoding are dropped, not queued
+            self.assertGreater(reader.dropped, 0)
+            self.assertLessEqual(reader.decoded, 6)
+            self.assertGreater(frame.seq, reader.decoded)
+            # at most one frame pending and one being decoded
+            self.assertLessEqual(reader.received - reader.decoded - reader.dropped, 2)
+        finally:
+            reader.stop()
+
+    def test_receive_error(self):
+        frames = [None, encode(1)]
+
+        def get_frame():
+            if not frames:
+                time.sleep(0.01)
+                raise IOError("stream broken")
+            return frames.pop(0)
+
+        reader = LatestFrameReader(get_frame)
+        reader.start()
+        try:
+            self.assertEqual(reader.get().seq, 1)
+            time.sleep(0.1)
+            self.assertTrue(reader.is_alive)
+        finally:
+            reader.stop()
+
+
+class TestBackgroundSnapshot(unittest.TestCase):
+
+    def test_snapshot(self):
+        cap = FakeCap()
+        self.assertEqual(cap.snapshot()[0, 0, 0], 1)
+        self.assertIsNone(cap.frame_reader)
+
+        reader = cap.start_background()
+        try:
+            frame = cap.get_latest_frame()
+            img = cap.snapshot(newer_than=frame.seq)
+            self.assertGreater(img[0, 0, 0], frame.img[0, 0, 0])
+        finally:
+            cap.teardown_stream()
+        self.assertIsNone(cap.frame_reader)
+        self.assertFalse(reader.is_alive)
+
+    def test_background_reader_setting(self):
+        cap = FakeCap()
+        cap.BACKGROUND_READER = True
+        try:
+            self.assertIsNotNone(cap.snapshot())
+            self.assertTrue(cap.frame_reader.is_alive)
+            # snapshot() does not wait for the stream
+            cap.stream.interval = 1
+            start = time.time()
+            cap.snapshot()
+            self.assertLess(time.time() - start, 0.5)
+        finally:
+            cap.teardown_stream()
+
+    def test_stop_from_reader_thread(self):
+        cap = FakeCap()
+        stopped = threading.Event()
+
+        def get_frame():
+            # e.g. Minicap rebuilds the stream after a rotation
+            cap.teardown_stream()
+            stopped.set()
+            return encode(1)
+
+        cap.get_frame_from_stream = get_frame
+        cap.start_background()
+        try:
+            self.assertTrue(stopped.wait(1))
+            self.assertTrue(cap.frame_reader.is_alive)
+        finally:
+            cap.teardown_stream()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+# encoding=utf-8
+from airtest.core.ios.mjpeg_cap import SocketBuffer, MJpegcap, MJpegReader
+from airtest import aircv
+import cv2
+import time
+import socket
+import threading
+import numpy as np
+import unittest
+
+
+def encode(value, size=(40, 30)):
+    img = np.full((size[1], size[0], 3), value, dtype=np.uint8)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def multipart(data):
+    return (b"--BoundaryString\r\nContent-type: image/jpg\r\nContent-Length: %d\r\n\r\n" % len(data)) + data + b"\r\n\r\n"
+
+
+class FakeMjpegServer(object):
+    """WDA like MJPEG server, sends a frame whose pixels are its index every `interval` seconds"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.sent = 0
+        self.conns = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        self.stopped = False
+        # close the new connections at once, as a device which went away
+        self.refuse = False
+        t = threading.Thread(target=self._accept_loop)
+        t.daemon = True
+        t.start()
+
+    def _accept_loop(self):
+        while not self.stopped:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            t = threading.Thread(target=self._serve, args=(conn,))
+            t.daemon = True
+            t.start()
+
+    def _serve(self, conn):
+        if self.refuse:
+            conn.close()
+            return
+        try:
+            conn.recv(1024)
+            conn.sendall(b"HTTP/1.0 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=--BoundaryString\r\n\r\n")
+            while not self.stopped:
+                self.sent += 1
+                conn.sendall(multipart(encode(self.sent % 256)))
+                time.sleep(self.interval)
+        except OSError:
+            pass
+
+    def drop_connections(self):
+        for conn in self.conns:
+            conn.close()
+        self.conns = []
+
+    def stop(self):
+        self.stopped = True
+        self.drop_connections()
+        self.server.close()
+
+
+class TestSocketBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.a, b = socket.socketpair()
+        self.buf = SocketBuffer(b, size=64)
+
+    def tearDown(self):
+        self.a.close()
+        self.buf.close()
+
+    def test_read_until(self):
+        self.a.sendall(b"line1\r\nli")
+        self.assertEqual(self.buf.read_until(b"\r\n"), b"line1")
+        t = threading.Timer(0.05, self.a.sendall, args=(b"ne2\r", ))
+        t.start()
+        t2 = threading.Timer(0.1, self.a.sendall, args=(b"\nrest", ))
+        t2.start()
+        # the delimiter is split between two recv
+        self.assertEqual(self.buf.read_until(b"\r\n"), b"line2")
+        self.assertEqual(self.buf.read_bytes(4), b"rest")
+        self.assertEqual(self.buf.buffered, 0)
+
+    def test_grow(self):
+        data = bytes(bytearray(range(256))) * 10
+        frames = b"".join(multipart(data) for _ in range(3))
+        t = threading.Thread(target=self.a.sendall, args=(frames, ))
+        t.start()
+        for _ in range(3):
+            while not self.buf.read_until(b"\r\n").startswith(b"Content-Length"):
+                pass
+            self.assertEqual(self.buf.read_until(b"\r\n"), b"")
+            # the frame is larger than the initial buffer
+            self.assertEqual(self.buf.read_bytes(len(data)), data)
+        t.join()
+        self.assertGreaterEqual(len(self.buf._data), len(data))
+
+    def test_closed(self):
+        self.a.sendall(b"abc")
+        self.a.close()
+        with self.assertRaises(IOError):
+            self.buf.read_until(b"\r\n")
+
+
+class TestMJpegcap(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeMjpegServer()
+        self.cap = MJpegcap(ip="127.0.0.1", port=self.server.port)
+
+    def tearDown(self):
+        self.cap.teardown_stream()
+        self.server.stop()
+
+    def test_latest_frame(self):
+        data = self.cap.get_frame_from_stream()
+        self.assertTrue(data.startswith(b"\xff\xd8"))
+        reader = self.cap.stream_reader
+        self.assertTrue(reader.is_alive)
+        time.sleep(0.3)
+        # the stream is drained in background, the frame got is the latest one sent
+        frame = reader.get()
+        self.assertGreaterEqual(frame.seq, 10)
+        self.assertLessEqual(self.server.sent - reader.received, 2)
+        img = aircv.utils.string_2_img(self.cap.get_frame_from_stream())
+        self.assertLessEqual(abs(int(img[0, 0, 0]) - self.server.sent % 256), 3)
+        # O(1) once the stream is running
+        start = time.time()
+        for _ in range(100):
+            self.cap.get_frame_from_stream()
+        self.assertLess(time.time() - start, 0.1)
+
+    def test_reconnect(self):
+        self.cap.get_frame_from_stream()
+        reader = self.cap.stream_reader
+        reader.RECONNECT_INTERVAL = 1
+        self.server.drop_connections()
+        time.sleep(0.1)
+        self.assertTrue(reader.is_broken)
+        # the blank screen is returned at once while reconnecting, without waiting for MJpegReader.TIMEOUT
+        start = time.time()
+        data = self.cap.get_frame_from_stream()
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(aircv.utils.string_2_img(data).max(), 0)
+        time.sleep(1)
+        self.assertGreater(reader.errors, 0)
+        self.assertIsNotNone(reader.get(timeout=1))
+        self.assertFalse(reader.is_broken)
+        self.assertTrue(reader.is_alive)
+
+    def test_max_reconnects(self):
+        self.cap.get_frame_from_stream()
+        reader = self.cap.stream_reader
+        reader.RECONNECT_INTERVAL, reader.MAX_RECONNECTS = 0.01, 3
+        self.server.refuse = True
+        self.server.drop_connections()
+        time.sleep(0.3)
+        # gives up reconnecting, the next call connects again in the calling thread
+        self.assertEqual(reader.errors, 4)
+        self.assertFalse(reader.is_alive)
+        with self.assertRaises(IOError):
+            self.cap.get_frame_from_stream()
+
+    def test_frame_bus(self):
+        sub = self.cap.get_frame_bus().subscribe()
+        first = sub.get()
+        second = sub.get()
+        self.assertIsNotNone(first)
+        self.assertGreater(second.seq, first.seq)
+        # the stream is drained in background for the frame bus, get_frame_from_stream() gets the latest frame too
+        self.assertTrue(self.cap.stream_reader.is_alive)
+        self.assertGreaterEqual(self.cap.stream_reader.received, second.seq)
+        self.assertTrue(self.cap.get_frame_from_stream().startswith(b"\xff\xd8"))
+        # each JPEG is decoded only once
+        self.assertLessEqual(self.cap.frame_reader.decoded, self.cap.stream_reader.received)
+
+    def test_iter_frames(self):
+        frames = self.cap.iter_frames()
+        first = next(frames)
+        self.assertEqual(first.shape, (30, 40, 3))
+        # the stream is drained while the consumer is busy, the next frame is the latest one, not a stale one
+        time.sleep(0.3)
+        second = next(frames)
+        self.assertLessEqual(abs(int(second[0, 0, 0]) - self.server.sent % 256), 3)
+        self.assertGreater(int(second[0, 0, 0]) - int(first[0, 0, 0]), 10)
+        self.assertEqual(len(self.server.conns), 1)
+        # the frames are shared through the frame bus with the screen recording and snapshot()
+        self.assertEqual(len(self.cap.frame_bus._subscribers), 1)
+        self.assertIsNotNone(self.cap.snapshot(ensure_orientation=False))
+        frames.close()
+        self.assertEqual(self.cap.frame_bus._subscribers, [])
+
+    def test_teardown(self):
+        self.cap.get_frame_from_stream()
+        reader = self.cap.stream_reader
+        self.cap.teardown_stream()
+        self.assertFalse(reader.is_alive)
+        self.assertIsNone(self.cap.stream_reader)
+
+    def test_without_background_reader(self):
+        # the stream is read only when a frame is required
+        self.cap.BACKGROUND_READER = False
+        data = self.cap.get_frame_from_stream()
+        self.assertTrue(data.startswith(b"\xff\xd8"))
+        self.assertIsNone(self.cap.stream_reader)
+
+    def test_restart_stream(self):
+        self.cap.BACKGROUND_READER = False
+        self.cap.get_frame_from_stream()
+        # restart_stream() waits for the frame being read, e.g. by the recording thread, before closing the buffer
+        with self.cap._read_lock:
+            t = threading.Thread(target=self.cap.restart_stream)
+            t.start()
+            t.join(0.2)
+            self.assertTrue(t.is_alive())
+            self.assertTrue(self.cap._is_running)
+        t.join(1)
+        self.assertFalse(self.cap._is_running)
+        # reconnected on the next read
+        self.assertTrue(self.cap.get_frame_from_stream().startswith(b"\xff\xd8"))
+        self.assertTrue(self.cap._is_running)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# encoding=utf-8
+from airtest.utils.safesocket import SafeSocket
+import socket
+import threading
+import unittest
+
+
+class TestSafeSocket(unittest.TestCase):
+
+    def setUp(self):
+        self.a, b = socket.socketpair()
+        self.s = SafeSocket(b, recv_size=1000)
+
+    def tearDown(self):
+        self.a.close()
+        self.s.close()
+
+    def test_recv(self):
+        data = bytes(bytearray(range(256))) * 100
+        t = threading.Thread(target=self.a.sendall, args=(data + b"tail",))
+        t.start()
+        self.assertEqual(self.s.recv(4), data[:4])
+        self.assertEqual(self.s.recv(len(data) - 4), data[4:])
+        self.assertIsInstance(self.s.recv(4), bytes)
+        t.join()
+
+    def test_recv_exact_into(self):
+        data = b"x" * 5000
+        self.a.sendall(data)
+        buf = bytearray(10000)
+        view = self.s.recv_exact_into(buf, 5000)
+        self.assertEqual(len(view), 5000)
+        self.assertEqual(bytes(view), data)
+        # the view shares the memory of buf
+        self.assertEqual(buf[:5000], data)
+
+    def test_recv_timeout(self):
+        self.a.sendall(b"abc")
+        buf = bytearray(6)
+        self.assertIsNone(self.s.recv_exact_into_with_timeout(buf, timeout=0.1))
+        # the bytes received before the timeout are kept
+        self.a.sendall(b"def")
+        self.assertEqual(bytes(self.s.recv_exact_into(buf)), b"abcdef")
+        self.assertIsNone(self.s.recv_with_timeout(1, timeout=0.1))
+
+    def test_connection_broken(self):
+        self.a.sendall(b"abc")
+        self.a.close()
+        with self.assertRaises(socket.error):
+            self.s.recv_exact_into(bytearray(4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# encoding=utf-8
+from airtest.core.android.adb import ADB, AdbError, AdbShellError
+from airtest.core.android.shell_session import ShellSession
+from mock import patch
+import time
+import subprocess
+import unittest
+
+
+def start_local_shell(cmds):
+    # a local sh plays the `adb shell` process
+    return subprocess.Popen(["sh"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+class TestShellSession(unittest.TestCase):
+
+    def setUp(self):
+        self.adb = ADB("serial1")
+        self.adb._sdk_version = 30
+        patcher = patch.object(self.adb, "start_shell", side_effect=start_local_shell)
+        self.start_shell = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_shell(self):
+        with self.adb.session() as session:
+            self.assertEqual(session.shell("echo hello world"), "hello world\n")
+            self.assertEqual(session.shell("printf 'no line break'"), "no line break")
+            self.assertEqual(session.shell("echo 'single quote'"), "single quote\n")
+            with self.assertRaises(AdbShellError) as cm:
+                session.shell("echo out; echo err >&2; exit 3")
+            self.assertEqual(cm.exception.stdout, "out\n")
+            self.assertEqual(cm.exception.stderr, "err\n")
+            # a command reading stdin does not eat the following commands
+            self.assertEqual(session.shell("cat"), "")
+            self.assertEqual(session.shell("echo still alive"), "still alive\n")
+        self.assertEqual(self.start_shell.call_count, 1)
+        self.assertFalse(session.is_alive)
+
+    def test_batch(self):
+        with self.adb.session() as session:
+            outputs = session.batch(["echo %d" % i for i in range(100)])
+            self.assertEqual(outputs, ["%d\n" % i for i in range(100)])
+            results = session.execute(["echo 1", "false", "echo 3 >&2"])
+            self.assertEqual(results, [(b"1\n", b"", 0), (b"", b"", 1), (b"", b"3\n", 0)])
+            with self.assertRaises(AdbShellError):
+                session.batch(["echo 1", "false"])
+
+    def test_timeout(self):
+        session = self.adb.session()
+        with self.assertRaises(RuntimeError):
+            session.execute(["sleep 2"], timeout=0.2)
+        # the session is restarted after the timeout
+        self.assertEqual(session.shell("echo hello"), "hello\n")
+        self.assertEqual(self.start_shell.call_count, 2)
+        session.close()
+
+    def test_attach(self):
+        with self.adb.session(attach=True) as session:
+            self.assertIs(self.adb.shell_session, session)
+            self.assertEqual(self.adb.shell("echo hello"), "hello\n")
+            self.assertEqual(self.adb.cmd("shell echo hello"), "hello\n")
+            with self.assertRaises(AdbShellError):
+                self.adb.shell("exit 1")
+            with self.assertRaises(AdbError):
+                self.adb.raw_shell("exit 1")
+        self.assertIsNone(self.adb.shell_session)
+        self.assertEqual(self.start_shell.call_count, 1)
+
+    def test_old_sdk(self):
+        self.adb._sdk_version = 23
+        with self.adb.session(attach=True):
+            self.assertEqual(self.adb.shell("echo hello"), "hello\n")
+            # the adb client returns 0 without shell v2, the exit status comes from the "---$?---" line
+            with self.assertRaises(AdbShellError):
+                self.adb.shell("false")
+            self.assertEqual(self.adb.raw_shell("false"), "")
+
+
+if __name__ == '__main__':
+    unittest.main()